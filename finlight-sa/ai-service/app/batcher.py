@@ -0,0 +1,110 @@
+"""
+Asyncio micro-batcher that coalesces concurrent requests into one
+vectorized call.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within max_wait_ms (or until max_batch_size
+    items are queued), scores them with a single score_fn call in a worker
+    thread and resolves each caller's future with its own result. score_fn
+    may return an exception in an item's slot to fail that caller only.
+    """
+
+    def __init__(self, score_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.score_fn = score_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+        # Statistics
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.batch_size_histogram = {}
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+
+            # Give concurrent callers a short window to join, unless the batch is already full
+            if self.max_wait and queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # Callers that gave up (e.g. client disconnects) are dropped from the batch
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+            self._record(batch)
+
+            try:
+                results = await loop.run_in_executor(None, self.score_fn, [item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _record(self, batch):
+        now = time.perf_counter()
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.largest_batch = max(self.largest_batch, size)
+
+        bucket = 1
+        while bucket < size:
+            bucket <<= 1
+        self.batch_size_histogram[bucket] = self.batch_size_histogram.get(bucket, 0) + 1
+
+        for _, _, queued_at in batch:
+            delay = now - queued_at
+            self.total_queue_delay += delay
+            self.max_queue_delay = max(self.max_queue_delay, delay)
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "batch_size_histogram": {f"<={k}": v for k, v in sorted(self.batch_size_histogram.items())},
+            "average_queue_delay_ms": self.total_queue_delay / self.items * 1000 if self.items else 0.0,
+            "max_queue_delay_ms": self.max_queue_delay * 1000,
+        }
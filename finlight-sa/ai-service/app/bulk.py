@@ -0,0 +1,120 @@
+"""
+Input parsing and serialization for /categorize/bulk.
+
+Transactions arrive either as NDJSON (one {"description", "amount",
+"direction"} object per line) or as a columnar JSON body of parallel
+arrays. Columns are validated as whole lists instead of building one
+pydantic model per row, and results are returned as columns too.
+orjson is used for encoding and decoding when installed.
+"""
+import json
+import math
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is slower on large results
+    orjson = None
+
+
+class BulkInputError(ValueError):
+    """The request body is not a valid bulk categorization payload"""
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+class Columns:
+    """Parallel lists of descriptions, amounts and directions"""
+
+    def __init__(self, descriptions: List[str], amounts: Optional[List[float]] = None,
+                 directions: Optional[List[str]] = None):
+        self.descriptions = descriptions
+        self.amounts = amounts
+        self.directions = directions
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def slice(self, start: int, stop: int) -> "Columns":
+        return Columns(
+            self.descriptions[start:stop],
+            self.amounts[start:stop] if self.amounts is not None else None,
+            self.directions[start:stop] if self.directions is not None else None,
+        )
+
+
+def validate_columns(descriptions, amounts=None, directions=None, offset: int = 0) -> Columns:
+    """Check whole columns at once; errors name the first bad row"""
+    if not isinstance(descriptions, list):
+        raise BulkInputError("'descriptions' must be a list of strings")
+    for i, description in enumerate(descriptions):
+        if type(description) is not str:
+            raise BulkInputError(f"Row {offset + i}: description must be a string")
+
+    if amounts is not None:
+        if not isinstance(amounts, list) or len(amounts) != len(descriptions):
+            raise BulkInputError("'amounts' must be a list as long as 'descriptions'")
+        for i, amount in enumerate(amounts):
+            # bool is an int subclass but never a valid amount
+            if type(amount) not in (int, float) or not math.isfinite(amount):
+                raise BulkInputError(f"Row {offset + i}: amount must be a finite number")
+
+    if directions is not None:
+        if not isinstance(directions, list) or len(directions) != len(descriptions):
+            raise BulkInputError("'directions' must be a list as long as 'descriptions'")
+        for i, direction in enumerate(directions):
+            if type(direction) is not str:
+                raise BulkInputError(f"Row {offset + i}: direction must be a string")
+
+    return Columns(descriptions, amounts, directions)
+
+
+def parse_columnar(body: bytes) -> Columns:
+    """{"descriptions": [...], "amounts": [...], "directions": [...]}; amounts and directions are optional"""
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise BulkInputError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict) or "descriptions" not in data:
+        raise BulkInputError("Expected an object with a 'descriptions' array")
+    return validate_columns(data["descriptions"], data.get("amounts"), data.get("directions"))
+
+
+def ndjson_lines(body: bytes) -> List[bytes]:
+    return [line for line in body.split(b"\n") if line.strip()]
+
+
+def parse_ndjson_lines(lines: Iterable[bytes], offset: int = 0) -> Columns:
+    """One transaction object per line; offset numbers the rows in error messages"""
+    descriptions, amounts, directions = [], [], []
+    row = offset
+    for line in lines:
+        try:
+            record = loads(line)
+            descriptions.append(record["description"])
+            amounts.append(record.get("amount", 0.0))
+            directions.append(record.get("direction", ""))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise BulkInputError(f"Row {row}: expected a JSON object with a 'description'")
+        row += 1
+    return validate_columns(descriptions, amounts, directions, offset=offset)
+
+
+def result_columns(predictions: List[Dict], top_k: int) -> Dict:
+    columns = {
+        "categories": [p["category"] for p in predictions],
+        "confidences": [p["confidence"] for p in predictions],
+    }
+    if top_k > 1:
+        columns["alternatives"] = [p["alternatives"] for p in predictions]
+    return columns
@@ -1,19 +1,84 @@
 import numpy as np
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split
-import joblib
 import os
-from typing import Dict, List
-from datetime import datetime
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from app.compiled_model import CompiledCategorizer
+from app.feedback_store import FeedbackStore
+from app.metrics import PREDICT_BATCH_SIZE, stage
+from app.online_model import OnlineCategorizer
+from app.training import compiled_artifact_dir, current_model_file, run_training, save_compiled_artifact
+from app.prediction_cache import PredictionCache, normalize_description
+
+# Seed training data (in production, this would come from a database)
+SEED_TRAINING_DATA = [
+    ("monthly rent payment", "Rent"),
+    ("office space rental", "Rent"),
+    ("electricity bill", "Utilities"),
+    ("water and sanitation", "Utilities"),
+    ("internet service provider", "Utilities"),
+    ("petrol station", "Fuel"),
+    ("diesel fuel", "Fuel"),
+    ("uber trip", "Transport"),
+    ("taxi fare", "Transport"),
+    ("bus ticket", "Transport"),
+    ("printer paper", "Office Supplies"),
+    ("stationery store", "Office Supplies"),
+    ("google ads", "Marketing"),
+    ("facebook advertising", "Marketing"),
+    ("salary payment", "Salaries"),
+    ("staff wages", "Salaries"),
+    ("stock purchase", "Inventory"),
+    ("supplier payment", "Inventory"),
+    ("restaurant", "Meals & Entertainment"),
+    ("coffee shop", "Meals & Entertainment"),
+    ("accountant fees", "Professional Fees"),
+    ("legal services", "Professional Fees"),
+    ("business insurance", "Insurance"),
+    ("vehicle insurance", "Insurance"),
+    ("repair services", "Maintenance"),
+    ("building maintenance", "Maintenance"),
+    ("software subscription", "Technology"),
+    ("cloud hosting", "Technology"),
+    ("bank service fee", "Bank Charges"),
+    ("transaction fee", "Bank Charges"),
+    ("vat payment", "Taxes"),
+    ("income tax", "Taxes"),
+]
+
+
+class ModelState:
+    """
+    A fitted pipeline, its compiled scorer and its version. Replaced as a
+    whole, never mutated, so a prediction that grabbed a state finishes on it.
+    In online mode the model is an OnlineCategorizer that learns in place
+    under its own lock.
+    """
+
+    def __init__(self, model, scorer, version: Optional[str], model_file: Optional[str]):
+        self.model = model
+        # Compiled NumPy scorer used for inference; the sklearn pipeline stays the training source
+        self.scorer = scorer
+        self.version = version
+        self.model_file = model_file
+
 
 class TransactionCategorizer:
-    def __init__(self, model_path="./models"):
+    def __init__(self, model_path="./models", load: bool = True,
+                 prediction_cache_size: Optional[int] = None):
         self.model_path = model_path
-        self.model = None
+        self.state = ModelState(None, None, None, None)
         self.vectorizer = None
+        self.use_compiled = os.getenv("CATEGORIZER_COMPILED", "true").lower() == "true"
+        # Compiled arrays are memory-mapped so uvicorn workers share one copy
+        self.use_mmap = os.getenv("CATEGORIZER_MMAP", "true").lower() == "true"
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self.prediction_cache = PredictionCache(
+            max_size=prediction_cache_size if prediction_cache_size is not None
+            else int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+            ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+        )
         self.categories = [
             "Rent", "Utilities", "Fuel", "Transport", "Office Supplies",
             "Marketing", "Salaries", "Inventory", "Meals & Entertainment",
@@ -24,149 +89,337 @@ class TransactionCategorizer:
         # Create models directory if it doesn't exist
         os.makedirs(model_path, exist_ok=True)
         
-        # Load or create model
-        self.load_or_create_model()
+        # Online mode learns each committed feedback batch with partial_fit instead of /train refits
+        self.online_mode = os.getenv("CATEGORIZER_MODE", "batch").lower() == "online"
+        self.online = None
+        self.online_checkpoint_file = os.path.join(model_path, "online_model.npz")
+        self.online_checkpoint_every = int(os.getenv("ONLINE_CHECKPOINT_EVERY", "500"))
+        self._online_lock = threading.Lock()
+        self._learned_since_checkpoint = 0
+        
+        # Feedback is buffered and group-committed to SQLite
+        self.feedback_store = FeedbackStore(
+            os.path.join(model_path, "feedback.db"),
+            flush_rows=int(os.getenv("FEEDBACK_FLUSH_ROWS", "100")),
+            flush_seconds=float(os.getenv("FEEDBACK_FLUSH_SECONDS", "1.0")),
+            on_commit=self.sync_online if self.online_mode else None
+        )
+        
+        # Load or create model; the API passes load=False and warms up after it starts listening
+        if load:
+            self.load_or_create_model()
     
     def load_or_create_model(self):
         """Load existing model or create and train a new one"""
-        model_file = os.path.join(self.model_path, "categorizer_model.pkl")
+        if self.online_mode:
+            self.load_online_model()
+            return
+        
+        model_file = current_model_file(self.model_path)
         
         if os.path.exists(model_file):
             try:
-                self.model = joblib.load(model_file)
-                print("Loaded existing model")
+                self.activate_model_file(model_file)
+                return
             except Exception as e:
                 print(f"Error loading model: {e}. Creating new model.")
-                self.create_initial_model()
-        else:
-            self.create_initial_model()
+        
+        model = self.create_initial_model()
+        self.swap_model(model, os.path.join(self.model_path, "categorizer_model.pkl"))
+    
+    def load_online_model(self):
+        """Resume the online model from its checkpoint, or start it from the seed data"""
+        online = None
+        if os.path.exists(self.online_checkpoint_file):
+            try:
+                online = OnlineCategorizer.load(self.online_checkpoint_file)
+                print(f"Loaded online model checkpoint ({online.updates} updates)")
+            except Exception as e:
+                print(f"Error loading online model: {e}. Starting from seed data.")
+        
+        if online is None:
+            online = OnlineCategorizer(
+                self.categories,
+                n_features=int(os.getenv("ONLINE_HASH_FEATURES", str(2 ** 16)))
+            )
+            online.partial_fit([d for d, _ in SEED_TRAINING_DATA], [c for _, c in SEED_TRAINING_DATA])
+            print("Created online model from seed data")
+        
+        self.online = online
+        # Catch up on feedback committed after the checkpoint, by any worker
+        if self.sync_online():
+            self.checkpoint_online()
+    
+    def sync_online(self) -> int:
+        """Learn feedback rows committed since the last sync; returns how many"""
+        online = self.online
+        if online is None:
+            return 0
+        learned = 0
+        with self._online_lock:
+            for batch in self.feedback_store.iter_rows_since(online.last_feedback_id):
+                online.partial_fit([row[1] for row in batch], [row[2] for row in batch])
+                online.last_feedback_id = batch[-1][0]
+                learned += len(batch)
+            self.state = ModelState(online, None, online.version, self.online_checkpoint_file)
+            self._learned_since_checkpoint += learned
+            due = learned and self._learned_since_checkpoint >= self.online_checkpoint_every
+        if due:
+            self.checkpoint_online()
+        return learned
+    
+    def checkpoint_online(self):
+        if self.online is None:
+            return
+        with self._online_lock:
+            self.online.save(self.online_checkpoint_file)
+            self._learned_since_checkpoint = 0
+    
+    def close(self):
+        """Stop the model watcher, commit buffered feedback and checkpoint the online model"""
+        self._watcher_stop.set()
+        self.feedback_store.close()
+        self.checkpoint_online()
+    
+    def activate_model_file(self, model_file: str):
+        """
+        Make a published model file the live model. Its compiled artifact is
+        used when present, which needs neither sklearn nor an unpickle.
+        """
+        version = self.get_model_version(model_file)
+        if self.use_compiled and version:
+            artifact = compiled_artifact_dir(self.model_path, version)
+            if os.path.isdir(artifact):
+                try:
+                    scorer = CompiledCategorizer.load_directory(artifact, mmap=self.use_mmap)
+                    self.state = ModelState(None, scorer, version, model_file)
+                    print(f"Loaded compiled model {version}")
+                    return
+                except Exception as e:
+                    print(f"Error loading compiled model: {e}. Loading the pickle.")
+        
+        import joblib
+        self.swap_model(joblib.load(model_file), model_file)
+        print(f"Loaded existing model {self.model_version}")
+    
+    def swap_model(self, model, model_file: str):
+        # Built fully before the single assignment that publishes it
+        version = self.get_model_version(model_file)
+        scorer = None
+        if self.use_compiled and version:
+            # Saved so the next start skips sklearn entirely
+            artifact = save_compiled_artifact(self.model_path, version, model)
+            if artifact is not None:
+                scorer = CompiledCategorizer.load_directory(artifact, mmap=self.use_mmap)
+        if scorer is None:
+            scorer = self.compile_scorer(model)
+        self.state = ModelState(model, scorer, version, model_file)
+    
+    def check_for_new_model(self) -> bool:
+        """Activate the model models/CURRENT points at if another process published a new one"""
+        model_file = current_model_file(self.model_path)
+        if model_file == self.state.model_file or not os.path.exists(model_file):
+            return False
+        self.activate_model_file(model_file)
+        return True
+    
+    def start_model_watcher(self, interval: float = 2.0):
+        """Poll models/CURRENT so every worker picks up a retrain, whichever worker ran it"""
+        if self.online_mode or interval <= 0 or self._watcher is not None:
+            return
+        
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    self.check_for_new_model()
+                except Exception as e:
+                    print(f"Model watcher error: {e}")
+        
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+    
+    @property
+    def loaded(self) -> bool:
+        return self.state.model is not None or self.state.scorer is not None
+    
+    @property
+    def model(self):
+        return self.state.model
+    
+    @property
+    def scorer(self):
+        return self.state.scorer
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.state.version
+    
+    @staticmethod
+    def get_model_version(model_file: str) -> Optional[str]:
+        """Content hash of the saved model, identical across processes"""
+        try:
+            with open(model_file, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()[:16]
+        except OSError:
+            return None
+    
+    def compile_scorer(self, model):
+        """Export a fitted pipeline into the compiled NumPy scorer"""
+        if not self.use_compiled or model is None:
+            return None
+        try:
+            return CompiledCategorizer.from_pipeline(model)
+        except Exception as e:
+            print(f"Could not compile model, using sklearn pipeline: {e}")
+            return None
     
     def create_initial_model(self):
         """Create and train an initial model with synthetic data"""
-        # Sample training data (in production, this would come from a database)
-        training_data = [
-            ("monthly rent payment", "Rent"),
-            ("office space rental", "Rent"),
-            ("electricity bill", "Utilities"),
-            ("water and sanitation", "Utilities"),
-            ("internet service provider", "Utilities"),
-            ("petrol station", "Fuel"),
-            ("diesel fuel", "Fuel"),
-            ("uber trip", "Transport"),
-            ("taxi fare", "Transport"),
-            ("bus ticket", "Transport"),
-            ("printer paper", "Office Supplies"),
-            ("stationery store", "Office Supplies"),
-            ("google ads", "Marketing"),
-            ("facebook advertising", "Marketing"),
-            ("salary payment", "Salaries"),
-            ("staff wages", "Salaries"),
-            ("stock purchase", "Inventory"),
-            ("supplier payment", "Inventory"),
-            ("restaurant", "Meals & Entertainment"),
-            ("coffee shop", "Meals & Entertainment"),
-            ("accountant fees", "Professional Fees"),
-            ("legal services", "Professional Fees"),
-            ("business insurance", "Insurance"),
-            ("vehicle insurance", "Insurance"),
-            ("repair services", "Maintenance"),
-            ("building maintenance", "Maintenance"),
-            ("software subscription", "Technology"),
-            ("cloud hosting", "Technology"),
-            ("bank service fee", "Bank Charges"),
-            ("transaction fee", "Bank Charges"),
-            ("vat payment", "Taxes"),
-            ("income tax", "Taxes"),
-        ]
-        
-        # Create DataFrame
-        df = pd.DataFrame(training_data, columns=["description", "category"])
+        import joblib
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
         
         # Create pipeline with TF-IDF vectorizer and Naive Bayes classifier
-        self.model = Pipeline([
+        model = Pipeline([
             ('tfidf', TfidfVectorizer(max_features=1000, ngram_range=(1, 2))),
             ('clf', MultinomialNB())
         ])
         
         # Train model
-        self.model.fit(df["description"], df["category"])
+        model.fit([d for d, _ in SEED_TRAINING_DATA], [c for _, c in SEED_TRAINING_DATA])
         
         # Save model
         model_file = os.path.join(self.model_path, "categorizer_model.pkl")
-        joblib.dump(self.model, model_file)
+        joblib.dump(model, model_file)
         print("Created and trained new model")
+        return model
     
     def predict(self, description: str, amount: float, direction: str) -> Dict:
         """Predict category for a transaction"""
-        if self.model is None:
+        return self.predict_many([description], [amount], [direction])[0]
+    
+    def predict_many(self, descriptions: List[str], amounts: Optional[List[float]] = None,
+                     directions: Optional[List[str]] = None, top_k: int = 3) -> List[Dict]:
+        """
+        Predict categories for a batch of transactions.
+        Vectorizes the whole batch once and makes a single predict_proba call.
+        """
+        # Everything below uses this one state, even if a retrained model is swapped in meanwhile
+        state = self.state
+        if state.model is None and state.scorer is None:
             raise ValueError("Model not loaded")
         
-        # Get prediction
-        prediction = self.model.predict([description])[0]
+        if not descriptions:
+            return []
         
-        # Get probability scores
-        probabilities = self.model.predict_proba([description])[0]
-        confidence = float(max(probabilities))
-        
-        # Get top 3 alternative categories
-        top_indices = np.argsort(probabilities)[-3:][::-1]
-        classes = self.model.classes_
-        alternatives = [
-            {"category": classes[i], "confidence": float(probabilities[i])}
-            for i in top_indices[1:]  # Skip the top prediction
-        ]
-        
-        return {
-            "category": prediction,
-            "confidence": confidence,
-            "alternatives": alternatives
-        }
+        with stage("categorizer.predict"):
+            return self._predict_cached(state, descriptions, top_k)
     
-    def add_feedback(self, description: str, predicted_category: str, 
-                     correct_category: str, amount: float):
-        """Store feedback for future retraining"""
-        feedback_file = os.path.join(self.model_path, "feedback.csv")
+    def _predict_cached(self, state: ModelState, descriptions: List[str], top_k: int) -> List[Dict]:
+        cache = self.prediction_cache
+        if not cache.enabled:
+            return self._score(state, descriptions, top_k)
         
-        feedback_data = {
-            "description": description,
-            "predicted_category": predicted_category,
-            "correct_category": correct_category,
-            "amount": amount,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        model_version = state.version
+        cache.ensure_version(model_version)
+        keys = [(top_k, normalize_description(d)) for d in descriptions]
+        results = [cache.get(key) for key in keys]
         
-        df = pd.DataFrame([feedback_data])
+        # Score each distinct missing key once
+        missing = {}
+        for i, result in enumerate(results):
+            if result is None:
+                missing.setdefault(keys[i], descriptions[i])
+        if missing:
+            scored = dict(zip(missing.keys(), self._score(state, list(missing.values()), top_k)))
+            for key, prediction in scored.items():
+                cache.put(key, prediction, model_version)
+            results = [result if result is not None else scored[key] for key, result in zip(keys, results)]
         
-        # Append to existing feedback file
-        if os.path.exists(feedback_file):
-            df.to_csv(feedback_file, mode='a', header=False, index=False)
-        else:
-            df.to_csv(feedback_file, index=False)
+        # Cached dicts are shared; callers get copies down to the alternatives
+        return [
+            {**result, "alternatives": [dict(alternative) for alternative in result["alternatives"]]}
+            for result in results
+        ]
     
-    def retrain(self):
-        """Retrain model with accumulated feedback"""
-        feedback_file = os.path.join(self.model_path, "feedback.csv")
-        
-        if not os.path.exists(feedback_file):
-            return {"message": "No feedback data available for retraining"}
+    def predict_bulk(self, descriptions: List[str], top_k: int = 1) -> List[Dict]:
+        """
+        Score a large batch without the prediction cache, so bulk jobs do not
+        evict what interactive calls rely on. Each distinct description is
+        scored once; repeated rows share the same result dict.
+        """
+        state = self.state
+        if state.model is None and state.scorer is None:
+            raise ValueError("Model not loaded")
+        if not descriptions:
+            return []
         
-        # Load feedback data
-        feedback_df = pd.read_csv(feedback_file)
+        with stage("categorizer.predict_bulk"):
+            unique: Dict[str, int] = {}
+            index = [unique.setdefault(d, len(unique)) for d in descriptions]
+            scored = self._score(state, list(unique), top_k)
+        return [scored[i] for i in index]
+    
+    def _score(self, state: ModelState, descriptions: List[str], top_k: int) -> List[Dict]:
+        # One pass through the scorer for the whole batch
+        scorer = state.scorer if state.scorer is not None else state.model
+        PREDICT_BATCH_SIZE.observe(len(descriptions))
+        with stage("categorizer.score"):
+            probabilities = scorer.predict_proba(list(descriptions))
+        classes = scorer.classes_.tolist()
         
-        if len(feedback_df) < 10:
-            return {"message": "Insufficient feedback data for retraining"}
+        # Top-k per row without a full sort: partition, then order the k survivors
+        k = min(top_k, probabilities.shape[1])
+        if k == 1:
+            top = probabilities.argmax(axis=1)[:, None]
+        else:
+            top = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+            # Tied probabilities go to the lower class index, whatever k is
+            top.sort(axis=1)
+        top_probs = np.take_along_axis(probabilities, top, axis=1)
+        order = np.argsort(-top_probs, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_probs = np.take_along_axis(top_probs, order, axis=1)
         
-        # Retrain model with correct categories
-        X = feedback_df["description"]
-        y = feedback_df["correct_category"]
+        results = []
+        for indices, probs in zip(top.tolist(), top_probs.tolist()):
+            results.append({
+                "category": classes[indices[0]],
+                "confidence": float(probs[0]),
+                "alternatives": [
+                    {"category": classes[i], "confidence": float(p)}
+                    for i, p in zip(indices[1:], probs[1:])  # Skip the top prediction
+                ]
+            })
         
-        self.model.fit(X, y)
+        return results
+    
+    def add_feedback(self, description: str, predicted_category: str, 
+                     correct_category: str, amount: float):
+        """Store feedback for future retraining"""
+        self.feedback_store.add(description, predicted_category, correct_category, amount)
+    
+    def add_feedback_batch(self, records: List[Dict]):
+        """Store several feedback records with a single group commit"""
+        self.feedback_store.add_many(records)
+        self.feedback_store.flush()
+    
+    def retrain(self):
+        """Retrain model with accumulated feedback, in this process"""
+        self.feedback_store.flush()
+        if self.online_mode:
+            # Feedback is already learned as it is committed; just catch up and checkpoint
+            self.sync_online()
+            self.checkpoint_online()
+            return {
+                "message": "Online model is up to date",
+                "training_samples": self.online.updates
+            }
         
-        # Save updated model
-        model_file = os.path.join(self.model_path, "categorizer_model.pkl")
-        joblib.dump(self.model, model_file)
+        result = run_training(self.model_path)
         
-        return {
-            "message": "Model retrained successfully",
-            "training_samples": len(feedback_df)
-        }
+        model_file = result.pop("model_file", None)
+        if model_file:
+            self.activate_model_file(model_file)
+        return result
@@ -0,0 +1,344 @@
+"""
+Compiled inference engine for the TF-IDF + MultinomialNB categorizer.
+
+Exports a fitted sklearn Pipeline into a handful of NumPy arrays
+(vocabulary hash table, IDF vector, float32 class log-probabilities)
+and scores descriptions with a plain sparse dot product.
+"""
+import json
+import os
+import pickle
+import re
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+# Arrays written by save_directory, one raw .npy file each
+ARRAY_NAMES = ("terms", "table", "idf", "weights", "class_log_prior")
+
+
+class CompiledCategorizer:
+    """Standalone scorer equivalent to Pipeline(TfidfVectorizer, MultinomialNB)"""
+
+    def __init__(self, terms: np.ndarray, table: np.ndarray, idf: np.ndarray,
+                 weights: np.ndarray, class_log_prior: np.ndarray, classes: List[str],
+                 ngram_range=(1, 1), lowercase: bool = True,
+                 token_pattern: str = r"(?u)\b\w\w+\b", norm: Optional[str] = "l2"):
+        self.terms = terms                    # (n_features,) UTF-8 bytes, feature order
+        self.table = table                    # open-addressing slots -> feature index, -1 = empty
+        self.idf = idf                        # (n_features,) float32
+        self.weights = weights                # (n_features, n_classes) float32, centred log-probs
+        self.class_log_prior = class_log_prior
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.norm = norm
+        self._token_re = re.compile(token_pattern)
+        self._mask = len(table) - 1
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_pipeline(cls, pipeline, memory_budget: Optional[int] = None) -> "CompiledCategorizer":
+        """
+        Compile a fitted Pipeline(TfidfVectorizer, MultinomialNB).
+        If memory_budget (bytes) is given, the least discriminative features
+        are pruned until the arrays fit.
+        """
+        tfidf = pipeline.steps[0][1]
+        clf = pipeline.steps[-1][1]
+
+        if not hasattr(tfidf, "vocabulary_") or not hasattr(clf, "feature_log_prob_"):
+            raise ValueError("Pipeline must be a fitted TfidfVectorizer + MultinomialNB")
+        if tfidf.analyzer != "word" or tfidf.tokenizer is not None or tfidf.preprocessor is not None \
+                or tfidf.strip_accents is not None or tfidf.stop_words is not None:
+            raise ValueError("Only the default word analyzer can be compiled")
+        if tfidf.sublinear_tf or tfidf.binary:
+            raise ValueError("sublinear_tf and binary term frequencies are not supported")
+
+        vocabulary = tfidf.vocabulary_
+        n_features = len(vocabulary)
+        terms = [None] * n_features
+        for term, index in vocabulary.items():
+            terms[index] = term
+
+        idf = tfidf.idf_ if tfidf.use_idf else np.ones(n_features)
+
+        # Subtracting a per-feature constant shifts every class score equally,
+        # so centring the log-probs leaves predictions untouched and makes the
+        # spread of each column a direct measure of how much it matters.
+        log_prob = clf.feature_log_prob_.T
+        log_prob = log_prob - log_prob.mean(axis=1, keepdims=True)
+
+        keep = np.arange(n_features)
+        if memory_budget is not None:
+            n_classes = log_prob.shape[1]
+            avg_term_bytes = max(1, sum(len(t.encode("utf-8")) for t in terms) // max(1, n_features))
+            # weights row + idf + term bytes + two hash slots per feature
+            per_feature = 4 * n_classes + 4 + avg_term_bytes + 8
+            max_features = max(1, int(memory_budget // per_feature))
+            if max_features < n_features:
+                spread = log_prob.max(axis=1) - log_prob.min(axis=1)
+                keep = np.sort(np.argsort(-spread, kind="stable")[:max_features])
+
+        kept_terms = [terms[i].encode("utf-8") for i in keep]
+        return cls(
+            terms=np.array(kept_terms, dtype=bytes),
+            table=cls._build_table(kept_terms),
+            idf=np.asarray(idf, dtype=np.float32)[keep],
+            weights=np.ascontiguousarray(log_prob[keep], dtype=np.float32),
+            class_log_prior=np.asarray(clf.class_log_prior_, dtype=np.float32),
+            classes=[str(c) for c in clf.classes_],
+            ngram_range=tfidf.ngram_range,
+            lowercase=tfidf.lowercase,
+            token_pattern=tfidf.token_pattern,
+            norm=tfidf.norm,
+        )
+
+    @staticmethod
+    def _build_table(terms: List[bytes]) -> np.ndarray:
+        size = 1
+        while size < 2 * max(1, len(terms)):
+            size <<= 1
+        table = np.full(size, -1, dtype=np.int32)
+        mask = size - 1
+        for index, term in enumerate(terms):
+            slot = zlib.crc32(term) & mask
+            while table[slot] != -1:
+                slot = (slot + 1) & mask
+            table[slot] = index
+        return table
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = self._token_re.findall(text)
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(" ".join(tokens[i:i + n]))
+        return ngrams
+
+    def lookup(self, tokens: List[bytes]) -> np.ndarray:
+        """Map encoded tokens to feature indices (-1 when out of vocabulary)"""
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        table, terms, mask = self.table, self.terms, self._mask
+        keys = np.array(tokens, dtype=bytes)
+        slots = np.fromiter((zlib.crc32(t) for t in tokens), dtype=np.int64, count=len(tokens)) & mask
+        result = np.full(len(tokens), -1, dtype=np.int64)
+        pending = np.arange(len(tokens))
+
+        # Probe all tokens in lock-step until each hits its term or an empty slot
+        while pending.size:
+            candidate = table[slots[pending]]
+            occupied = candidate >= 0
+            pending, candidate = pending[occupied], candidate[occupied]
+            found = terms[candidate] == keys[pending]
+            result[pending[found]] = candidate[found]
+            pending = pending[~found]
+            slots[pending] = (slots[pending] + 1) & mask
+        return result
+
+    def transform(self, descriptions: List[str]):
+        """Return the TF-IDF matrix in CSR parts: (indptr, indices, data)"""
+        doc_ids, tokens = [], []
+        for doc, text in enumerate(descriptions):
+            grams = self._analyze(text)
+            tokens.extend(g.encode("utf-8") for g in grams)
+            doc_ids.extend([doc] * len(grams))
+
+        features = self.lookup(tokens)
+        known = features >= 0
+        docs = np.asarray(doc_ids, dtype=np.int64)[known]
+        features = features[known]
+
+        # Count (doc, feature) pairs; np.unique also sorts them by document
+        n_features = len(self.terms)
+        keys, counts = np.unique(docs * n_features + features, return_counts=True)
+        docs, features = keys // n_features, keys % n_features
+        data = counts.astype(np.float32) * self.idf[features]
+
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(docs, weights=data * data, minlength=len(descriptions)))
+            data = data / norms[docs]
+        elif self.norm == "l1":
+            norms = np.bincount(docs, weights=np.abs(data), minlength=len(descriptions))
+            data = data / norms[docs]
+
+        indptr = np.zeros(len(descriptions) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(docs, minlength=len(descriptions)), out=indptr[1:])
+        return indptr, features, data.astype(np.float32)
+
+    def joint_log_likelihood(self, descriptions: List[str]) -> np.ndarray:
+        indptr, indices, data = self.transform(descriptions)
+        jll = np.tile(self.class_log_prior, (len(descriptions), 1))
+        if data.size:
+            contributions = data[:, None] * self.weights[indices]
+            rows = np.flatnonzero(np.diff(indptr))
+            jll[rows] += np.add.reduceat(contributions, indptr[rows], axis=0)
+        return jll
+
+    def predict_proba(self, descriptions: List[str]) -> np.ndarray:
+        jll = self.joint_log_likelihood(descriptions)
+        jll -= jll.max(axis=1, keepdims=True)
+        probabilities = np.exp(jll)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+    def predict(self, descriptions: List[str]) -> np.ndarray:
+        return self.classes_[self.joint_log_likelihood(descriptions).argmax(axis=1)]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.terms.nbytes + self.table.nbytes + self.idf.nbytes
+                   + self.weights.nbytes + self.class_log_prior.nbytes)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _metadata(self) -> Dict:
+        return {
+            "format_version": FORMAT_VERSION,
+            "classes": self.classes_.tolist(),
+            "ngram_range": list(self.ngram_range),
+            "lowercase": self.lowercase,
+            "token_pattern": self.token_pattern,
+            "norm": self.norm,
+        }
+
+    def save(self, path: str):
+        """Write the scorer to a single .npz file"""
+        np.savez(
+            path,
+            terms=self.terms,
+            table=self.table,
+            idf=self.idf,
+            weights=self.weights,
+            class_log_prior=self.class_log_prior,
+            metadata=np.array(json.dumps(self._metadata())),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledCategorizer":
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported compiled model format: {metadata.get('format_version')}")
+            return cls(
+                terms=data["terms"],
+                table=data["table"],
+                idf=data["idf"],
+                weights=data["weights"],
+                class_log_prior=data["class_log_prior"],
+                classes=metadata["classes"],
+                ngram_range=metadata["ngram_range"],
+                lowercase=metadata["lowercase"],
+                token_pattern=metadata["token_pattern"],
+                norm=metadata["norm"],
+            )
+
+    def save_directory(self, directory: str):
+        """
+        Write each array as a plain .npy file plus metadata.json. Unlike the
+        .npz archive these can be memory-mapped by load_directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(directory, name + ".npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(self._metadata(), f)
+
+    @classmethod
+    def load_directory(cls, directory: str, mmap: bool = True) -> "CompiledCategorizer":
+        """
+        Load a save_directory() model. With mmap the arrays are mapped
+        read-only, so every process serving the same version shares one
+        copy through the page cache.
+        """
+        with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format: {metadata.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(directory, name + ".npy"),
+                          mmap_mode="r" if mmap else None, allow_pickle=False)
+            for name in ARRAY_NAMES
+        }
+        return cls(
+            classes=metadata["classes"],
+            ngram_range=metadata["ngram_range"],
+            lowercase=metadata["lowercase"],
+            token_pattern=metadata["token_pattern"],
+            norm=metadata["norm"],
+            **arrays
+        )
+
+
+def _time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def compare_with_pipeline(pipeline, compiled: CompiledCategorizer, descriptions: List[str],
+                          repeat: int = 20) -> Dict:
+    """Report accuracy, latency and memory of the compiled scorer next to the pipeline"""
+    expected = pipeline.predict_proba(descriptions)
+    actual = compiled.predict_proba(descriptions)
+    single = descriptions[:1]
+
+    return {
+        "samples": len(descriptions),
+        "max_abs_diff": float(np.abs(expected - actual).max()) if len(descriptions) else 0.0,
+        "top1_agreement": float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))) if len(descriptions) else 1.0,
+        "features": {
+            "pipeline": len(pipeline.steps[0][1].vocabulary_),
+            "compiled": len(compiled.terms),
+        },
+        "latency_ms": {
+            "pipeline_single": _time_per_call(lambda: pipeline.predict_proba(single), repeat) * 1000,
+            "compiled_single": _time_per_call(lambda: compiled.predict_proba(single), repeat) * 1000,
+            "pipeline_batch": _time_per_call(lambda: pipeline.predict_proba(descriptions), repeat) * 1000,
+            "compiled_batch": _time_per_call(lambda: compiled.predict_proba(descriptions), repeat) * 1000,
+        },
+        "memory_bytes": {
+            "pipeline": len(pickle.dumps(pipeline)),
+            "compiled": compiled.nbytes,
+        },
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export the categorizer pipeline to a compiled NumPy scorer")
+    parser.add_argument("--model", default=os.path.join("models", "categorizer_model.pkl"))
+    parser.add_argument("--output", default=os.path.join("models", "categorizer_model.npz"))
+    parser.add_argument("--memory-budget", type=int, default=None, help="Prune features to fit this many bytes")
+    args = parser.parse_args()
+
+    pipeline = joblib.load(args.model)
+    compiled = CompiledCategorizer.from_pipeline(pipeline, memory_budget=args.memory_budget)
+    compiled.save(args.output)
+
+    samples = [
+        "monthly rent payment", "FNB SERVICE FEE", "ENGEN GARAGE PETROL", "UBER TRIP 1234",
+        "google ads campaign", "staff wages march", "coffee shop meeting", "cloud hosting invoice",
+        "vehicle insurance premium", "unknown merchant",
+    ] * 10
+    print(json.dumps(compare_with_pipeline(pipeline, compiled, samples), indent=2))
+    print(f"Compiled model written to {args.output}")
@@ -0,0 +1,173 @@
+"""
+Background document extraction jobs.
+
+Large scanned statements can take longer to OCR than a client is willing
+to wait on one request. POST /jobs/extract queues the document and
+returns a job id; the job runs on a small thread pool in this process
+(the OCR itself still goes to the OCR process pool) and records its page
+progress as it goes.
+
+Like the training jobs, status lives in <jobs_dir>/<id>.json and the
+result in <id>.result.json, so any uvicorn worker can answer
+GET /jobs/{id} and GET /jobs/{id}/result. Files are removed ttl seconds
+after the job finished. Queued and running jobs never expire on the ttl;
+only one that has made no progress for stale_after seconds, left behind
+by a worker that died, is removed.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.training import write_json_atomic
+
+# (contents, filename, content_type, on_page(page, page_count)) -> result
+Extractor = Callable[[bytes, str, str, Callable[[int, int], None]], Dict]
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when this worker already has max_queued jobs queued or running"""
+
+
+class ExtractionJobs:
+    def __init__(self, extract: Extractor, jobs_dir: str = "./cache/jobs", max_workers: int = 2,
+                 max_queued: int = 20, ttl: float = 3600.0, stale_after: float = 86400.0):
+        self.extract = extract
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._last_prune = 0.0
+
+    def _job_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _result_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.result.json")
+
+    def submit(self, contents: bytes, filename: str, content_type: str) -> Dict:
+        """Queue a document for extraction and return its job record"""
+        self.prune()
+        with self._lock:
+            if self.active >= self.max_queued:
+                self.rejected += 1
+                raise ExtractionQueueFull(f"Extraction queue is full ({self.max_queued} jobs pending)")
+            self.active += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="extraction-job")
+            executor = self._executor
+
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "filename": filename, "content_type": content_type,
+               "size": len(contents), "pages_done": 0, "pages_total": None, "created_at": time.time()}
+        try:
+            write_json_atomic(self._job_file(job_id), job)
+            # The worker updates its own copy; the caller's record is serialized concurrently
+            executor.submit(self._run, dict(job), contents)
+        except Exception:
+            with self._lock:
+                self.active -= 1
+            raise
+        return job
+
+    def _update(self, job: Dict, **fields):
+        job.update(fields, updated_at=time.time())
+        write_json_atomic(self._job_file(job["id"]), job)
+
+    def _run(self, job: Dict, contents: bytes):
+        try:
+            self._update(job, status="running", started_at=time.time())
+
+            def on_page(page: int, page_count: int):
+                self._update(job, pages_done=page, pages_total=page_count)
+
+            result = self.extract(contents, job["filename"], job["content_type"], on_page)
+            del contents
+            write_json_atomic(self._result_file(job["id"]), result)
+            self._update(job, status="completed", finished_at=time.time())
+            outcome = "completed"
+        except Exception as e:
+            print(f"Extraction job {job['id']} failed: {e}")
+            try:
+                self._update(job, status="failed", error=str(e), finished_at=time.time())
+            except OSError:
+                pass
+            outcome = "failed"
+        with self._lock:
+            self.active -= 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        if not job_id.isalnum():
+            return None
+        job = self._read(self._job_file(job_id))
+        if job is not None and self._expired(job, time.time()):
+            return None
+        return job
+
+    def result(self, job_id: str) -> Optional[Dict]:
+        if not job_id.isalnum():
+            return None
+        return self._read(self._result_file(job_id))
+
+    def _expired(self, job: Dict, now: float) -> bool:
+        if job.get("status") in ("completed", "failed"):
+            return now - (job.get("finished_at") or now) > self.ttl
+        # Still queued or running, unless its worker died: give up only after a long silence
+        return now - (job.get("updated_at") or job.get("created_at") or now) > self.stale_after
+
+    def prune(self):
+        """Delete finished jobs older than the TTL and abandoned ones; runs at most once a minute"""
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        try:
+            names = [n for n in os.listdir(self.jobs_dir) if n.endswith(".json") and not n.endswith(".result.json")]
+        except OSError:
+            return
+        for name in names:
+            job = self._read(os.path.join(self.jobs_dir, name))
+            if job is not None and not self._expired(job, now):
+                continue
+            job_id = name[:-len(".json")]
+            for path in (self._job_file(job_id), self._result_file(job_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "active": self.active,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
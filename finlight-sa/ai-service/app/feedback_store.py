@@ -0,0 +1,182 @@
+"""
+Feedback store for model retraining.
+
+/feedback calls are appended to an in-memory buffer and group-committed
+into a local SQLite database in WAL mode, either when the buffer reaches
+flush_rows or after flush_seconds. One transaction per group replaces a
+file reopen per request, and SQLite's locking keeps concurrent uvicorn
+workers from interleaving rows. Unflushed rows live only in this process
+until the next flush (at most flush_seconds).
+"""
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+FIELDS = ("description", "predicted_category", "correct_category", "amount", "timestamp")
+
+
+class FeedbackStore:
+    def __init__(self, db_path: str = "./models/feedback.db", flush_rows: int = 100,
+                 flush_seconds: float = 1.0, on_commit: Optional[Callable[[], None]] = None):
+        self.db_path = db_path
+        # Called after each group commit, e.g. to feed the online model
+        self.on_commit = on_commit
+        self.flush_rows = max(1, flush_rows)
+        self.flush_seconds = flush_seconds
+        self._buffer: List[Tuple] = []
+        self._lock = threading.Lock()
+        # Serializes flushes so rows are committed in arrival order
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self.flushes = 0
+        self.committed = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS feedback ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "description TEXT NOT NULL, "
+                    "predicted_category TEXT, "
+                    "correct_category TEXT NOT NULL, "
+                    "amount REAL, "
+                    "timestamp TEXT)"
+                )
+        finally:
+            conn.close()
+        self._import_csv(os.path.join(os.path.dirname(db_path), "feedback.csv"))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # WAL + NORMAL only fsyncs at checkpoints; a crash can lose the last commits, never corrupt the file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _import_csv(self, csv_path: str):
+        """One-off migration of the feedback.csv written by earlier versions"""
+        if not os.path.exists(csv_path):
+            return
+        # Claim the file first so only one worker imports it
+        claimed = f"{csv_path}.{os.getpid()}.importing"
+        try:
+            os.replace(csv_path, claimed)
+        except OSError:
+            return  # another worker got there first
+        with open(claimed, newline="", encoding="utf-8") as f:
+            rows = [tuple(row.get(field) for field in FIELDS) for row in csv.DictReader(f)]
+        self._commit(rows)
+        os.replace(claimed, csv_path + ".imported")
+        print(f"Imported {len(rows)} feedback rows from {csv_path}")
+
+    def add(self, description: str, predicted_category: str, correct_category: str, amount: float):
+        self.add_many([{
+            "description": description,
+            "predicted_category": predicted_category,
+            "correct_category": correct_category,
+            "amount": amount,
+        }])
+
+    def add_many(self, records: Iterable[Dict]):
+        """Buffer feedback records; they are committed as a group"""
+        timestamp = datetime.utcnow().isoformat()
+        rows = [
+            (r["description"], r["predicted_category"], r["correct_category"],
+             float(r["amount"]), r.get("timestamp") or timestamp)
+            for r in records
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.flush_rows
+            if not full and self._timer is None and self.flush_seconds > 0:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full or self.flush_seconds <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """Commit buffered rows in one transaction; returns the number written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not rows:
+                return 0
+            try:
+                self._commit(rows)
+            except sqlite3.Error as e:
+                print(f"Feedback flush error: {e}")
+                with self._lock:
+                    self._buffer[:0] = rows  # retried on the next flush
+                raise
+        if self.on_commit is not None:
+            try:
+                self.on_commit()
+            except Exception as e:
+                print(f"Feedback commit hook error: {e}")
+        return len(rows)
+
+    def _commit(self, rows: List[Tuple]):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO feedback (description, predicted_category, correct_category, amount, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        finally:
+            conn.close()
+        self.flushes += 1
+        self.committed += len(rows)
+
+    def count(self) -> int:
+        """Committed rows across all workers"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+        finally:
+            conn.close()
+
+    def iter_training_rows(self, batch_size: int = 10000) -> Iterator[List[Tuple[str, str]]]:
+        """Stream (description, correct_category) pairs in batches, oldest first"""
+        self.flush()
+        for batch in self.iter_rows_since(0, batch_size):
+            yield [(description, category) for _, description, category in batch]
+
+    def iter_rows_since(self, after_id: int, batch_size: int = 10000) -> Iterator[List[Tuple[int, str, str]]]:
+        """Stream committed (id, description, correct_category) rows newer than after_id"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT id, description, correct_category FROM feedback WHERE id > ? ORDER BY id",
+                (after_id,)
+            )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            conn.close()
+
+    def close(self):
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.db_path,
+            "buffered": len(self._buffer),
+            "flush_rows": self.flush_rows,
+            "flush_seconds": self.flush_seconds,
+            "flushes": self.flushes,
+            "committed": self.committed,
+        }
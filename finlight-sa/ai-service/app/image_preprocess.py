@@ -0,0 +1,218 @@
+"""
+Image preprocessing in front of Tesseract.
+
+Tesseract's run time grows with pixel count, and phone photos of receipts
+are often 12+ megapixel colour images with text far larger than it
+needs. Each step below is cheap compared with the OCR it saves:
+
+1. JPEG draft decode: libjpeg decodes straight to grayscale at 1/2, 1/4
+   or 1/8 scale when the full resolution is not needed. A 1/8 scale probe
+   decode (a few milliseconds) measures the text size to pick the scale
+2. EXIF orientation fix, so sideways photos are read upright
+3. grayscale conversion
+4. crop to the receipt: the largest bright band of rows and columns,
+   which drops the table or background around the paper
+5. downscale so text lines are about target_text_height pixels tall,
+   estimated from the row profile of the dark pixels
+6. Otsu binarization and a tight crop to the ink plus a margin
+
+Tesseract settings (--psm/--oem) are chosen per document type.
+"""
+import math
+import os
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Page segmentation per document type: receipts are one column of lines of varying size,
+# invoices and statement pages have multi-column layouts Tesseract should find itself
+DEFAULT_TESSERACT_CONFIGS = {
+    "receipt": "--psm 4",
+    "invoice": "--psm 3",
+    "page": "--psm 3",
+}
+
+
+class ImagePreprocessor:
+    def __init__(self, enabled: bool = True, max_edge: int = 3000, target_text_height: int = 40,
+                 binarize: bool = True, crop: bool = True, margin: int = 12,
+                 tesseract_configs: Optional[Dict[str, str]] = None):
+        self.enabled = enabled
+        # Longest side after decoding; also bounds the JPEG draft scale
+        self.max_edge = max_edge
+        # Text line height (ascender to descender) Tesseract reads reliably; 0 disables text-height scaling
+        self.target_text_height = target_text_height
+        self.binarize = binarize
+        self.crop = crop
+        self.margin = margin
+        self.tesseract_configs = dict(DEFAULT_TESSERACT_CONFIGS)
+        self.tesseract_configs.update(tesseract_configs or {})
+
+    @classmethod
+    def from_env(cls) -> "ImagePreprocessor":
+        configs = {}
+        for document_type in DEFAULT_TESSERACT_CONFIGS:
+            value = os.getenv(f"OCR_TESSERACT_CONFIG_{document_type.upper()}")
+            if value is not None:
+                configs[document_type] = value
+        return cls(
+            enabled=os.getenv("OCR_PREPROCESS", "true").lower() == "true",
+            max_edge=int(os.getenv("OCR_MAX_EDGE", "3000")),
+            target_text_height=int(os.getenv("OCR_TARGET_TEXT_HEIGHT", "40")),
+            binarize=os.getenv("OCR_BINARIZE", "true").lower() == "true",
+            crop=os.getenv("OCR_CROP", "true").lower() == "true",
+            tesseract_configs=configs,
+        )
+
+    def signature(self) -> str:
+        """Everything here that changes OCR output, for the OCR cache key"""
+        if not self.enabled:
+            return "pre=off"
+        return (f"pre=1;edge={self.max_edge};text={self.target_text_height};"
+                f"bin={int(self.binarize)};crop={int(self.crop)};margin={self.margin}")
+
+    def tesseract_config(self, document_type: str) -> str:
+        return self.tesseract_configs.get(document_type, "")
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+    def open(self, image_bytes):
+        """Open image bytes, set up to decode at reduced scale for JPEGs when preprocessing is on"""
+        from PIL import Image
+        if isinstance(image_bytes, Image.Image):
+            return image_bytes
+        image = Image.open(BytesIO(image_bytes))
+        if self.enabled and image.format == "JPEG":
+            scale = min(1.0, self.max_edge / max(image.size))
+            if self.target_text_height > 0:
+                text_height = self._probe_text_height(image_bytes)
+                if text_height is not None:
+                    scale = min(scale, self.target_text_height / text_height)
+            if scale < 1.0:
+                # draft() picks the smallest 1/2^n scale that is still at least the requested size
+                image.draft("L", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        return image
+
+    def _probe_text_height(self, image_bytes: bytes) -> Optional[float]:
+        """Text line height in full-resolution pixels, measured on a 1/8 scale decode"""
+        from PIL import Image, ImageOps
+        probe = Image.open(BytesIO(image_bytes))
+        full_width = probe.width
+        probe.draft("L", (probe.width // 8, probe.height // 8))
+        factor = full_width / probe.width
+        probe = ImageOps.exif_transpose(probe).convert("L")
+        if self.crop:
+            probe = self._crop_to_paper(probe)
+        text_height = self._text_height(probe)
+        if text_height is None or text_height < 4:
+            return None  # too small to measure at this scale; decode at full size
+        return text_height * factor
+
+    def process(self, image_bytes) -> Tuple["Image.Image", Dict]:
+        """Return the image to OCR and a report of what was done to it"""
+        from PIL import Image, ImageOps
+
+        image = self.open(image_bytes)
+        report = {"input_size": list(image.size)}
+        if not self.enabled:
+            return image, report
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "L":
+            image = image.convert("L")
+        report["decoded_size"] = list(image.size)
+
+        if self.crop:
+            image = self._crop_to_paper(image)
+
+        scale = min(1.0, self.max_edge / max(image.size))
+        text_height = self._text_height(image) if self.target_text_height > 0 else None
+        report["text_height"] = text_height
+        if text_height is not None and text_height * scale > self.target_text_height:
+            scale = self.target_text_height / text_height
+        if scale < 1.0:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            # reducing_gap lets Pillow shrink by an integer factor first, which is much faster
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        if self.binarize:
+            threshold = otsu_threshold(image.histogram())
+            image = image.point(lambda value: 255 if value > threshold else 0)
+            if self.crop:
+                image = self._crop_to_ink(image, np.asarray(image) == 0)
+
+        report["output_size"] = list(image.size)
+        return image, report
+
+    def _crop_to_paper(self, image):
+        """Crop to the largest band of mostly bright rows and columns, i.e. the receipt on a darker surface"""
+        thumbnail = image.copy()
+        thumbnail.thumbnail((400, 400))
+        bright = np.asarray(thumbnail) > otsu_threshold(thumbnail.histogram())
+        # Relative to the brightest line, since the paper may cover only part of the photo either way
+        row_share = bright.mean(axis=1)
+        column_share = bright.mean(axis=0)
+        rows = _longest_run(row_share > 0.5 * row_share.max())
+        columns = _longest_run(column_share > 0.5 * column_share.max())
+        if rows is None or columns is None:
+            return image
+        fx = image.width / thumbnail.width
+        fy = image.height / thumbnail.height
+        box = (int(columns[0] * fx), int(rows[0] * fy), int(columns[1] * fx), int(rows[1] * fy))
+        # Only crop when it removes a real border; a plain scan is already the paper
+        if (box[2] - box[0]) * (box[3] - box[1]) > 0.9 * image.width * image.height:
+            return image
+        return image.crop(box)
+
+    def _text_height(self, image) -> Optional[float]:
+        """Median height of the runs of rows that contain dark pixels, None if there is no clear text"""
+        dark = np.asarray(image) <= otsu_threshold(image.histogram())
+        ink_share = dark.mean(axis=1)
+        # Mostly dark rows are background or shadow, not text
+        ink_rows = (ink_share > 0.005) & (ink_share < 0.5)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], ink_rows.astype(np.int8), [0]))))
+        heights = edges[1::2] - edges[0::2]
+        heights = heights[heights >= 4]  # specks and rules
+        if len(heights) < 3:
+            return None
+        return float(np.median(heights))
+
+    def _crop_to_ink(self, image, ink: np.ndarray):
+        rows = np.flatnonzero(ink.any(axis=1))
+        columns = np.flatnonzero(ink.any(axis=0))
+        if len(rows) == 0 or len(columns) == 0:
+            return image
+        m = self.margin
+        return image.crop((
+            max(0, columns[0] - m), max(0, rows[0] - m),
+            min(image.width, columns[-1] + 1 + m), min(image.height, rows[-1] + 1 + m),
+        ))
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """Grey level that best separates dark text from light paper, from a 256-bin histogram"""
+    histogram = np.asarray(histogram, dtype=np.float64)
+    total = histogram.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = total - weight_dark
+    mean_dark = np.cumsum(histogram * levels)
+    global_mean = mean_dark[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (global_mean * weight_dark / total - mean_dark) ** 2 / (weight_dark * weight_light)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def _longest_run(mask: np.ndarray) -> Optional[Tuple[int, int]]:
+    """(start, stop) of the longest run of True values"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    if len(edges) == 0:
+        return None
+    starts, stops = edges[0::2], edges[1::2]
+    longest = int(np.argmax(stops - starts))
+    return int(starts[longest]), int(stops[longest])
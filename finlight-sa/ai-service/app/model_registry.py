@@ -0,0 +1,232 @@
+"""
+Per-business categorization models.
+
+A business gets its own model once one has been trained from its
+feedback into models/<business_id>/; until then its requests are scored
+by the global model. Tenant models are loaded on first use and kept in
+an LRU bounded both by count and by the bytes of their model arrays, so
+memory stays flat however many businesses are onboarded. Compiled
+artifacts are memory-mapped, so reloading an evicted model is cheap.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.categorizer import TransactionCategorizer
+from app.training import CURRENT_POINTER, LEGACY_MODEL_FILE
+
+BUSINESS_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Directories under models/ that belong to the global model
+RESERVED_IDS = {"jobs", "compiled"}
+
+
+def model_nbytes(categorizer: TransactionCategorizer) -> int:
+    """Memory held by a categorizer's live model"""
+    if categorizer.online is not None:
+        return categorizer.online.stats()["nbytes"]
+    state = categorizer.state
+    if state.scorer is not None and state.model is None:
+        return state.scorer.nbytes
+    # An sklearn pipeline; its pickle size is a fair estimate
+    try:
+        return os.path.getsize(state.model_file) if state.model_file else 0
+    except OSError:
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self, default: TransactionCategorizer, max_models: int = 100,
+                 max_bytes: int = 256 * 1024 * 1024, check_interval: float = 2.0,
+                 prediction_cache_size: int = 1000):
+        self.default = default
+        self.root = default.model_path
+        self.max_models = max(1, max_models)
+        self.max_bytes = max_bytes
+        # How often a cached tenant looks for a model published by another worker
+        self.check_interval = check_interval
+        self.prediction_cache_size = prediction_cache_size
+        self._tenants: "OrderedDict[str, TransactionCategorizer]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {}
+        # business id -> lock held while that tenant's model is loaded
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        # Statistics
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def validate(business_id: Optional[str]) -> Optional[str]:
+        """Normalized business id, None for the global model; ValueError if it is not a safe directory name"""
+        if business_id is None or not business_id.strip():
+            return None
+        business_id = business_id.strip().lower()
+        if not BUSINESS_ID_PATTERN.match(business_id) or business_id in RESERVED_IDS:
+            raise ValueError(f"Invalid business id: {business_id!r}")
+        return business_id
+
+    def tenant_path(self, business_id: str) -> str:
+        return os.path.join(self.root, business_id)
+
+    def has_model(self, business_id: str) -> bool:
+        path = self.tenant_path(business_id)
+        return any(
+            os.path.exists(os.path.join(path, name))
+            for name in (CURRENT_POINTER, LEGACY_MODEL_FILE, "online_model.npz")
+        )
+
+    def for_prediction(self, business_id: Optional[str]) -> TransactionCategorizer:
+        """The business's own model if it has one, otherwise the global model"""
+        business_id = self.validate(business_id)
+        if business_id is None:
+            return self.default
+        tenant = self._get(business_id, create=False)
+        if tenant is None or not tenant.loaded:
+            self.fallbacks += 1
+            return self.default
+        return tenant
+
+    def for_feedback(self, business_id: Optional[str]) -> TransactionCategorizer:
+        """
+        The categorizer whose feedback store records this business's
+        corrections. Created even before the business has a model, so it
+        can be trained on them.
+        """
+        business_id = self.validate(business_id)
+        if business_id is None:
+            return self.default
+        return self._get(business_id, create=True)
+
+    def activate(self, business_id: str, model_file: str):
+        """Make a freshly trained tenant model live"""
+        tenant = self._get(business_id, create=True)
+        tenant.activate_model_file(model_file)
+        with self._lock:
+            self._resize(business_id, tenant)
+
+    def _get(self, business_id: str, create: bool) -> Optional[TransactionCategorizer]:
+        # The registry lock only guards the LRU; loading a model and checking for a
+        # newer one happen outside it, so one slow tenant never blocks the others
+        with self._lock:
+            tenant, refresh = self._cached(business_id)
+            if tenant is None:
+                loading = self._loading.setdefault(business_id, threading.Lock())
+        if tenant is not None:
+            if refresh:
+                self._refresh(business_id, tenant)
+            return tenant
+
+        # Concurrent first requests for this tenant wait for one load
+        try:
+            with loading:
+                with self._lock:
+                    tenant, _ = self._cached(business_id, check=False)
+                if tenant is not None:
+                    return tenant
+                return self._load(business_id, create)
+        finally:
+            with self._lock:
+                if self._loading.get(business_id) is loading:
+                    del self._loading[business_id]
+
+    def _cached(self, business_id: str, check: bool = True):
+        """(loaded tenant or None, whether it is due a check for a newer model); called with the lock held"""
+        tenant = self._tenants.get(business_id)
+        if tenant is None:
+            return None, False
+        self.hits += 1
+        self._tenants.move_to_end(business_id)
+        now = time.monotonic()
+        if check and not tenant.online_mode and now - self._checked[business_id] >= self.check_interval:
+            self._checked[business_id] = now
+            return tenant, True
+        return tenant, False
+
+    def _refresh(self, business_id: str, tenant: TransactionCategorizer):
+        try:
+            if tenant.check_for_new_model():
+                with self._lock:
+                    if self._tenants.get(business_id) is tenant:
+                        self._resize(business_id, tenant)
+        except Exception as e:
+            print(f"Error refreshing model for {business_id}: {e}")
+
+    def _load(self, business_id: str, create: bool) -> Optional[TransactionCategorizer]:
+        has_model = self.has_model(business_id)
+        if not has_model and not create:
+            return None
+        tenant = TransactionCategorizer(
+            self.tenant_path(business_id), load=False,
+            prediction_cache_size=self.prediction_cache_size
+        )
+        # Online tenants start from the seed data, so feedback is learned straight away
+        if has_model or tenant.online_mode:
+            tenant.load_or_create_model()
+
+        with self._lock:
+            current = self._tenants.get(business_id)
+            if current is not None:
+                # Loaded by a request that started after this one's lock was released
+                evicted = [tenant]
+                tenant = current
+            else:
+                self.loads += 1
+                self._tenants[business_id] = tenant
+                self._checked[business_id] = time.monotonic()
+                self._sizes[business_id] = 0
+                self._resize(business_id, tenant)
+                evicted = self._evict()
+
+        for old in evicted:
+            try:
+                old.close()
+            except Exception as e:
+                print(f"Error closing evicted model: {e}")
+        return tenant
+
+    def _resize(self, business_id: str, tenant: TransactionCategorizer):
+        size = model_nbytes(tenant)
+        if business_id in self._sizes:
+            self.bytes += size - self._sizes[business_id]
+            self._sizes[business_id] = size
+
+    def _evict(self) -> List[TransactionCategorizer]:
+        """Drop least recently used tenants until both limits hold; the newest one always stays"""
+        evicted = []
+        while len(self._tenants) > 1 and (
+                len(self._tenants) > self.max_models or self.bytes > self.max_bytes):
+            business_id, tenant = self._tenants.popitem(last=False)
+            self.bytes -= self._sizes.pop(business_id)
+            del self._checked[business_id]
+            self.evictions += 1
+            evicted.append(tenant)
+        return evicted
+
+    def close(self):
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+            self._sizes.clear()
+            self._checked.clear()
+            self.bytes = 0
+        for tenant in tenants:
+            tenant.close()
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": len(self._tenants),
+            "bytes": self.bytes,
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "fallbacks": self.fallbacks,
+        }
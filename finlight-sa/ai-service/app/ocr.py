@@ -3,13 +3,61 @@ from datetime import datetime
 from typing import Dict, List, Optional
 import base64
 from io import BytesIO
-from PIL import Image
-import pytesseract
 import os
+from app.image_preprocess import ImagePreprocessor
+from app.metrics import stage
+from app.ocr_engine import PytesseractEngine, create_engine
+from app.ocr_cache import OCRDiskCache
+from app import receipt_roi
+
+
+class OCRResult:
+    """
+    Everything produced by a single Tesseract pass over a document:
+    the raw text, the word boxes with confidences and the parsed fields
+    """
+    def __init__(self, raw_text: str = "", words: Optional[List[dict]] = None,
+                 fields: Optional[Dict] = None):
+        self.raw_text = raw_text
+        self.words = words or []
+        self.fields = fields or {}
+    
+    @property
+    def confidence(self) -> Optional[float]:
+        """Mean word confidence between 0 and 1, None when no words were recognised"""
+        scores = [word["conf"] for word in self.words if word["conf"] >= 0]
+        if not scores:
+            return None
+        return sum(scores) / len(scores) / 100
+    
+    def to_dict(self) -> Dict:
+        return {
+            "raw_text": self.raw_text,
+            "words": self.words,
+            "fields": self.fields,
+            "confidence": self.confidence
+        }
+
 
 class OCRService:
-    def __init__(self):
+    def __init__(self, probe: bool = True):
         self.vision_available = False
+        self.tesseract_version = ""
+        self.cache = None
+        self.preprocessor = ImagePreprocessor.from_env()
+        # Set by probe(); see app.ocr_engine
+        self.engine = None
+        # Callers that only want receipt fields get region-of-interest OCR (see app.receipt_roi)
+        self.receipt_roi = os.getenv("OCR_RECEIPT_ROI", "true").lower() == "true"
+        self.layout_scale = float(os.getenv("OCR_LAYOUT_SCALE", "0.4"))
+        if probe:
+            self.probe()
+    
+    def probe(self):
+        """Locate Tesseract and set up the OCR cache. Runs tesseract subprocesses, so it is slow."""
+        # pytesseract pulls in pandas; imported here so a cold start does not pay for it
+        import pytesseract
+        
         try:
             # Try to use Tesseract OCR
             # Check if tesseract is available
@@ -80,17 +128,210 @@ class OCRService:
                         print("Install with: apt-get install tesseract-ocr (Ubuntu/Debian)")
         except Exception as e:
             print(f"✗ OCR initialization error: {e}")
+        
+        try:
+            self.engine = create_engine(os.getenv("OCR_ENGINE", "auto"))
+        except Exception as e:
+            print(f"✗ OCR engine error: {e}")
+        if self.engine is not None and self.engine.name == "tesserocr":
+            # libtesseract works without the tesseract executable
+            self.vision_available = True
+            print("✓ Tesseract engine kept loaded in-process (tesserocr)")
+        
+        if self.vision_available:
+            try:
+                self.tesseract_version = f"{self.get_engine().name}-{self.get_engine().version}"
+            except Exception:
+                pass
+        
+        cache_mb = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+        if self.vision_available and cache_mb > 0:
+            try:
+                self.cache = OCRDiskCache(os.getenv("OCR_CACHE_DIR", "./cache/ocr"), cache_mb * 1024 * 1024)
+            except OSError as e:
+                print(f"⚠ OCR cache disabled: {e}")
 
     def is_available(self) -> bool:
         return self.vision_available
     
-    def extract_receipt_data(self, image_bytes: bytes) -> Dict:
+    def get_engine(self):
+        if self.engine is None:
+            self.engine = PytesseractEngine()
+        return self.engine
+    
+    def close(self):
+        if self.engine is not None:
+            self.engine.close()
+    
+    def cache_settings(self, document_type: str = "receipt") -> str:
+        """Everything besides the document bytes that changes OCR output"""
+        return (f"lang=eng;tesseract={self.tesseract_version};{self.preprocessor.signature()};"
+                f"config={self.preprocessor.tesseract_config(document_type)}")
+    
+    def cache_key(self, data, namespace: str, document_type: str = "receipt") -> Optional[str]:
+        # Decoded PIL images (PDF pages) are covered by the whole-document entry
+        if self.cache is None or not isinstance(data, (bytes, bytearray)):
+            return None
+        return self.cache.key(bytes(data), namespace, self.cache_settings(document_type))
+    
+    def lookup_cache(self, method: str, data, document_type: Optional[str] = None, raw_text: bool = True):
         """
-        Extract structured data from a receipt image using Tesseract OCR
+        Return what OCRService.<method>(data, document_type, ...) would return if it is already cached, else None
+        """
+        if method == "extract_text_from_pdf":
+            key = self.cache_key(data, "pdf", "page")
+            cached = self.cache.get(key) if key else None
+            return cached["raw_text"] if cached is not None else None
+        
+        if document_type is None:
+            document_type = "page" if method == "extract_text_from_image" else "receipt"
+        key = self.cache_key(data, "image", document_type)
+        cached = self.cache.get(key) if key else None
+        if cached is None and (method == "extract_receipt_data" or not raw_text):
+            # Field-only callers are also answered by a region-of-interest result
+            key = self.cache_key(data, "image-roi", document_type)
+            cached = self.cache.get(key) if key else None
+        if cached is None:
+            return None
+        if method == "extract_text_from_image":
+            return cached["raw_text"]
+        if not cached.get("fields"):
+            return None  # text was cached, fields still need parsing
+        result = OCRResult(cached["raw_text"], cached["words"], cached["fields"])
+        return result.fields if method == "extract_receipt_data" else result
+    
+    def _ocr_image_cached(self, image_bytes, document_type: str):
+        """Run OCR unless this image is cached; returns (cache key, result, cached fields present)"""
+        key = self.cache_key(image_bytes, "image", document_type)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return key, OCRResult(cached["raw_text"], cached["words"], cached.get("fields")), True
+        return key, self.run_ocr(image_bytes, document_type), False
+    
+    def load_image(self, image_bytes) -> "Image.Image":
+        """Open image bytes, or pass through an already decoded PIL image"""
+        from PIL import Image
+        if isinstance(image_bytes, Image.Image):
+            return image_bytes
+        return Image.open(BytesIO(image_bytes))
+    
+    def prepare_image(self, image_bytes) -> "Image.Image":
+        """Decode and preprocess an image for Tesseract (see app.image_preprocess)"""
+        with stage("ocr.image_decode"):
+            image = self.preprocessor.open(image_bytes)
+            image.load()  # Image.open is lazy; decode here so the later timings are their own
+        if not self.preprocessor.enabled:
+            return image
+        with stage("ocr.preprocess"):
+            image, _ = self.preprocessor.process(image)
+        return image
+    
+    def run_ocr(self, image_bytes, document_type: str = "receipt") -> OCRResult:
+        """
+        Run Tesseract once and return the raw text together with word boxes and confidences.
+        document_type ("receipt", "invoice" or "page") picks the Tesseract page segmentation mode.
+        """
+        image = self.prepare_image(image_bytes)
+        with stage("ocr.tesseract"):
+            data = self.get_engine().image_to_data(image, self.preprocessor.tesseract_config(document_type))
+        return self._result_from_data(data)
+    
+    def run_ocr_regions(self, image_bytes, document_type: str = "receipt") -> Optional[OCRResult]:
+        """
+        OCR only the receipt lines the field parsers use, found by a low-resolution layout pass.
+        raw_text holds just those lines. Returns None when the layout pass finds too little to go on.
+        """
+        from PIL import Image
+        image = self.prepare_image(image_bytes)
+        config = self.preprocessor.tesseract_config(document_type)
+        engine = self.get_engine()
+        
+        with stage("ocr.layout"):
+            size = (max(1, round(image.width * self.layout_scale)), max(1, round(image.height * self.layout_scale)))
+            data = engine.image_to_data(image.resize(size, Image.Resampling.BILINEAR), config)
+            lines = receipt_roi.layout_lines(data, self.layout_scale)
+            if len(lines) <= receipt_roi.HEADER_LINES:
+                return None  # a short receipt, or one the layout pass could not read
+            selected = receipt_roi.select_lines(lines)
+            bands = receipt_roi.line_bands(selected, image.height)
+            line_height = sorted(line["bottom"] - line["top"] for line in lines)[len(lines) // 2]
+            mosaic, placements = receipt_roi.build_mosaic(image, bands, gap=max(8, int(line_height)))
+        
+        with stage("ocr.tesseract"):
+            data = engine.image_to_data(mosaic, config)
+        result = self._result_from_data(data)
+        receipt_roi.map_words(result.words, placements)
+        return result
+    
+    def _result_from_data(self, data: Dict[str, List]) -> OCRResult:
+        """Build an OCRResult from image_to_data output"""
+        words = []
+        lines = []
+        current_line = None
+        current_words = []
+        for i, text in enumerate(data["text"]):
+            if data["level"][i] != 5 or not text.strip():
+                continue
+            
+            line_key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            if line_key != current_line:
+                if current_words:
+                    lines.append((current_line, " ".join(current_words)))
+                current_line = line_key
+                current_words = []
+            current_words.append(text)
+            
+            words.append({
+                "text": text,
+                "conf": float(data["conf"][i]),
+                "left": data["left"][i],
+                "top": data["top"][i],
+                "width": data["width"][i],
+                "height": data["height"][i],
+                "block": data["block_num"][i],
+                "line": data["line_num"][i]
+            })
+        if current_words:
+            lines.append((current_line, " ".join(current_words)))
+        
+        # Rebuild the text layout: one line per OCR line, blank line between paragraphs
+        raw_text = ""
+        previous = None
+        for line_key, line_text in lines:
+            if previous is not None and line_key[:3] != previous[:3]:
+                raw_text += "\n"
+            raw_text += line_text + "\n"
+            previous = line_key
+        
+        return OCRResult(raw_text=raw_text, words=words)
+    
+    def parse_receipt_text(self, text: str) -> Dict:
+        """Parse structured receipt fields out of OCR text"""
+        with stage("ocr.parse"):
+            vendor = self.parse_vendor(text)
+            amount = self.parse_amount(text)
+            date = self.parse_date(text)
+            vat_amount = self.parse_vat(text)
+            items = self.parse_items(text)
+        
+        return {
+            "vendor": vendor or "Unknown Vendor",
+            "amount": amount or 0.0,
+            "date": date or datetime.now().isoformat(),
+            "vat_amount": vat_amount,
+            "items": items
+        }
+    
+    def process_receipt(self, image_bytes: bytes, document_type: str = "receipt",
+                        raw_text: bool = True) -> OCRResult:
+        """
+        OCR a receipt or invoice image once and parse its fields from the same result.
+        With raw_text=False only the regions the fields come from are OCR'd, and raw_text is partial.
         """
         if not self.vision_available:
             # Fallback to mock data if Tesseract is not available
-            return {
+            return OCRResult(fields={
                 "vendor": "Sample Vendor",
                 "amount": 0.0,
                 "date": datetime.now().isoformat(),
@@ -103,41 +344,61 @@ class OCRService:
                         "total": 0.0
                     }
                 ]
-            }
+            })
         
         try:
-            # Convert bytes to PIL Image
-            image = Image.open(BytesIO(image_bytes))
-            
-            # Perform OCR
-            text = pytesseract.image_to_string(image, lang='eng')
-            
-            # Parse the extracted text
-            vendor = self.parse_vendor(text)
-            amount = self.parse_amount(text)
-            date = self.parse_date(text)
-            vat_amount = self.parse_vat(text)
-            items = self.parse_items(text)
-            
-            return {
-                "vendor": vendor or "Unknown Vendor",
-                "amount": amount or 0.0,
-                "date": date or datetime.now().isoformat(),
-                "vat_amount": vat_amount,
-                "items": items
-            }
+            if not raw_text and self.receipt_roi:
+                try:
+                    result = self._process_receipt_regions(image_bytes, document_type)
+                except Exception as e:
+                    # The full pass below is the fallback, not the minimal record
+                    print(f"Region OCR error, reading the whole receipt: {e}")
+                    result = None
+                if result is not None:
+                    return result
+            key, result, from_cache = self._ocr_image_cached(image_bytes, document_type)
+            if from_cache and result.fields:
+                return result
+            result.fields = self.parse_receipt_text(result.raw_text)
+            if key:
+                self.cache.put(key, result.to_dict())
+            return result
         except Exception as e:
             print(f"OCR extraction error: {e}")
             # Return minimal data on error
-            return {
+            return OCRResult(fields={
                 "vendor": "Unknown Vendor",
                 "amount": 0.0,
                 "date": datetime.now().isoformat(),
                 "vat_amount": 0.0,
                 "items": []
-            }
+            })
     
-    def extract_text_from_image(self, image_bytes: bytes) -> str:
+    def _process_receipt_regions(self, image_bytes, document_type: str) -> Optional[OCRResult]:
+        """Fields from region-of-interest OCR; None when the full pass is needed after all"""
+        for namespace in ("image", "image-roi"):
+            key = self.cache_key(image_bytes, namespace, document_type)
+            cached = self.cache.get(key) if key else None
+            if cached is not None and cached.get("fields"):
+                return OCRResult(cached["raw_text"], cached["words"], cached["fields"])
+        
+        result = self.run_ocr_regions(image_bytes, document_type)
+        if result is None:
+            return None
+        result.fields = self.parse_receipt_text(result.raw_text)
+        if not result.fields["amount"]:
+            return None  # the total was not among the regions; read the whole receipt
+        if key:
+            self.cache.put(key, result.to_dict())
+        return result
+    
+    def extract_receipt_data(self, image_bytes: bytes, document_type: str = "receipt") -> Dict:
+        """
+        Extract structured data from a receipt image using Tesseract OCR
+        """
+        return self.process_receipt(image_bytes, document_type, raw_text=False).fields
+    
+    def extract_text_from_image(self, image_bytes: bytes, document_type: str = "page") -> str:
         """
         Extract raw text from an image using Tesseract OCR
         """
@@ -145,13 +406,43 @@ class OCRService:
             return "OCR not available"
         
         try:
-            image = Image.open(BytesIO(image_bytes))
-            text = pytesseract.image_to_string(image, lang='eng')
-            return text
+            key, result, from_cache = self._ocr_image_cached(image_bytes, document_type)
+            if key and not from_cache:
+                self.cache.put(key, result.to_dict())
+            return result.raw_text
         except Exception as e:
             print(f"Text extraction error: {e}")
             return ""
     
+    def extract_text_from_pdf(self, pdf_bytes: bytes) -> str:
+        """
+        Extract text from a PDF by rasterizing its pages and running OCR on each
+        """
+        try:
+            from app.statement_pdf import PageRasterizer
+            
+            key = self.cache_key(pdf_bytes, "pdf", "page")
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                return cached["raw_text"]
+            
+            # Rasterize and OCR one page at a time to keep memory flat
+            rasterizer = PageRasterizer(pdf_bytes)
+            extracted_text = ""
+            try:
+                for page_number in range(1, rasterizer.page_count() + 1):
+                    text = self.extract_text_from_image(rasterizer.render(page_number))
+                    extracted_text += text + "\n---PAGE BREAK---\n"
+            finally:
+                rasterizer.close()
+            
+            if key:
+                self.cache.put(key, {"raw_text": extracted_text})
+            return extracted_text
+        except Exception as e:
+            print(f"PDF OCR extraction error: {e}")
+            return ""
+    
     def parse_amount(self, text: str) -> Optional[float]:
         """
         Extract monetary amounts from text
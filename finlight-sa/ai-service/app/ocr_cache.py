@@ -0,0 +1,125 @@
+"""
+Content-addressed on-disk cache for OCR results.
+
+Entries are JSON files named by the SHA-256 of the document bytes, the
+OCR settings and the parser version, so a re-uploaded receipt or
+statement costs a hash and a file read. Writes go through a temporary
+file and an atomic rename, which keeps the cache safe to share between
+uvicorn worker processes; eviction is least-recently-used by file mtime.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+# Bump whenever the receipt/statement parsers change what they extract
+PARSER_VERSION = "1"
+
+
+class OCRDiskCache:
+    def __init__(self, directory: str = "./cache/ocr", max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, data: bytes, namespace: str, settings: str = "") -> str:
+        digest = hashlib.sha256(data)
+        digest.update(f"\0{namespace}\0{settings}\0{PARSER_VERSION}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        # Two-level fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = json.dumps(value).encode("utf-8")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"OCR cache write error: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._disk_usage()[0]
+            else:
+                self._approx_bytes += len(payload)
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _disk_usage(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # removed by another worker
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        return total, entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache is at 90% of its budget"""
+        with self._lock:
+            total, entries = self._disk_usage()
+            target = self.max_bytes * 0.9
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    pass  # another worker got there first
+                total -= size
+            self._approx_bytes = total
+
+    def stats(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "approx_bytes": self._approx_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
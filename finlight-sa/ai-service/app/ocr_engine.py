@@ -0,0 +1,172 @@
+"""
+Tesseract engines behind OCRService.run_ocr.
+
+pytesseract runs the tesseract executable for every call: it writes the
+image to a temp file, starts a process that loads the eng traineddata from
+disk, and reads the result back. On a small receipt that startup costs
+more than the recognition itself. When the optional tesserocr package is
+installed, TesserocrEngine keeps libtesseract initialised in the process
+(one instance per thread), so the OCR pool workers hold the language data
+in memory and receive images through shared memory only.
+
+OCR_ENGINE selects the engine: auto (tesserocr when installed, else
+pytesseract), tesserocr or pytesseract.
+"""
+import shlex
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+def parse_config(config: str) -> Tuple[Optional[int], Optional[int], Dict[str, str]]:
+    """Split a tesseract command-line config into (psm, oem, variables)"""
+    psm = oem = None
+    variables = {}
+    tokens = shlex.split(config or "")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token == "--psm" and value is not None:
+            psm = int(value)
+            i += 1
+        elif token == "--oem" and value is not None:
+            oem = int(value)
+            i += 1
+        elif token == "-c" and value is not None and "=" in value:
+            key, _, setting = value.partition("=")
+            variables[key] = setting
+            i += 1
+        i += 1
+    return psm, oem, variables
+
+
+class PytesseractEngine:
+    """One tesseract process per call"""
+
+    name = "pytesseract"
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+
+    @property
+    def version(self) -> str:
+        import pytesseract
+        return str(pytesseract.get_tesseract_version())
+
+    def warm(self):
+        pass
+
+    def image_to_data(self, image, config: str = "") -> Dict[str, List]:
+        import pytesseract
+        return pytesseract.image_to_data(image, lang=self.lang, config=config,
+                                         output_type=pytesseract.Output.DICT)
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """libtesseract kept loaded in this process, one API instance per thread and --oem"""
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "eng"):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        # "tesseract 5.3.0\n leptonica-1.82.0 ..."
+        first_line = self._tesserocr.tesseract_version().splitlines()[0]
+        return first_line.split()[-1]
+
+    def _api(self, oem: Optional[int]):
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get(oem)
+        if api is None:
+            tesserocr = self._tesserocr
+            # Loading the traineddata is the expensive part; it happens once per thread
+            api = tesserocr.PyTessBaseAPI(
+                lang=self.lang, oem=tesserocr.OEM(oem) if oem is not None else tesserocr.OEM.DEFAULT
+            )
+            apis[oem] = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def warm(self):
+        self._api(None)
+
+    def image_to_data(self, image, config: str = "") -> Dict[str, List]:
+        """Word boxes in pytesseract's image_to_data(output_type=DICT) layout"""
+        tesserocr = self._tesserocr
+        RIL = tesserocr.RIL
+        psm, oem, variables = parse_config(config)
+        api = self._api(oem)
+        api.SetPageSegMode(tesserocr.PSM(psm) if psm is not None else tesserocr.PSM.AUTO)
+        previous = {key: api.GetVariableAsString(key) for key in variables}
+        for key, value in variables.items():
+            api.SetVariable(key, value)
+
+        data = {key: [] for key in ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                                    "left", "top", "width", "height", "conf", "text")}
+        try:
+            api.SetImage(image)
+            api.Recognize()
+            iterator = api.GetIterator()
+            block = par = line = word = 0
+            for item in tesserocr.iterate_level(iterator, RIL.WORD):
+                if item.IsAtBeginningOf(RIL.BLOCK):
+                    block, par, line, word = block + 1, 0, 0, 0
+                if item.IsAtBeginningOf(RIL.PARA):
+                    par, line, word = par + 1, 0, 0
+                if item.IsAtBeginningOf(RIL.TEXTLINE):
+                    line, word = line + 1, 0
+                word += 1
+                text = item.GetUTF8Text(RIL.WORD)
+                box = item.BoundingBox(RIL.WORD)
+                if text is None or box is None:
+                    continue
+                left, top, right, bottom = box
+                for key, value in (("level", 5), ("page_num", 1), ("block_num", block), ("par_num", par),
+                                   ("line_num", line), ("word_num", word), ("left", left), ("top", top),
+                                   ("width", right - left), ("height", bottom - top),
+                                   ("conf", item.Confidence(RIL.WORD)), ("text", text)):
+                    data[key].append(value)
+        finally:
+            # Variables set for this call must not leak into the next document
+            for key, value in previous.items():
+                if value is not None:
+                    api.SetVariable(key, value)
+            api.Clear()
+        return data
+
+    def close(self):
+        with self._lock:
+            apis, self._apis = self._apis, []
+        for api in apis:
+            api.End()
+
+
+def create_engine(name: str = "auto", lang: str = "eng"):
+    """The requested engine; auto falls back to pytesseract when tesserocr is not installed or fails"""
+    name = (name or "auto").lower()
+    if name not in ("auto", "tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown OCR engine: {name}")
+    if name != "pytesseract":
+        try:
+            engine = TesserocrEngine(lang)
+            engine.warm()
+            return engine
+        except Exception as e:  # ImportError, or libtesseract without the traineddata
+            if name == "tesserocr":
+                raise
+            if not isinstance(e, ImportError):
+                print(f"⚠ tesserocr unavailable, using pytesseract: {e}")
+    return PytesseractEngine(lang)
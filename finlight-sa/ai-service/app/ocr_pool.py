@@ -0,0 +1,192 @@
+"""
+Bounded process pool for Tesseract OCR.
+
+OCR is CPU-bound and runs for seconds on large photos, so it is kept off
+the event loop entirely. Document bytes are handed to the workers through
+shared memory instead of being pickled through the executor pipe, and a
+full queue is reported immediately instead of piling up requests.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional
+
+from app.metrics import capture_stages, record_stages
+
+# OCRService methods the workers are allowed to run
+WORKER_METHODS = {"process_receipt", "extract_receipt_data", "extract_text_from_image", "extract_text_from_pdf"}
+
+_worker_service = None
+
+
+class OCRPoolSaturated(Exception):
+    """Raised when the OCR queue is full"""
+
+
+def _init_worker(tesseract_cmd: str):
+    global _worker_service
+    import pytesseract
+    from app.ocr import OCRService
+
+    # Reuse the binary the parent already located instead of probing again
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    # Probing also loads the OCR engine, so a tesserocr worker keeps the traineddata from here on
+    _worker_service = OCRService()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Spawned workers share the parent's resource tracker, and the parent
+    # unlinks each segment once its task is done
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_in_worker(method: str, shm_name: str, size: int, args: tuple):
+    shm = _attach(shm_name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    # Stage timings travel back with the result, the parent process records them
+    with capture_stages() as stages:
+        result = getattr(_worker_service, method)(data, *args)
+    return result, stages
+
+
+class OCRProcessPool:
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            import pytesseract
+            # Spawned workers only import app.ocr, never the FastAPI app or the model
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(pytesseract.pytesseract.tesseract_cmd,),
+            )
+        return self._executor
+
+    def start(self):
+        """
+        Start every worker now instead of on the first documents, so no request
+        waits for a process spawn or for the OCR engine to load
+        """
+        with self._lock:
+            executor = self._get_executor()
+        # Tasks submitted while no worker is idle each start a new process
+        for future in [executor.submit(_ping) for _ in range(self.max_workers)]:
+            future.result()
+        print(f"✓ OCR pool started with {self.max_workers} worker(s)")
+
+    def submit(self, method: str, data: bytes, *args) -> Future:
+        """Run OCRService.<method>(data, *args) in a worker process"""
+        if method not in WORKER_METHODS:
+            raise ValueError(f"Unsupported OCR method: {method}")
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise OCRPoolSaturated(f"OCR queue is full ({self.max_pending} documents pending)")
+            self.pending += 1
+
+        shm = None
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            shm.buf[:len(data)] = data
+            future = self._dispatch(method, shm, len(data), args)
+        except Exception:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            with self._lock:
+                self.pending -= 1
+            raise
+
+        result = Future()
+
+        def release(done: Future, retried: bool = False):
+            # A worker died (OOM kill, crash in libtesseract): start a fresh pool and try once more
+            if not retried and not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                try:
+                    retry = self._dispatch(method, shm, len(data), args)
+                except Exception:
+                    pass
+                else:
+                    retry.add_done_callback(lambda again: release(again, retried=True))
+                    return
+
+            shm.close()
+            shm.unlink()
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            if done.cancelled():
+                result.cancel()
+            elif done.exception() is not None:
+                result.set_exception(done.exception())
+            else:
+                value, stages = done.result()
+                record_stages(stages)
+                result.set_result(value)
+
+        future.add_done_callback(release)
+        return result
+
+    def _dispatch(self, method: str, shm: shared_memory.SharedMemory, size: int, args: tuple) -> Future:
+        """Submit to the current executor, replacing it once if it is broken"""
+        with self._lock:
+            executor = self._get_executor()
+        try:
+            return executor.submit(_run_in_worker, method, shm.name, size, args)
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            with self._lock:
+                executor = self._get_executor()
+            return executor.submit(_run_in_worker, method, shm.name, size, args)
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a broken executor so the next submit starts a new one"""
+        with self._lock:
+            if self._executor is not executor:
+                return  # another caller already replaced it
+            self._executor = None
+        print("⚠ OCR worker process died, restarting the OCR pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, method: str, data: bytes, *args):
+        return await asyncio.wrap_future(self.submit(method, data, *args))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "started": self._executor is not None,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
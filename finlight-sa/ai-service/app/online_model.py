@@ -0,0 +1,171 @@
+"""
+Online categorizer updated from feedback with partial_fit.
+
+Descriptions are hashed with a stateless HashingVectorizer, so there is
+no vocabulary to refit, and the classifier is a multinomial Naive Bayes
+that keeps per-class feature counts. A partial_fit call only touches the
+hashed columns present in the batch, so learning costs O(batch) no
+matter how much feedback came before. Unlike sklearn's MultinomialNB,
+whose partial_fit rebuilds the whole class x feature log table, the log
+probabilities here are updated column by column.
+"""
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class OnlineCategorizer:
+    def __init__(self, classes: List[str], n_features: int = 2 ** 16, alpha: float = 0.01,
+                 ngram_range=(1, 2)):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self.alpha = alpha
+        self.ngram_range = tuple(ngram_range)
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, ngram_range=self.ngram_range,
+            alternate_sign=False, norm="l2"
+        )
+        self.classes_ = np.asarray(list(classes), dtype=object)
+        self._class_index = {c: i for i, c in enumerate(self.classes_)}
+        n_classes = len(self.classes_)
+        self.feature_count = np.zeros((n_features, n_classes), dtype=np.float64)
+        self.class_feature_total = np.zeros(n_classes, dtype=np.float64)
+        self.class_count = np.zeros(n_classes, dtype=np.float64)
+        self._rebuild()
+
+        self.updates = 0               # training rows learned so far
+        self.last_feedback_id = 0      # newest feedback row already learned
+        self._lock = threading.Lock()
+
+    def _rebuild(self):
+        # (n_features, n_classes) so a column update is a contiguous row write
+        self.log_feature = np.log(self.feature_count + self.alpha)
+
+    def _add_classes(self, labels: Iterable[str]):
+        new = [label for label in dict.fromkeys(labels) if label not in self._class_index]
+        if not new:
+            return
+        # Rare: a category outside the initial taxonomy
+        pad = len(new)
+        self.feature_count = np.hstack([self.feature_count, np.zeros((self.n_features, pad))])
+        self.log_feature = np.hstack([self.log_feature, np.full((self.n_features, pad), np.log(self.alpha))])
+        self.class_feature_total = np.concatenate([self.class_feature_total, np.zeros(pad)])
+        self.class_count = np.concatenate([self.class_count, np.zeros(pad)])
+        self.classes_ = np.concatenate([self.classes_, np.asarray(new, dtype=object)])
+        self._class_index = {c: i for i, c in enumerate(self.classes_)}
+
+    def partial_fit(self, descriptions: List[str], categories: List[str]) -> "OnlineCategorizer":
+        """Learn from one batch; cost is proportional to the batch, not the history"""
+        if not descriptions:
+            return self
+        X = self.vectorizer.transform(descriptions).tocsr()
+
+        with self._lock:
+            self._add_classes(categories)
+            y = np.fromiter((self._class_index[c] for c in categories), dtype=np.int64, count=len(categories))
+
+            # Per-class feature sums for the batch, restricted to the hashed columns it uses
+            touched = np.unique(X.indices)
+            delta = np.zeros((len(touched), len(self.classes_)))
+            local = np.searchsorted(touched, X.indices)
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            np.add.at(delta, (local, y[rows]), X.data)
+
+            self.feature_count[touched] += delta
+            self.log_feature[touched] = np.log(self.feature_count[touched] + self.alpha)
+            self.class_feature_total += delta.sum(axis=0)
+            self.class_count += np.bincount(y, minlength=len(self.classes_))
+            self.updates += len(descriptions)
+        return self
+
+    def joint_log_likelihood(self, descriptions: List[str]) -> np.ndarray:
+        X = self.vectorizer.transform(descriptions).tocsr()
+        with self._lock:
+            denominator = np.log(self.class_feature_total + self.alpha * self.n_features)
+            # Laplace-smoothed prior keeps categories without feedback finite
+            prior = np.log((self.class_count + 1) / (self.class_count.sum() + len(self.class_count)))
+            jll = X @ self.log_feature
+        row_sums = np.asarray(X.sum(axis=1)).reshape(-1, 1)
+        return jll - row_sums * denominator + prior
+
+    def predict_proba(self, descriptions: List[str]) -> np.ndarray:
+        jll = self.joint_log_likelihood(descriptions)
+        jll -= jll.max(axis=1, keepdims=True)
+        probabilities = np.exp(jll)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        return probabilities
+
+    def predict(self, descriptions: List[str]) -> np.ndarray:
+        return self.classes_[self.joint_log_likelihood(descriptions).argmax(axis=1)]
+
+    @property
+    def version(self) -> str:
+        return f"online-{self.updates}-{self.last_feedback_id}"
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def _metadata(self) -> Dict:
+        return {
+            "format_version": FORMAT_VERSION,
+            "classes": self.classes_.tolist(),
+            "n_features": self.n_features,
+            "alpha": self.alpha,
+            "ngram_range": list(self.ngram_range),
+            "updates": self.updates,
+            "last_feedback_id": self.last_feedback_id,
+        }
+
+    def save(self, path: str):
+        """Write an .npz checkpoint atomically; only counts are stored, logs are rebuilt on load"""
+        with self._lock:
+            # Only non-zero feature rows, the full table is mostly empty
+            rows = np.flatnonzero(self.feature_count.any(axis=1))
+            arrays = {
+                "rows": rows,
+                "counts": self.feature_count[rows],
+                "class_feature_total": self.class_feature_total.copy(),
+                "class_count": self.class_count.copy(),
+                "metadata": np.array(json.dumps(self._metadata())),
+            }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "OnlineCategorizer":
+        with np.load(path, allow_pickle=False) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported online model format: {metadata.get('format_version')}")
+            model = cls(metadata["classes"], n_features=metadata["n_features"],
+                        alpha=metadata["alpha"], ngram_range=metadata["ngram_range"])
+            model.feature_count[data["rows"]] = data["counts"]
+            model.class_feature_total = data["class_feature_total"]
+            model.class_count = data["class_count"]
+        model._rebuild()
+        model.updates = metadata["updates"]
+        model.last_feedback_id = metadata["last_feedback_id"]
+        return model
+
+    def stats(self) -> Dict:
+        return {
+            "updates": self.updates,
+            "last_feedback_id": self.last_feedback_id,
+            "classes": len(self.classes_),
+            "n_features": self.n_features,
+            "nbytes": int(self.feature_count.nbytes + self.log_feature.nbytes),
+        }
@@ -0,0 +1,100 @@
+"""
+In-process LRU cache for categorizer predictions.
+
+Bank descriptions repeat heavily once reference numbers and dates are
+stripped, so predictions are cached by normalized description and
+dropped as soon as the model version changes.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+_TOKEN_WITH_DIGIT = re.compile(r"\S*\d\S*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_description(description: str) -> str:
+    """Case-fold, mask any token containing digits and collapse whitespace"""
+    text = description.casefold()
+    text = _TOKEN_WITH_DIGIT.sub("#", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class PredictionCache:
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self._entries = OrderedDict()  # key -> (expires_at, prediction)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def ensure_version(self, model_version):
+        """Drop every entry if the model version has changed"""
+        if model_version == self.model_version:
+            return
+        with self._lock:
+            if model_version != self.model_version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.model_version = model_version
+
+    def get(self, key) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, prediction = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prediction
+
+    def put(self, key, prediction: Dict, model_version=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            # A prediction from a model that was swapped out mid-request is stale
+            if model_version is not None and model_version != self.model_version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,228 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is
+picked by PROFILE_SAMPLE_RATE. The blocking work inside the handler
+(decoding, OCR, parsing, scoring) runs under cProfile, and OCR runs in
+the request's thread instead of the OCR pool so it is visible too. When
+the response is complete the profile is written to PROFILE_DIR as a
+.pstats file and a .collapsed stack file (for flamegraph.pl or
+speedscope), named after the request id and the document hash. The CPU
+time of the profiled sections is returned in X-Profile-CPU-Ms.
+
+Requests that are not profiled only pay for one context variable lookup.
+"""
+import contextvars
+import cProfile
+import hashlib
+import hmac
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from itertools import islice
+from typing import Callable, Dict, Iterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class RequestProfile:
+    def __init__(self, request_id: str, path: str):
+        self.request_id = request_id
+        self.path = path
+        self.document_hash: Optional[str] = None
+        self.cpu_seconds = 0.0
+        self.profile = cProfile.Profile()
+        # cProfile objects are not thread-safe; a request's sections run one at a time anyway
+        self._lock = threading.RLock()
+        self._active = threading.local()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        if getattr(self._active, "depth", 0):
+            # Nested in a profiled section of this thread, which already records it
+            return fn(*args, **kwargs)
+        with self._lock:
+            self._active.depth = 1
+            start = time.thread_time()
+            try:
+                return self.profile.runcall(fn, *args, **kwargs)
+            finally:
+                self.cpu_seconds += time.thread_time() - start
+                self._active.depth = 0
+
+    def tag_document(self, data: bytes):
+        self.document_hash = hashlib.sha256(data).hexdigest()[:16]
+
+    def file_stem(self) -> str:
+        parts = [time.strftime("%Y%m%d-%H%M%S"), self.request_id]
+        if self.document_hash:
+            parts.append(self.document_hash)
+        return "-".join(parts)
+
+    def dump(self, directory: str) -> Optional[str]:
+        """Write <stem>.pstats and <stem>.collapsed; returns the stem, None if nothing was profiled"""
+        with self._lock:
+            self.profile.create_stats()
+            if not self.profile.stats:
+                return None
+            stats = pstats.Stats(self.profile)
+        os.makedirs(directory, exist_ok=True)
+        stem = self.file_stem()
+        stats.dump_stats(os.path.join(directory, stem + ".pstats"))
+        with open(os.path.join(directory, stem + ".collapsed"), "w", encoding="utf-8") as f:
+            for stack, microseconds in collapsed_stacks(stats.stats).items():
+                f.write(f"{stack} {microseconds}\n")
+        return stem
+
+
+def _label(func) -> str:
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+
+def collapsed_stacks(stats: Dict, max_depth: int = 64) -> Dict[str, int]:
+    """
+    Rebuild approximate stacks from cProfile's caller/callee edges, in the
+    collapsed format ("a;b;c <microseconds>"). cProfile keeps only one level
+    of callers, so a function's children are split across its call sites in
+    proportion to the time each call site spent in it.
+    """
+    callees: Dict = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    roots = [func for func, entry in stats.items() if not entry[4]]
+
+    stacks: Dict[str, int] = {}
+
+    def walk(func, path, share: float):
+        _, _, tottime, cumtime, _ = stats[func]
+        stack = path + (_label(func),)
+        own = int(tottime * share * 1e6)
+        if own > 0:
+            key = ";".join(stack)
+            stacks[key] = stacks.get(key, 0) + own
+        if len(stack) >= max_depth or cumtime <= 0:
+            return
+        for callee in callees.get(func, ()):
+            if _label(callee) in stack:
+                continue  # recursion; its time is already counted on the way down
+            edge_cumtime = stats[callee][4][func][3]
+            callee_cumtime = stats[callee][3]
+            if callee_cumtime > 0 and edge_cumtime > 0:
+                walk(callee, stack, share * edge_cumtime / callee_cumtime)
+
+    for root in roots:
+        walk(root, (), 1.0)
+    return stacks
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def profiled(fn: Callable, *args, **kwargs):
+    """Call fn under the current request's profiler, or directly when the request is not profiled"""
+    profile = _current.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    return profile.call(fn, *args, **kwargs)
+
+
+def profiled_iter(iterator: Iterator, chunk: int = 100) -> Iterator:
+    """Iterate under the current request's profiler, pulling chunk items per profiled section"""
+    profile = _current.get()
+    if profile is None:
+        yield from iterator
+        return
+    iterator = iter(iterator)
+    while True:
+        items = profile.call(lambda: list(islice(iterator, chunk)))
+        if not items:
+            return
+        yield from items
+
+
+def tag_document(data: bytes):
+    """Record the hash of the document being processed, used to name the profile"""
+    profile = _current.get()
+    if profile is not None:
+        profile.tag_document(data)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that decides which requests are profiled and writes their profiles"""
+
+    def __init__(self, app, directory: str = "./profiles", sample_rate: float = 0.0,
+                 token: Optional[str] = None, max_files: int = 200):
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        # Without a token the header is ignored, so clients cannot switch profiling on
+        self.token = token or None
+        self.max_files = max_files
+
+    def _wanted(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    return hmac.compare_digest(value.decode("latin-1"), self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+        if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        profile = RequestProfile(request_id, scope.get("path", ""))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Streamed responses send headers first; their file covers the whole stream
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                headers.append((b"x-profile-cpu-ms", f"{profile.cpu_seconds * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            try:
+                stem = await run_in_threadpool(profile.dump, self.directory)
+                if stem is not None:
+                    print(f"Profiled {profile.path} in {profile.cpu_seconds * 1000:.1f} ms CPU: "
+                          f"{os.path.join(self.directory, stem)}.pstats")
+                    await run_in_threadpool(self._prune)
+            except Exception as e:
+                print(f"Could not write profile for {request_id}: {e}")
+
+    def _prune(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".pstats")]
+        except OSError:
+            return
+        if len(names) <= self.max_files:
+            return
+        for name in sorted(names)[:-self.max_files]:
+            stem = os.path.join(self.directory, name[:-len(".pstats")])
+            for suffix in (".pstats", ".collapsed"):
+                try:
+                    os.remove(stem + suffix)
+                except OSError:
+                    pass
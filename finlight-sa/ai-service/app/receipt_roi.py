@@ -0,0 +1,98 @@
+"""
+Region-of-interest OCR for receipt fields.
+
+The parsers only need a few parts of a receipt: the vendor in the first
+lines, the date, the item lines with prices and the TOTAL/VAT lines. A
+full-resolution Tesseract pass over everything else (addresses, slogans,
+barcodes, blank paper) is wasted when the caller only wants the fields.
+
+1. A layout pass runs Tesseract on a copy scaled down to layout_scale.
+   Its text is too rough to parse but good enough to find lines and to
+   tell which of them hold digits or field keywords.
+2. The selected lines are cut from the full-resolution image as
+   full-width strips and stacked into one mosaic, so the second pass is
+   a single Tesseract call however many regions there are.
+3. Word boxes from the mosaic are mapped back to the original image.
+"""
+import re
+from typing import Dict, List, Tuple
+
+# parse_vendor looks at this many lines
+HEADER_LINES = 5
+
+FIELD_KEYWORDS = re.compile(r"TOTAL|VAT|GST|TAX|DUE|BALANCE|AMOUNT|DATE", re.IGNORECASE)
+
+# (top, bottom) in image pixels
+Band = Tuple[int, int]
+
+
+def layout_lines(data: Dict[str, List], scale: float) -> List[Dict]:
+    """Group a layout pass's words into lines: {"text", "top", "bottom"} in full-size pixels, top to bottom"""
+    lines = {}
+    for i, text in enumerate(data["text"]):
+        if data["level"][i] != 5 or not text.strip():
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        top = data["top"][i] / scale
+        bottom = (data["top"][i] + data["height"][i]) / scale
+        line = lines.get(key)
+        if line is None:
+            lines[key] = {"text": text, "top": top, "bottom": bottom}
+        else:
+            line["text"] += " " + text
+            line["top"] = min(line["top"], top)
+            line["bottom"] = max(line["bottom"], bottom)
+    return sorted(lines.values(), key=lambda line: line["top"])
+
+
+def select_lines(lines: List[Dict]) -> List[Dict]:
+    """The header lines, and every later line with digits (prices, dates) or a field keyword"""
+    selected = []
+    for i, line in enumerate(lines):
+        digits = sum(c.isdigit() for c in line["text"])
+        if i < HEADER_LINES or digits >= 2 or FIELD_KEYWORDS.search(line["text"]):
+            selected.append(line)
+    return selected
+
+
+def line_bands(lines: List[Dict], height: int, padding: float = 0.35) -> List[Band]:
+    """Vertical bands around the lines, padded by a share of the line height and merged where they touch"""
+    bands = []
+    for line in lines:
+        pad = (line["bottom"] - line["top"]) * padding
+        top = max(0, int(line["top"] - pad))
+        bottom = min(height, int(line["bottom"] + pad + 1))
+        if bands and top <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], max(bands[-1][1], bottom))
+        else:
+            bands.append((top, bottom))
+    return bands
+
+
+def build_mosaic(image, bands: List[Band], gap: int) -> Tuple["Image.Image", List[Tuple[int, int, int]]]:
+    """
+    Stack the bands of image with white gaps between them; returns the
+    mosaic and (mosaic top, mosaic bottom, image top) per band
+    """
+    from PIL import Image
+
+    height = sum(bottom - top for top, bottom in bands) + gap * (len(bands) + 1)
+    mosaic = Image.new(image.mode, (image.width, height), 255)
+    placements = []
+    y = gap
+    for top, bottom in bands:
+        mosaic.paste(image.crop((0, top, image.width, bottom)), (0, y))
+        placements.append((y, y + bottom - top, top))
+        y += bottom - top + gap
+    return mosaic, placements
+
+
+def map_words(words: List[Dict], placements: List[Tuple[int, int, int]]) -> List[Dict]:
+    """Move word boxes from mosaic coordinates back to the image they were cut from"""
+    for word in words:
+        middle = word["top"] + word["height"] / 2
+        for mosaic_top, mosaic_bottom, image_top in placements:
+            if mosaic_top <= middle < mosaic_bottom:
+                word["top"] += image_top - mosaic_top
+                break
+    return words
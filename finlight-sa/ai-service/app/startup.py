@@ -0,0 +1,68 @@
+"""
+Two-phase startup: the app answers liveness checks as soon as uvicorn is
+listening, and the slow work (loading the model, probing Tesseract) runs
+afterwards as a warm-up task. Each stage is timed so slow restarts can
+be traced to a cause.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+
+class Warmup:
+    def __init__(self, started_at: Optional[float] = None):
+        # perf_counter() value taken as early as possible in the process
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self.ready_after_ms: Optional[float] = None
+        self._task = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def mark(self, name: str, since: float):
+        """Record a stage that started at perf_counter() value since"""
+        self.stages[name] = round((time.perf_counter() - since) * 1000, 1)
+
+    def start(self, warm_up: Callable[[], None]):
+        """Run warm_up in a worker thread without blocking startup"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(warm_up))
+
+    async def _run(self, warm_up: Callable[[], None]):
+        try:
+            await run_in_threadpool(warm_up)
+            self.ready = True
+        except Exception as e:
+            self.error = str(e)
+            print(f"Warm-up failed: {e}")
+        self.ready_after_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        print(f"Startup {'ready' if self.ready else 'failed'} after {self.ready_after_ms} ms: {self.stages}")
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the warm-up to finish; True when the service is ready"""
+        if self.ready or self._task is None:
+            return self.ready
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def report(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "ready_after_ms": self.ready_after_ms,
+            "stages_ms": dict(self.stages),
+        }
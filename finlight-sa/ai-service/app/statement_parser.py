@@ -0,0 +1,435 @@
+"""
+Bank statement parsers.
+
+Statements are consistent within a document, so instead of trying every
+pattern and every date format on every line, the parser samples the
+first rows, infers the line layout, the date format and the amount
+convention once, and then parses every line with one precompiled pattern
+and a fixed date converter.
+"""
+import csv
+import re
+import warnings
+from datetime import datetime
+from io import StringIO
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# Lines sampled before the document format is fixed
+SAMPLE_LINES = 200
+# Stop sampling early once this many lines have matched a layout
+SAMPLE_MATCHES = 20
+
+_DATE = r"(\d{1,2}[-/]\d{1,2}[-/]\d{4}|\d{4}-\d{1,2}-\d{1,2}|\d{1,2} [A-Za-z]{3,9} \d{4})"
+
+# Line layouts, most specific first
+LINE_LAYOUTS = {
+    # Date | Description | Debit/Credit | Amount
+    "pipe_direction": re.compile(_DATE + r"\s*[|\t]\s*(.+?)\s*[|\t]\s*(Debit|Credit)\s*[|\t]\s*(-?[\d\.,]+-?)"),
+    # Date | Description | Amount
+    "pipe": re.compile(_DATE + r"\s*[|\t]\s*(.+?)\s*[|\t]\s*(-?\d[\d\.,]*-?)"),
+    # Date Description Amount Currency
+    "currency": re.compile(_DATE + r"\s+(.+?)\s+(-?[\d\.,]+-?)\s*(?:R|ZAR|USD)\b"),
+}
+
+TEXT_DATE_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d', '%d %b %Y', '%d %B %Y']
+CSV_DATE_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d']
+
+_NUMERIC_DATE_FIELDS = {"%d": "day", "%m": "month", "%Y": "year"}
+
+
+def _strptime_any(value: str, formats: List[str]) -> Optional[datetime]:
+    for date_format in formats:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def make_date_converter(date_format: str, fallback_formats: List[str]) -> Callable[[str], Optional[datetime]]:
+    """
+    Build a converter for one date format. Purely numeric formats are split
+    and passed to datetime() directly instead of going through strptime.
+    """
+    match = re.fullmatch(r"(%[dmY])([-/])(%[dmY])\2(%[dmY])", date_format)
+    if not match:
+        def convert(value: str) -> Optional[datetime]:
+            try:
+                return datetime.strptime(value, date_format)
+            except ValueError:
+                return _strptime_any(value, fallback_formats)
+        return convert
+
+    separator = match.group(2)
+    order = [_NUMERIC_DATE_FIELDS[match.group(i)] for i in (1, 3, 4)]
+    year_index, month_index, day_index = order.index("year"), order.index("month"), order.index("day")
+
+    def convert(value: str) -> Optional[datetime]:
+        parts = value.split(separator)
+        if len(parts) == 3 and len(parts[year_index]) == 4:
+            try:
+                return datetime(int(parts[year_index]), int(parts[month_index]), int(parts[day_index]))
+            except ValueError:
+                pass
+        return _strptime_any(value, fallback_formats)
+    return convert
+
+
+def infer_date_format(samples: List[str], formats: List[str]) -> Optional[str]:
+    """Pick the first format (in preference order) that parses the most samples"""
+    best_format, best_count = None, 0
+    for date_format in formats:
+        count = 0
+        for value in samples:
+            try:
+                datetime.strptime(value, date_format)
+                count += 1
+            except ValueError:
+                pass
+        if count > best_count:
+            best_format, best_count = date_format, count
+            if count == len(samples):
+                break
+    return best_format
+
+
+def infer_amount_separators(samples: List[str]):
+    """
+    Return (decimal, thousands) separators used by the sampled amounts.
+    A comma followed by exactly two digits is a decimal comma unless a dot
+    also appears, in which case the later of the two is the decimal mark.
+    """
+    for value in samples:
+        if "," in value and "." in value:
+            return (",", ".") if value.rfind(",") > value.rfind(".") else (".", ",")
+    with_comma = [value for value in samples if "," in value]
+    if with_comma:
+        if all(re.search(r",\d{2}-?$", value) for value in with_comma):
+            return ",", "."
+        return ".", ","
+    return ".", ","
+
+
+def make_amount_converter(decimal: str, thousands: str) -> Callable[[str], float]:
+    strip = str.maketrans("", "", thousands + " R")
+    plain_floats = decimal == "."
+
+    def convert(value: str) -> float:
+        if plain_floats:
+            # Most amounts are already plain floats, e.g. "-150.00"
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        value = value.replace("ZAR", "").translate(strip).strip()
+        negative = value.startswith("-") or value.endswith("-")
+        value = value.strip("-")
+        if decimal != ".":
+            value = value.replace(decimal, ".")
+        amount = float(value) if value else 0.0
+        return -amount if negative else amount
+    return convert
+
+
+class StatementFormat:
+    """Format of one statement, inferred from its first lines"""
+
+    def __init__(self, layout: Optional[str], date_format: Optional[str],
+                 decimal: str = ".", thousands: str = ",",
+                 fallback_formats: Optional[List[str]] = None):
+        self.layout = layout
+        self.pattern = LINE_LAYOUTS.get(layout) if layout else None
+        self.date_format = date_format
+        self.decimal = decimal
+        self.thousands = thousands
+        fallback_formats = fallback_formats or TEXT_DATE_FORMATS
+        self.parse_date = make_date_converter(date_format, fallback_formats) if date_format \
+            else (lambda value: _strptime_any(value, fallback_formats))
+        self.parse_amount = make_amount_converter(decimal, thousands)
+        self._iso_dates = {}
+
+    def iso_date(self, value: str) -> Optional[str]:
+        """ISO form of a statement date; a statement only has a few hundred distinct dates"""
+        iso = self._iso_dates.get(value)
+        if iso is None:
+            parsed = self.parse_date(value)
+            iso = parsed.isoformat() if parsed else ""
+            if len(self._iso_dates) < 10000:
+                self._iso_dates[value] = iso
+        return iso or None
+
+    @classmethod
+    def infer_text(cls, lines: List[str]) -> "StatementFormat":
+        matches = {name: [] for name in LINE_LAYOUTS}
+        for line in lines:
+            for name, pattern in LINE_LAYOUTS.items():
+                match = pattern.search(line)
+                if match:
+                    matches[name].append(match)
+                    break
+
+        layout = max(LINE_LAYOUTS, key=lambda name: len(matches[name]))
+        if not matches[layout]:
+            return cls(None, None)
+        amount_group = 4 if layout == "pipe_direction" else 3
+        decimal, thousands = infer_amount_separators([m.group(amount_group) for m in matches[layout]])
+        date_format = infer_date_format([m.group(1) for m in matches[layout]], TEXT_DATE_FORMATS)
+        return cls(layout, date_format, decimal, thousands, TEXT_DATE_FORMATS)
+
+
+def _sample(lines: Iterator[str], is_candidate: Callable[[str], bool]) -> List[str]:
+    sample = []
+    matched = 0
+    for line in lines:
+        sample.append(line)
+        if is_candidate(line):
+            matched += 1
+        if matched >= SAMPLE_MATCHES or len(sample) >= SAMPLE_LINES:
+            break
+    return sample
+
+
+def _matches_any_layout(line: str) -> bool:
+    return any(pattern.search(line) for pattern in LINE_LAYOUTS.values())
+
+
+def parse_bank_statement_text(text: str) -> List[dict]:
+    """
+    Parse bank statement text to extract transactions
+    Looks for common bank statement formats with date, description, and amount
+    """
+    return list(iter_bank_statement_lines(text.split('\n')))
+
+
+def iter_bank_statement_lines(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Yield transactions from bank statement text lines as soon as each one is parsed
+    """
+    lines = iter(lines)
+    sample = _sample(lines, _matches_any_layout)
+    statement_format = StatementFormat.infer_text([line.strip() for line in sample])
+
+    # The inferred layout first; lines in another layout (e.g. a section
+    # printed differently) still get the remaining patterns
+    layouts = [statement_format.layout] if statement_format.layout else []
+    layouts += [name for name in LINE_LAYOUTS if name not in layouts]
+    searches = [(LINE_LAYOUTS[name].search, name == "pipe_direction") for name in layouts]
+    iso_date = statement_format.iso_date
+    parse_amount = statement_format.parse_amount
+
+    for line in chain(sample, lines):
+        line = line.strip()
+        if len(line) < 10:
+            continue
+
+        for search, has_direction in searches:
+            match = search(line)
+            if match:
+                break
+        else:
+            continue
+
+        try:
+            if has_direction:
+                date_str, description, direction, amount_str = match.groups()
+                amount = parse_amount(amount_str)
+            else:
+                date_str, description, amount_str = match.groups()
+                amount = parse_amount(amount_str)
+                direction = "Debit" if amount < 0 else "Credit"
+
+            description = description.strip().replace('|', '').replace('\t', '').strip()
+            if not description or amount == 0:
+                continue
+
+            yield {
+                "date": iso_date(date_str) or datetime.now().isoformat(),
+                "description": description,
+                "amount": str(abs(amount)),
+                "direction": direction,
+                "reference": ""
+            }
+        except Exception as e:
+            print(f"Error parsing line: {line} - {e}")
+            continue
+
+
+def parse_csv_bank_statement(csv_content: str) -> List[dict]:
+    """
+    Parse CSV bank statement format
+    Expected format: Date, Description, Amount, Reference (header row)
+    """
+    transactions = []
+    for chunk in iter_csv_bank_statement_chunks(csv_content):
+        transactions.extend(chunk)
+    return transactions
+
+
+def iter_csv_bank_statement(csv_content: str, chunk_rows: int = 10000) -> Iterator[dict]:
+    """
+    Yield transactions from a CSV bank statement, parsed in chunks of chunk_rows
+    """
+    for chunk in iter_csv_bank_statement_chunks(csv_content, chunk_rows):
+        yield from chunk
+
+
+class CsvColumnFormat:
+    """Date format and amount convention of a CSV export, resolved once per column"""
+
+    def __init__(self, date_format: Optional[str], decimal: str, thousands: str):
+        self.date_format = date_format
+        self.decimal = decimal
+        self.thousands = thousands
+        # Inferred format first, then the rest in the usual preference order
+        self.date_formats = ([date_format] if date_format else []) + \
+            [f for f in CSV_DATE_FORMATS if f != date_format]
+
+    @classmethod
+    def infer(cls, dates: List[str], amounts: List[str]) -> "CsvColumnFormat":
+        sample = [(date.strip(), amount.strip()) for date, amount in zip(dates, amounts) if date.strip()]
+        sample = sample[:SAMPLE_LINES]
+        decimal, thousands = infer_amount_separators([amount for _, amount in sample])
+        return cls(infer_date_format([date for date, _ in sample], CSV_DATE_FORMATS), decimal, thousands)
+
+    def iso_dates(self, values):
+        """
+        Map a column of raw dates to ISO strings (None where unparseable).
+        Statements repeat the same few hundred dates, so only the distinct
+        values are parsed and formatted.
+        """
+        import numpy as np
+        import pandas as pd
+
+        codes, uniques = pd.factorize(values, sort=False)
+        uniques = pd.Series(uniques, dtype=object).str.strip()
+        dates = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+        pending = uniques != ""
+        for date_format in self.date_formats:
+            if not pending.any():
+                break
+            parsed = pd.to_datetime(uniques[pending], format=date_format, errors="coerce")
+            dates.loc[parsed.index] = parsed
+            pending &= dates.isna()
+
+        iso = np.array([None] * len(uniques), dtype=object)
+        parsed = dates.notna().to_numpy()
+        iso[parsed] = dates[parsed].dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy(dtype=object)
+        return iso[codes]
+
+    def parse_amounts(self, values):
+        """
+        Amounts the CSV reader already parsed as floats are used as-is; a
+        chunk containing currency symbols or trailing minus signs arrives as
+        strings and only those values go through the clean-up.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if values.dtype.kind in "fi":
+            return values.astype(float)
+
+        values = pd.Series(values, dtype=object).astype(str)
+        if self.decimal == ".":
+            amounts = pd.to_numeric(values, errors="coerce")
+        else:
+            amounts = pd.Series(np.nan, index=values.index)
+
+        messy = amounts.isna() & (values.str.strip() != "")
+        if messy.any():
+            cleaned = values[messy].str.replace("ZAR", "", regex=False)
+            cleaned = cleaned.str.replace("[R\\s" + re.escape(self.thousands) + "]", "", regex=True)
+            negative = cleaned.str.startswith("-") | cleaned.str.endswith("-")
+            cleaned = cleaned.str.strip("-")
+            if self.decimal != ".":
+                cleaned = cleaned.str.replace(self.decimal, ".", regex=False)
+            parsed = pd.to_numeric(cleaned, errors="coerce")
+            parsed[negative] = -parsed[negative]
+            amounts.loc[parsed.index] = parsed
+        return amounts.to_numpy(dtype=float)
+
+
+def _csv_width(csv_content: str) -> int:
+    """Fields in the widest row of a CSV file"""
+    if '"' in csv_content:
+        # Quoted fields may hold commas and newlines
+        return max(map(len, csv.reader(StringIO(csv_content))), default=0)
+    return 1 + max((line.count(",") for line in csv_content.splitlines()), default=0)
+
+
+def iter_csv_bank_statement_chunks(csv_content: str, chunk_rows: int = 100000) -> Iterator[List[dict]]:
+    """
+    Columnar CSV parser: reads the file in chunks with pandas and converts
+    whole date and amount columns at once. Yields one list of transactions
+    per chunk.
+    """
+    try:
+        import numpy as np
+        import pandas as pd
+    except ImportError as e:
+        print(f"CSV parsing error: {e}")
+        return
+
+    # pandas sizes the table from the first row unless names covers every row.
+    # Shorter rows are filled with "" and date, description, amount and
+    # reference are taken by position; a row without an amount (fewer than
+    # 3 fields) is dropped.
+    columns = range(max(4, _csv_width(csv_content)))
+
+    def read(**kwargs):
+        return pd.read_csv(
+            StringIO(csv_content),
+            header=None,
+            skiprows=1,  # Skip header
+            names=columns,
+            index_col=False,
+            keep_default_na=False,
+            **kwargs
+        )
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", pd.errors.ParserWarning)
+
+            # Resolve the date format and number separators from the first rows
+            sample = read(dtype=str, nrows=SAMPLE_LINES * 2)
+            column_format = CsvColumnFormat.infer(sample[0].tolist(), sample[2].tolist())
+
+            # The C reader converts clean amount columns straight to floats
+            reader = read(
+                dtype={column: object for column in columns if column != 2},
+                na_values={2: [""]},  # keeps a clean amount column numeric when some rows are short
+                decimal=column_format.decimal,
+                thousands=column_format.thousands or None,
+                chunksize=chunk_rows,
+            )
+            for chunk in reader:
+                dates = column_format.iso_dates(chunk[0].to_numpy())
+                amounts = column_format.parse_amounts(chunk[2].to_numpy())
+                descriptions = np.array([value.strip() for value in chunk[1].to_numpy()], dtype=object)
+
+                valid = (dates != None) & (descriptions != "") & ~np.isnan(amounts) & (amounts != 0)  # noqa: E711
+                if not valid.any():
+                    continue
+
+                amounts = amounts[valid]
+                yield [
+                    {
+                        "date": date,
+                        "description": description,
+                        "amount": str(amount),
+                        "direction": "Debit" if negative else "Credit",
+                        "reference": reference.strip()
+                    }
+                    for date, description, amount, negative, reference in zip(
+                        dates[valid].tolist(),
+                        descriptions[valid].tolist(),
+                        np.abs(amounts).tolist(),
+                        (amounts < 0).tolist(),
+                        chunk[3].to_numpy()[valid].tolist(),
+                    )
+                ]
+    except pd.errors.EmptyDataError:
+        return
+    except Exception as e:
+        print(f"CSV parsing error: {e}")
@@ -0,0 +1,125 @@
+"""
+Page-level text extraction for PDF bank statements.
+
+Each page is routed on its own: pages with a usable text layer are read
+with PyPDF2, and only scanned or empty pages are rasterized - one page
+at a time - and handed to OCR. Peak memory is one page image no matter
+how long the statement is.
+"""
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from typing import Callable, Dict, Iterator, Optional
+
+from app.ocr_pool import OCRPoolSaturated
+
+# Pages whose text layer has fewer characters than this are treated as scanned
+MIN_TEXT_CHARS = int(os.getenv("PDF_MIN_TEXT_CHARS", "20"))
+OCR_DPI = int(os.getenv("PDF_OCR_DPI", "200"))
+
+
+class PageRasterizer:
+    """Renders single PDF pages to PNG bytes with pdftoppm (via pdf2image)"""
+
+    def __init__(self, pdf_bytes: bytes, dpi: int = OCR_DPI):
+        self.pdf_bytes = pdf_bytes
+        self.dpi = dpi
+        self._directory = None
+        self._pdf_path = None
+
+    def _ensure_file(self):
+        # Written once, on the first page that actually needs OCR
+        if self._pdf_path is None:
+            self._directory = tempfile.mkdtemp(prefix="finlight-pdf-")
+            self._pdf_path = os.path.join(self._directory, "statement.pdf")
+            with open(self._pdf_path, "wb") as f:
+                f.write(self.pdf_bytes)
+
+    def page_count(self) -> int:
+        from pdf2image import pdfinfo_from_path
+        self._ensure_file()
+        return int(pdfinfo_from_path(self._pdf_path)["Pages"])
+
+    def render(self, page_number: int) -> bytes:
+        """Render one 1-based page to PNG bytes"""
+        from pdf2image import convert_from_path
+        self._ensure_file()
+        paths = convert_from_path(
+            self._pdf_path,
+            dpi=self.dpi,
+            first_page=page_number,
+            last_page=page_number,
+            fmt="png",
+            output_folder=self._directory,
+            paths_only=True,
+        )
+        data = b""
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+        return data
+
+    def close(self):
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._pdf_path = None
+
+
+def iter_pdf_pages(pdf_bytes: bytes, ocr_image: Optional[Callable[[bytes], str]] = None,
+                   min_text_chars: int = MIN_TEXT_CHARS, dpi: int = OCR_DPI) -> Iterator[Dict]:
+    """
+    Yield {"page", "page_count", "text", "source", "warning"} for each page of a PDF.
+    source is "text" (PyPDF2 text layer), "ocr", or "empty" when a page has
+    no text layer and OCR is unavailable or failed.
+    """
+    rasterizer = PageRasterizer(pdf_bytes, dpi)
+    try:
+        pages = None
+        try:
+            import PyPDF2
+            pages = PyPDF2.PdfReader(BytesIO(pdf_bytes)).pages
+            count = len(pages)
+        except Exception as e:
+            print(f"PDF text layer unavailable, falling back to OCR for every page: {e}")
+            count = 0
+            if ocr_image is not None:
+                try:
+                    count = rasterizer.page_count()
+                except Exception as info_error:
+                    print(f"PDF page count error: {info_error}")
+
+        for index in range(count):
+            page_number = index + 1
+            text = ""
+            if pages is not None:
+                try:
+                    text = pages[index].extract_text() or ""
+                except Exception as e:
+                    print(f"PDF page {page_number} text extraction error: {e}")
+
+            if len(text.strip()) >= min_text_chars:
+                yield {"page": page_number, "page_count": count, "text": text, "source": "text", "warning": None}
+                continue
+
+            if ocr_image is None:
+                yield {"page": page_number, "page_count": count, "text": text, "source": "empty",
+                       "warning": f"Page {page_number} has no text layer and OCR is not available"}
+                continue
+
+            try:
+                image_bytes = rasterizer.render(page_number)
+                ocr_text = ocr_image(image_bytes)
+                del image_bytes
+            except OCRPoolSaturated:
+                raise
+            except Exception as e:
+                print(f"PDF page {page_number} OCR error: {e}")
+                yield {"page": page_number, "page_count": count, "text": text, "source": "empty",
+                       "warning": f"Page {page_number} could not be OCR'd: {e}"}
+                continue
+            yield {"page": page_number, "page_count": count, "text": ocr_text, "source": "ocr", "warning": None}
+    finally:
+        rasterizer.close()
@@ -0,0 +1,340 @@
+"""
+Background model retraining.
+
+Training runs in a separate process so fitting never competes with
+inference. Every run writes a new versioned model file and then
+atomically repoints models/CURRENT at it; the serving process swaps the
+loaded model with a single reference assignment, so a request scores
+against either the old model or the new one, never a half-trained one.
+
+Job status lives in models/jobs/<id>.json, written by the training
+process as it goes, so any uvicorn worker can answer /train/{id}.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+LEGACY_MODEL_FILE = "categorizer_model.pkl"
+CURRENT_POINTER = "CURRENT"
+# Versioned model files kept on disk besides the current one
+KEEP_MODEL_VERSIONS = 3
+KEEP_JOBS = 50
+
+
+def write_json_atomic(path: str, data: Dict):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def current_model_file(model_path: str) -> str:
+    """Model file models/CURRENT points at, or the legacy categorizer_model.pkl"""
+    try:
+        with open(os.path.join(model_path, CURRENT_POINTER), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        if name and os.path.exists(os.path.join(model_path, name)):
+            return os.path.join(model_path, name)
+    except OSError:
+        pass
+    return os.path.join(model_path, LEGACY_MODEL_FILE)
+
+
+def compiled_artifact_dir(model_path: str, version: str) -> str:
+    """
+    Compiled NumPy arrays for a model version. They load without sklearn or
+    pandas and are memory-mapped, so all workers share one copy.
+    """
+    return os.path.join(model_path, "compiled", version)
+
+
+def save_compiled_artifact(model_path: str, version: str, model) -> Optional[str]:
+    """Compile a fitted pipeline and save it next to the models; None if it cannot be compiled"""
+    from app.compiled_model import CompiledCategorizer
+
+    path = compiled_artifact_dir(model_path, version)
+    if os.path.isdir(path):
+        return path
+    try:
+        compiled = CompiledCategorizer.from_pipeline(model)
+    except Exception as e:
+        print(f"Could not compile model {version}: {e}")
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Built in a temporary directory and renamed, so a reader never maps a partial artifact
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=f".{version}-")
+    try:
+        compiled.save_directory(tmp_dir)
+        os.rename(tmp_dir, path)
+    except OSError as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if os.path.isdir(path):
+            return path  # another worker published the same version first
+        print(f"Could not save compiled model {version}: {e}")
+        return None
+    return path
+
+
+def publish_model(model_path: str, model) -> str:
+    """
+    Save a fitted model as categorizer_model-<version>.pkl and point
+    models/CURRENT at it. Returns the new model file.
+    """
+    import joblib
+
+    fd, tmp_path = tempfile.mkstemp(dir=model_path, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp_path)
+        with open(tmp_path, "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:16]
+        name = f"categorizer_model-{version}.pkl"
+        os.replace(tmp_path, os.path.join(model_path, name))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Written before CURRENT moves, so serving workers can load it straight away
+    save_compiled_artifact(model_path, version, model)
+
+    fd, tmp_pointer = tempfile.mkstemp(dir=model_path, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(tmp_pointer, os.path.join(model_path, CURRENT_POINTER))
+
+    _prune_model_versions(model_path, keep=name)
+    return os.path.join(model_path, name)
+
+
+def _prune_model_versions(model_path: str, keep: str):
+    versions = []
+    for name in os.listdir(model_path):
+        if name.startswith("categorizer_model-") and name.endswith(".pkl") and name != keep:
+            path = os.path.join(model_path, name)
+            try:
+                versions.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+    versions.sort(reverse=True)
+    for _, path in versions[KEEP_MODEL_VERSIONS - 1:]:
+        version = os.path.basename(path)[len("categorizer_model-"):-len(".pkl")]
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        # Workers still mapping it keep their pages until they remap
+        shutil.rmtree(compiled_artifact_dir(model_path, version), ignore_errors=True)
+
+
+def run_training(model_path: str, job_file: Optional[str] = None,
+                 base_model_path: Optional[str] = None) -> Dict:
+    """
+    Refit the current pipeline on the accumulated feedback and publish it.
+    Runs in the training process; progress is written to job_file. A
+    business without a model of its own starts from the one in base_model_path.
+    """
+    import joblib
+    from sklearn.base import clone
+    from app.feedback_store import FeedbackStore
+
+    def report(**fields):
+        if job_file is not None:
+            _update_job(job_file, **fields)
+
+    report(status="running", stage="loading_feedback", progress=0.0, started_at=time.time())
+
+    store = FeedbackStore(os.path.join(model_path, "feedback.db"))
+    total = store.count()
+    X, y = [], []
+    for batch in store.iter_training_rows():
+        for description, category in batch:
+            X.append(description)
+            y.append(category)
+        report(rows_loaded=len(X), total_rows=total, progress=0.4 * len(X) / max(total, 1))
+
+    if not X:
+        return {"message": "No feedback data available for retraining"}
+    if len(X) < 10:
+        return {"message": "Insufficient feedback data for retraining"}
+
+    report(stage="fitting", progress=0.4)
+    base_file = current_model_file(model_path)
+    if base_model_path is not None:
+        from app.categorizer import SEED_TRAINING_DATA
+        # A business's feedback rarely covers every category; the seed data keeps the rest
+        X.extend(d for d, _ in SEED_TRAINING_DATA)
+        y.extend(c for _, c in SEED_TRAINING_DATA)
+        if not os.path.exists(base_file):
+            base_file = current_model_file(base_model_path)
+    model = clone(joblib.load(base_file))
+    model.fit(X, y)
+
+    report(stage="saving", progress=0.9)
+    model_file = publish_model(model_path, model)
+
+    return {
+        "message": "Model retrained successfully",
+        "training_samples": len(X),
+        "model_file": model_file
+    }
+
+
+def _run_job(model_path: str, job_file: str, base_model_path: Optional[str] = None) -> Dict:
+    try:
+        result = run_training(model_path, job_file, base_model_path)
+    except Exception as e:
+        _update_job(job_file, status="failed", error=str(e), finished_at=time.time())
+        raise
+    if "model_file" in result:
+        # The serving process marks the job completed once the model is live
+        _update_job(job_file, status="running", stage="activating", progress=0.95, result=result)
+    else:
+        _update_job(job_file, status="skipped", stage=None, progress=1.0, result=result, finished_at=time.time())
+    return result
+
+
+def _update_job(job_file: str, **fields):
+    try:
+        with open(job_file, "r", encoding="utf-8") as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        job = {}
+    job.update(fields)
+    write_json_atomic(job_file, job)
+
+
+class TrainingJobs:
+    """
+    Runs retraining jobs one at a time in a separate process. The global
+    model and each business model can have one job queued or running.
+    """
+
+    def __init__(self, model_path: str, on_model_ready: Optional[Callable[[str], None]] = None):
+        self.model_path = model_path
+        self.jobs_dir = os.path.join(model_path, "jobs")
+        self.on_model_ready = on_model_ready
+        self._executor = None
+        self._lock = threading.Lock()
+        self._active: Dict[str, tuple] = {}  # model path -> (job_id, future)
+        self._last_job = None
+
+    def _job_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, model_path: Optional[str] = None, business_id: Optional[str] = None,
+               on_model_ready: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Start a retraining job for the model in model_path (the global one
+        by default), or return the one already running for it
+        """
+        if model_path is None:
+            model_path = self.model_path
+            on_model_ready = self.on_model_ready
+        with self._lock:
+            active = self._active.get(model_path)
+            if active is not None and not active[1].done():
+                return self.get(active[0])
+
+            job_id = uuid.uuid4().hex
+            job_file = self._job_file(job_id)
+            job = {"id": job_id, "status": "queued", "stage": None, "progress": 0.0,
+                   "business_id": business_id, "created_at": time.time()}
+            write_json_atomic(job_file, job)
+            base_model_path = self.model_path if model_path != self.model_path else None
+            future = self._get_executor().submit(_run_job, model_path, job_file, base_model_path)
+            self._active = {path: entry for path, entry in self._active.items() if not entry[1].done()}
+            self._active[model_path] = (job_id, future)
+            self._last_job = job_id
+
+        future.add_done_callback(lambda f: self._finished(job_file, f, on_model_ready))
+        self._prune_jobs()
+        return job
+
+    def _finished(self, job_file: str, future, on_model_ready: Optional[Callable[[str], None]]):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"Training job failed: {error}")
+            job = self._read(job_file)
+            if job is not None and job.get("status") != "failed":
+                # The training process died before it could record the failure
+                _update_job(job_file, status="failed", error=str(error), finished_at=time.time())
+            return
+        model_file = future.result().get("model_file")
+        if not model_file:
+            return
+        try:
+            if on_model_ready is not None:
+                on_model_ready(model_file)
+        except Exception as e:
+            print(f"Could not activate retrained model: {e}")
+            _update_job(job_file, status="failed", error=f"Activation error: {e}", finished_at=time.time())
+            return
+        _update_job(job_file, status="completed", stage=None, progress=1.0, finished_at=time.time())
+
+    @staticmethod
+    def _read(job_file: str) -> Optional[Dict]:
+        try:
+            with open(job_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        if not job_id.isalnum():
+            return None
+        return self._read(self._job_file(job_id))
+
+    def _prune_jobs(self):
+        try:
+            names = [n for n in os.listdir(self.jobs_dir) if n.endswith(".json")]
+        except OSError:
+            return
+        if len(names) <= KEEP_JOBS:
+            return
+        paths = sorted((os.path.join(self.jobs_dir, n) for n in names), key=os.path.getmtime)
+        for path in paths[:-KEEP_JOBS]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        active = [job_id for job_id, future in list(self._active.values()) if not future.done()]
+        return {
+            "active_job": active[0] if active else None,
+            "active_jobs": len(active),
+            "last_job": self._last_job,
+        }
@@ -0,0 +1 @@
+# FinLight SA AI Service - Benchmarks
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Compare OCR on raw receipt photos against OCR on preprocessed images.
+
+The corpus is synthetic: receipt text rendered large, placed on a dark
+background in a 12 megapixel colour JPEG and stored sideways with an EXIF
+orientation tag, as phone cameras do. For each mode the benchmark reports
+decode and preprocessing time and the pixels handed to Tesseract; when
+Tesseract is installed it also reports OCR time and how many parsed fields
+(vendor, amount, VAT, date, item count) match those parsed from the
+original text. The "regions" mode is the preprocessed image read with
+region-of-interest OCR (app.receipt_roi), as /ocr/receipt does.
+
+Usage (from ai-service/):
+    python -m benchmarks.bench_ocr_preprocess --receipts 10
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.image_preprocess import ImagePreprocessor
+from app.ocr import OCRService
+from benchmarks.suite import generate_receipt_text, measure, render_receipt_image
+
+FIELDS = ("vendor", "amount", "vat_amount", "date", "items")
+PHOTO_SIZE = (4000, 3000)
+
+
+def photograph(receipt_png: bytes, rng: random.Random) -> bytes:
+    """Place a rendered receipt on a dark surface and save it like a sideways phone photo"""
+    from PIL import Image
+
+    receipt = Image.open(io.BytesIO(receipt_png)).convert("RGB")
+    # The photo is taken in landscape, so the upright receipt runs along the long side
+    fill = rng.uniform(0.7, 0.85)
+    scale = min(PHOTO_SIZE[0] * fill / receipt.height, PHOTO_SIZE[1] * fill / receipt.width)
+    receipt = receipt.resize((int(receipt.width * scale), int(receipt.height * scale)), Image.Resampling.BICUBIC)
+    upright = Image.new("RGB", (PHOTO_SIZE[1], PHOTO_SIZE[0]), (70, 60, 50))
+    upright.paste(receipt, ((upright.width - receipt.width) // 2 + rng.randint(-100, 100),
+                            (upright.height - receipt.height) // 2 + rng.randint(-100, 100)))
+
+    # Stored rotated with orientation 6: viewers (and exif_transpose) turn it 90 degrees clockwise
+    stored = upright.transpose(Image.Transpose.ROTATE_90)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    stored.save(buffer, format="JPEG", quality=90, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def generate_corpus(count: int, seed: int = 42) -> List[Tuple[str, bytes]]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        text = generate_receipt_text(rng)
+        corpus.append((text, photograph(render_receipt_image(text, scale=3), rng)))
+    return corpus
+
+
+def field_matches(expected: Dict, actual: Dict) -> int:
+    matches = 0
+    for field in FIELDS:
+        if field == "items":
+            matches += len(expected["items"]) == len(actual["items"])
+        elif field == "date":
+            matches += expected["date"][:10] == actual["date"][:10]
+        else:
+            matches += expected[field] == actual[field]
+    return matches
+
+
+def run_mode(preprocessor: ImagePreprocessor, regions: bool, corpus: List[Tuple[str, bytes]],
+             tesseract: bool, document_type: str) -> Dict:
+    service = OCRService(probe=False)
+    service.preprocessor = preprocessor
+    service.receipt_roi = regions
+    service.vision_available = tesseract
+    images = [image for _, image in corpus]
+
+    result = {
+        "prepare": measure(lambda: [service.prepare_image(image) for image in images], items=len(images), repeat=3),
+        "pixels": statistics.median(
+            image.width * image.height for image in map(service.prepare_image, images)
+        ),
+    }
+    if not tesseract:
+        result["ocr"] = {"skipped": "Tesseract is not installed"}
+        return result
+
+    seconds, matches = [], 0
+    for text, image in corpus:
+        start = time.perf_counter()
+        if regions:
+            fields = service.process_receipt(image, document_type, raw_text=False).fields
+        else:
+            fields = service.parse_receipt_text(service.run_ocr(image, document_type).raw_text)
+        seconds.append(time.perf_counter() - start)
+        matches += field_matches(service.parse_receipt_text(text), fields)
+    result["ocr"] = {
+        "median_ms": round(statistics.median(seconds) * 1000, 1),
+        "field_accuracy": round(matches / (len(corpus) * len(FIELDS)), 3),
+    }
+    return result
+
+
+def tesseract_available() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Raw versus preprocessed receipt OCR")
+    parser.add_argument("--receipts", type=int, default=10)
+    parser.add_argument("--document-type", default="receipt", choices=("receipt", "invoice", "page"))
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.receipts)
+    tesseract = tesseract_available()
+    modes = {
+        # What Tesseract received before preprocessing existed
+        "raw": (ImagePreprocessor(enabled=False, tesseract_configs={args.document_type: ""}), False),
+        "preprocessed": (ImagePreprocessor.from_env(), False),
+        "regions": (ImagePreprocessor.from_env(), True),
+    }
+
+    results = {}
+    for name, (preprocessor, regions) in modes.items():
+        results[name] = result = run_mode(preprocessor, regions, corpus, tesseract, args.document_type)
+        line = (f"{name:<14} prepare {result['prepare']['median_ms'] / args.receipts:>8.1f} ms/image  "
+                f"{result['pixels'] / 1e6:>6.2f} MP to Tesseract")
+        if "skipped" in result["ocr"]:
+            line += f"  OCR skipped: {result['ocr']['skipped']}"
+        else:
+            line += f"  OCR {result['ocr']['median_ms']:>8.1f} ms  fields {result['ocr']['field_accuracy']:.1%}"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"receipts": args.receipts, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass text parser and the columnar CSV parser against
+the previous row-by-row implementations on synthetic statements.
+
+Usage (from ai-service/):
+    python -m benchmarks.bench_statement_parser --lines 100000
+"""
+import argparse
+import random
+import sys
+import time
+from typing import List
+
+from app.statement_parser import parse_bank_statement_text, parse_csv_bank_statement
+
+DESCRIPTIONS = [
+    "FNB SERVICE FEE", "ENGEN GARAGE", "UBER TRIP", "WOOLWORTHS FOOD", "SALARY PAYMENT",
+    "TELKOM INTERNET", "CITY OF JHB ELECTRICITY", "GOOGLE ADS", "OFFICE RENT", "SASOL FUEL",
+]
+
+
+def generate_text_statement(lines: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    rows = ["Statement for account 1234567890", "Date | Description | Amount"]
+    for _ in range(lines):
+        amount = rng.uniform(-5000, 5000)
+        rows.append(f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024 | "
+                    f"{rng.choice(DESCRIPTIONS)} {rng.randint(1000, 9999)} | {amount:.2f}")
+    return "\n".join(rows)
+
+
+def generate_csv_statement(lines: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    rows = ["Date,Description,Amount,Reference"]
+    for i in range(lines):
+        amount = rng.uniform(-5000, 5000)
+        rows.append(f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024,"
+                    f"{rng.choice(DESCRIPTIONS)},{amount:.2f},REF{i}")
+    return "\n".join(rows)
+
+
+# ----------------------------------------------------------------------
+# Previous implementation, kept verbatim as the baseline
+# ----------------------------------------------------------------------
+def legacy_parse_bank_statement_text(text: str) -> List[dict]:
+    """
+    Parse bank statement text to extract transactions
+    Looks for common bank statement formats with date, description, and amount
+    """
+    import re
+    from datetime import datetime
+    
+    transactions = []
+    lines = text.split('\n')
+    
+    # Pattern to match transaction lines: Date | Description | Amount
+    # Patterns for common formats:
+    # 1. DD/MM/YYYY, description, amount
+    # 2. DD-MM-YYYY, description, amount
+    # 3. YYYY-MM-DD, description, amount
+    
+    patterns = [
+        # Date (various formats) | Description | Amount (with currency)
+        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s*[|\t]\s*(.+?)\s*[|\t]\s*([-]?\d+[\.,\d]*)\s*',
+        # Date | Description | Debit/Credit | Amount
+        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s*[|\t]\s*(.+?)\s*[|\t]\s*(Debit|Credit)\s*[|\t]\s*([\d\.,]+)',
+        # Amount at end with currency symbol
+        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s+(.+?)\s+([\d\.,]+)\s*(R|ZAR|USD)',
+    ]
+    
+    for line in lines:
+        line = line.strip()
+        if not line or len(line) < 10:
+            continue
+        
+        for pattern in patterns:
+            matches = re.search(pattern, line)
+            if matches:
+                try:
+                    # Extract components
+                    if len(matches.groups()) >= 3:
+                        date_str = matches.group(1)
+                        description = matches.group(2)
+                        
+                        # Handle different group counts for amount
+                        if len(matches.groups()) == 4:
+                            amount_str = matches.group(4)
+                        else:
+                            amount_str = matches.group(3)
+                        
+                        # Parse date
+                        for date_format in ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d', '%d %b %Y', '%d %B %Y']:
+                            try:
+                                parsed_date = datetime.strptime(date_str, date_format)
+                                break
+                            except ValueError:
+                                continue
+                        else:
+                            parsed_date = datetime.now()
+                        
+                        # Parse amount
+                        amount_str = amount_str.replace(',', '.').replace('-', '')
+                        amount = float(amount_str) if amount_str else 0.0
+                        
+                        # Determine direction
+                        direction = "Credit" if amount >= 0 else "Debit"
+                        
+                        # Clean description
+                        description = description.strip().replace('|', '').replace('\t', '').strip()
+                        
+                        if description and amount > 0:
+                            transactions.append({
+                                "date": parsed_date.isoformat(),
+                                "description": description,
+                                "amount": str(abs(amount)),
+                                "direction": direction,
+                                "reference": ""
+                            })
+                            break
+                except Exception as e:
+                    print(f"Error parsing line: {line} - {e}")
+                    continue
+    
+    return transactions
+
+
+def legacy_parse_csv_bank_statement(csv_content: str) -> List[dict]:
+    """
+    Parse CSV bank statement format
+    Expected format: Date, Description, Amount, Reference (header row)
+    """
+    import csv
+    from io import StringIO
+    from datetime import datetime
+    
+    transactions = []
+    
+    try:
+        reader = csv.reader(StringIO(csv_content))
+        header = next(reader, None)  # Skip header
+        
+        for row in reader:
+            if len(row) < 3 or not row[0].strip():
+                continue
+            
+            try:
+                date_str = row[0].strip()
+                description = row[1].strip() if len(row) > 1 else ""
+                amount_str = row[2].strip() if len(row) > 2 else "0"
+                reference = row[3].strip() if len(row) > 3 else ""
+                
+                # Parse date
+                parsed_date = None
+                for date_format in ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d']:
+                    try:
+                        parsed_date = datetime.strptime(date_str, date_format)
+                        break
+                    except ValueError:
+                        continue
+                
+                if not parsed_date:
+                    continue
+                
+                # Parse amount
+                amount_str = amount_str.replace(',', '.').replace('R', '').replace('ZAR', '').strip()
+                amount = float(amount_str) if amount_str else 0.0
+                
+                direction = "Credit" if amount >= 0 else "Debit"
+                
+                if description and amount != 0:
+                    transactions.append({
+                        "date": parsed_date.isoformat(),
+                        "description": description,
+                        "amount": str(abs(amount)),
+                        "direction": direction,
+                        "reference": reference
+                    })
+            except Exception as e:
+                print(f"Error parsing CSV row: {row} - {e}")
+                continue
+    except Exception as e:
+        print(f"CSV parsing error: {e}")
+    
+    return transactions
+
+
+def _time(fn, *args) -> float:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    text = generate_text_statement(args.lines)
+    csv_text = generate_csv_statement(args.lines)
+
+    for name, new, old, data in [
+        ("text", parse_bank_statement_text, legacy_parse_bank_statement_text, text),
+        ("csv", parse_csv_bank_statement, legacy_parse_csv_bank_statement, csv_text),
+    ]:
+        # Warm up so one-off imports (pandas) are not counted
+        new(data[:2000])
+        old_time, old_result = _time(old, data)
+        new_time, new_result = _time(new, data)
+        print(f"{name:>4}: {args.lines} lines  legacy {old_time:.3f}s ({len(old_result)} txns)  "
+              f"new {new_time:.3f}s ({len(new_result)} txns)  speedup x{old_time / new_time:.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
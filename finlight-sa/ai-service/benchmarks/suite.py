@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the categorizer, the statement parsers and the
+OCR pipeline.
+
+Every input is generated locally (statements, receipt text, receipt images
+rendered with PIL), so runs are reproducible without network access. Results
+are written as JSON; a run compared against a saved baseline fails when a
+benchmark's median time regressed by more than the threshold.
+
+Usage (from ai-service/):
+    python -m benchmarks.suite --save-baseline benchmarks/results/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/results/baseline.json --threshold 0.2
+    python -m benchmarks.suite --only parser --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.bench_statement_parser import DESCRIPTIONS, generate_csv_statement, generate_text_statement
+
+AI_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_THRESHOLD = 0.2
+
+VENDORS = ["PICK N PAY", "WOOLWORTHS", "ENGEN QUICKSHOP", "CHECKERS", "BUILDERS WAREHOUSE", "SPUR STEAK RANCH"]
+ITEMS = ["Bread", "Milk 2L", "Coffee beans", "Printer paper", "Diesel", "Cable ties", "Burger", "Cool drink"]
+
+
+def measure(fn: Callable[[], object], items: int = 1, repeat: int = 5, min_sample: float = 0.05) -> Dict:
+    """
+    Time fn after one warm-up call. Fast functions are looped so each sample
+    lasts at least min_sample seconds; slow ones get fewer samples.
+    """
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+
+    loops = max(1, int(min_sample / first)) if first > 0 else 1000
+    if first > 1.0:
+        repeat = min(repeat, 3)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4),
+        "samples": repeat,
+        "loops": loops,
+        "items": items,
+        "items_per_second": round(items / median, 1) if median > 0 else None,
+    }
+
+
+# ----------------------------------------------------------------------
+# Inputs
+# ----------------------------------------------------------------------
+def generate_descriptions(count: int, seed: int = 42) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(DESCRIPTIONS)} {rng.randint(1000, 9999)}" for _ in range(count)]
+
+
+def generate_receipt_text(rng: random.Random) -> str:
+    lines = [rng.choice(VENDORS), "TAX INVOICE", f"Date: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024", ""]
+    total = 0.0
+    for _ in range(rng.randint(3, 8)):
+        price = round(rng.uniform(5, 500), 2)
+        total += price
+        lines.append(f"{rng.choice(ITEMS)}  R {price:.2f}")
+    vat = round(total * 15 / 115, 2)
+    lines += ["", f"TOTAL R {total:.2f}", f"VAT Included in Total: R {vat:.2f}", "Thank you"]
+    return "\n".join(lines)
+
+
+def render_receipt_image(text: str, scale: int = 2) -> bytes:
+    """Draw receipt text onto a clean white PNG, like a scanned till slip"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=14 * scale)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        font = ImageFont.load_default()
+    lines = text.split("\n")
+    line_height = 20 * scale
+    image = Image.new("L", (420 * scale, (len(lines) + 2) * line_height), color=255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((20 * scale, (i + 1) * line_height), line, fill=0, font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# ----------------------------------------------------------------------
+# Benchmarks; each returns {name: result}
+# ----------------------------------------------------------------------
+def bench_categorizer(args, workdir: str) -> Dict[str, Dict]:
+    from app.categorizer import TransactionCategorizer
+
+    # A fresh seed model and no prediction cache, so every call is scored
+    categorizer = TransactionCategorizer(os.path.join(workdir, "models"), prediction_cache_size=0)
+    descriptions = generate_descriptions(max(args.batch_size, 1000))
+    position = [0]
+
+    def predict_single():
+        position[0] = (position[0] + 1) % len(descriptions)
+        categorizer.predict(descriptions[position[0]], 100.0, "Debit")
+
+    batch = descriptions[:args.batch_size]
+    results = {
+        "categorizer.predict.single": measure(predict_single),
+        f"categorizer.predict_many.{args.batch_size}": measure(
+            lambda: categorizer.predict_many(batch), items=len(batch)
+        ),
+    }
+    categorizer.close()
+    return results
+
+
+def bench_parsers(args, workdir: str) -> Dict[str, Dict]:
+    from app.statement_parser import parse_bank_statement_text, parse_csv_bank_statement
+
+    results = {}
+    for size in args.sizes:
+        text = generate_text_statement(size)
+        results[f"parser.text.{size}"] = measure(lambda: parse_bank_statement_text(text), items=size)
+        del text
+        csv_text = generate_csv_statement(size)
+        results[f"parser.csv.{size}"] = measure(lambda: parse_csv_bank_statement(csv_text), items=size)
+        del csv_text
+    return results
+
+
+def bench_receipt_parsers(args, workdir: str) -> Dict[str, Dict]:
+    from app.ocr import OCRService
+
+    service = OCRService(probe=False)
+    rng = random.Random(42)
+    texts = [generate_receipt_text(rng) for _ in range(args.receipts)]
+
+    results = {}
+    for method in ("parse_receipt_text", "parse_amount", "parse_vendor", "parse_vat", "parse_items", "parse_date"):
+        parse = getattr(service, method)
+        results[f"ocr.{method}"] = measure(lambda: [parse(text) for text in texts], items=len(texts))
+    return results
+
+
+def bench_ocr_endpoint(args, workdir: str) -> Dict[str, Dict]:
+    # main.py keeps its models and caches relative to the working directory
+    cwd = os.getcwd()
+    cache_max_mb = os.environ.get("OCR_CACHE_MAX_MB")
+    os.chdir(workdir)
+    os.environ["OCR_CACHE_MAX_MB"] = "0"  # every request must run Tesseract
+    try:
+        from fastapi.testclient import TestClient
+        import main
+
+        rng = random.Random(7)
+        images = [render_receipt_image(generate_receipt_text(rng)) for _ in range(args.images)]
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 60
+            while client.get("/ready").status_code != 200:
+                if time.monotonic() > deadline:
+                    return {"e2e.ocr_receipt": {"skipped": "service did not become ready"}}
+                time.sleep(0.1)
+            if not main.ocr_service.is_available():
+                return {"e2e.ocr_receipt": {"skipped": "Tesseract is not installed"}}
+            position = [0]
+
+            def post_receipt():
+                position[0] = (position[0] + 1) % len(images)
+                response = client.post(
+                    "/ocr/receipt",
+                    files={"file": ("receipt.png", images[position[0]], "image/png")}
+                )
+                response.raise_for_status()
+
+            return {"e2e.ocr_receipt": measure(post_receipt, repeat=args.repeat)}
+    finally:
+        os.chdir(cwd)
+        if cache_max_mb is None:
+            os.environ.pop("OCR_CACHE_MAX_MB", None)
+        else:
+            os.environ["OCR_CACHE_MAX_MB"] = cache_max_mb
+
+
+BENCHMARKS = {
+    "categorizer": bench_categorizer,
+    "parser": bench_parsers,
+    "receipt": bench_receipt_parsers,
+    "e2e": bench_ocr_endpoint,
+}
+
+
+# ----------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------
+def environment() -> Dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("numpy", "pandas", "sklearn", "PIL", "fastapi"):
+        try:
+            info[module] = __import__(module).__version__
+        except Exception:
+            info[module] = None
+    tesseract = shutil.which("tesseract")
+    info["tesseract"] = tesseract
+    return info
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Median time changes against the baseline; a change above threshold is a regression"""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "median_ms" not in base or "median_ms" not in result:
+            continue
+        change = result["median_ms"] / base["median_ms"] - 1 if base["median_ms"] else 0.0
+        status = "regression" if change > threshold else "improvement" if change < -threshold else "ok"
+        rows.append({"name": name, "baseline_ms": base["median_ms"], "median_ms": result["median_ms"],
+                     "change": round(change, 4), "status": status})
+    return rows
+
+
+def write_json(path: str, data: Dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="Run only these groups (repeatable)")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Statement sizes in lines, comma separated (e.g. 1000,1000000)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--receipts", type=int, default=200)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write this run's results as JSON")
+    parser.add_argument("--save-baseline", help="Write this run's results as the new baseline")
+    parser.add_argument("--baseline", help="Compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown of the median that counts as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    # Imports such as main.py resolve from ai-service/ even after a chdir
+    sys.path.insert(0, AI_SERVICE_DIR)
+    workdir = tempfile.mkdtemp(prefix="finlight-bench-")
+    results = {}
+    try:
+        for group in args.only or BENCHMARKS:
+            print(f"Running {group} benchmarks...")
+            for name, result in BENCHMARKS[group](args, workdir).items():
+                results[name] = result
+                if "skipped" in result:
+                    print(f"  {name:<40} skipped: {result['skipped']}")
+                else:
+                    print(f"  {name:<40} {result['median_ms']:>12.3f} ms  {result['items_per_second'] or 0:>14,.0f} items/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(), "results": results}
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline.get("results", {}), args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold, "benchmarks": rows}
+        print(f"\nAgainst {args.baseline} (threshold {args.threshold:.0%}):")
+        for row in rows:
+            print(f"  {row['name']:<40} {row['baseline_ms']:>10.3f} -> {row['median_ms']:>10.3f} ms "
+                  f"{row['change']:>+8.1%}  {row['status']}")
+        regressions = [row for row in rows if row["status"] == "regression"]
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            exit_code = 1
+        if baseline.get("environment", {}).get("platform") != report["environment"]["platform"]:
+            print("Note: the baseline was recorded on a different platform")
+
+    if args.output:
+        write_json(args.output, report)
+    if args.save_baseline:
+        write_json(args.save_baseline, report)
+        print(f"Baseline saved to {args.save_baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,39 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import time
+PROCESS_START = time.perf_counter()
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Callable, Iterator, List, Optional
 import uvicorn
 import os
+import json
 from dotenv import load_dotenv
 from app.categorizer import TransactionCategorizer
+from app.model_registry import ModelRegistry
 from app.ocr import OCRService
+from app.ocr_pool import OCRProcessPool, OCRPoolSaturated
+from app.batcher import MicroBatcher
+from app.extraction_jobs import ExtractionJobs, ExtractionQueueFull
+from app.bulk import BulkInputError, dumps, ndjson_lines, parse_columnar, parse_ndjson_lines, result_columns
+from app.training import TrainingJobs
+from app.metrics import REGISTRY, MetricsMiddleware, stage
+from app.profiling import ProfilingMiddleware, current_profile, profiled, profiled_iter, tag_document
+from app.startup import Warmup
+from app.statement_pdf import iter_pdf_pages
+from app.statement_parser import (
+    parse_bank_statement_text, iter_bank_statement_lines,
+    parse_csv_bank_statement, iter_csv_bank_statement
+)
 
 load_dotenv()
 
+warmup = Warmup(started_at=PROCESS_START)
+warmup.mark("imports", PROCESS_START)
+app_init_start = time.perf_counter()
+
 app = FastAPI(
     title="FinLight SA AI Service",
     description="AI-powered categorization and OCR for FinLight SA",
@@ -25,9 +49,206 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-categorizer = TransactionCategorizer()
-ocr_service = OCRService()
+# Request counts and latency per route, reported by /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Opt-in cProfile of single requests: X-Profile: <PROFILE_TOKEN>, or a sampled fraction
+app.add_middleware(
+    ProfilingMiddleware,
+    directory=os.getenv("PROFILE_DIR", "./profiles"),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    token=os.getenv("PROFILE_TOKEN"),
+    max_files=int(os.getenv("PROFILE_MAX_FILES", "200"))
+)
+
+# Initialize services; the model and Tesseract are loaded by the warm-up task
+categorizer = TransactionCategorizer(load=False)
+ocr_service = OCRService(probe=False)
+ocr_pool = OCRProcessPool(
+    max_workers=int(os.getenv("OCR_WORKERS", "0")) or None,
+    max_pending=int(os.getenv("OCR_MAX_PENDING", "0")) or None
+)
+
+# Per-business models from models/<business_id>/, falling back to the global categorizer
+model_registry = ModelRegistry(
+    categorizer,
+    max_models=int(os.getenv("TENANT_MAX_MODELS", "100")),
+    max_bytes=int(float(os.getenv("TENANT_MAX_MB", "256")) * 1024 * 1024),
+    check_interval=float(os.getenv("MODEL_WATCH_INTERVAL", "2")),
+    prediction_cache_size=int(os.getenv("TENANT_PREDICTION_CACHE_SIZE", "1000"))
+)
+
+def score_transactions(transactions, model: Optional[TransactionCategorizer] = None) -> List[dict]:
+    model = model or categorizer
+    return model.predict_many(
+        descriptions=[txn.description for txn in transactions],
+        amounts=[txn.amount for txn in transactions],
+        directions=[txn.direction for txn in transactions]
+    )
+
+def score_queued(items) -> List[dict]:
+    """
+    Score (categorizer, transaction) pairs with one call per categorizer.
+    A categorizer that fails only fails its own items: their slots hold the
+    exception, which the batcher raises to those callers alone.
+    """
+    groups = {}
+    for i, (model, _) in enumerate(items):
+        groups.setdefault(id(model), (model, []))[1].append(i)
+    results = [None] * len(items)
+    for model, indices in groups.values():
+        try:
+            predictions = score_transactions([items[i][1] for i in indices], model)
+        except Exception as e:
+            predictions = [e] * len(indices)
+        for i, prediction in zip(indices, predictions):
+            results[i] = prediction
+    return results
+
+# Retraining runs in a separate process; the finished model is swapped in here
+training_jobs = TrainingJobs(categorizer.model_path, on_model_ready=categorizer.activate_model_file)
+
+# POST /jobs/extract: statements extracted in the background, results kept for a while
+extraction_jobs = ExtractionJobs(
+    lambda contents, filename, content_type, on_page: extract_statement(
+        contents, filename, content_type, on_page, wait_for_ocr=True
+    ),
+    jobs_dir=os.getenv("EXTRACT_JOBS_DIR", "./cache/jobs"),
+    max_workers=int(os.getenv("EXTRACT_JOBS_WORKERS", "2")),
+    max_queued=int(os.getenv("EXTRACT_JOBS_MAX_QUEUED", "20")),
+    ttl=float(os.getenv("EXTRACT_JOBS_TTL_SECONDS", "3600")),
+    stale_after=float(os.getenv("EXTRACT_JOBS_STALE_SECONDS", "86400"))
+)
+
+# Coalesces concurrent /categorize calls into one vectorized scoring call
+categorize_batcher = MicroBatcher(
+    score_queued,
+    max_batch_size=int(os.getenv("CATEGORIZE_MAX_BATCH", "64")),
+    max_wait_ms=float(os.getenv("CATEGORIZE_BATCH_WINDOW_MS", "2"))
+)
+
+async def run_ocr(method: str, data: bytes, *args):
+    """Run an OCRService method in the OCR process pool so it never blocks the event loop"""
+    if not ocr_service.is_available():
+        # Without Tesseract the service only returns placeholder data
+        return getattr(ocr_service, method)(data, *args)
+    # Repeated documents are answered from the OCR cache without touching the pool;
+    # hashing the document and reading the cache file stay off the event loop
+    cached = await run_in_threadpool(ocr_service.lookup_cache, method, data, *args)
+    if cached is not None:
+        return cached
+    if current_profile() is not None:
+        # Profiled requests OCR in this process, where the profiler can see it
+        return await run_in_threadpool(profiled, getattr(ocr_service, method), data, *args)
+    return await ocr_pool.run(method, data, *args)
+
+def collect_metrics():
+    """Gauges and counters read from component statistics when /metrics is scraped"""
+    batching = categorize_batcher.stats()
+    pool = ocr_pool.stats()
+    prediction_cache = categorizer.prediction_cache.stats()
+    feedback = categorizer.feedback_store.stats()
+    tenants = model_registry.stats()
+    extraction = extraction_jobs.stats()
+    yield ("finlight_ready", "gauge", "1 once warm-up has finished", [({}, int(warmup.ready))])
+    yield ("finlight_model_info", "gauge", "Live global model version",
+           [({"version": categorizer.model_version or "none"}, 1)])
+    yield ("finlight_categorize_queue_depth", "gauge", "Transactions waiting for the /categorize micro-batcher",
+           [({}, batching["queue_depth"])])
+    yield ("finlight_categorize_batches_total", "counter", "Micro-batches scored for /categorize",
+           [({}, batching["batches"])])
+    yield ("finlight_categorize_batched_items_total", "counter", "Transactions scored through the micro-batcher",
+           [({}, batching["items"])])
+    yield ("finlight_ocr_pool_pending", "gauge", "Documents queued or running in the OCR pool",
+           [({}, pool["pending"])])
+    yield ("finlight_ocr_pool_tasks_total", "counter", "OCR pool tasks by outcome",
+           [({"outcome": "completed"}, pool["completed"]), ({"outcome": "rejected"}, pool["rejected"])])
+    yield ("finlight_prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+           [({"result": "hit"}, prediction_cache["hits"]), ({"result": "miss"}, prediction_cache["misses"])])
+    yield ("finlight_prediction_cache_entries", "gauge", "Cached predictions", [({}, prediction_cache["size"])])
+    if ocr_service.cache is not None:
+        ocr_cache = ocr_service.cache.stats()
+        yield ("finlight_ocr_cache_lookups_total", "counter", "OCR disk cache lookups by result",
+               [({"result": "hit"}, ocr_cache["hits"]), ({"result": "miss"}, ocr_cache["misses"])])
+    yield ("finlight_feedback_buffered", "gauge", "Feedback records waiting for a group commit",
+           [({}, feedback["buffered"])])
+    yield ("finlight_feedback_committed_total", "counter", "Feedback records committed by this process",
+           [({}, feedback["committed"])])
+    yield ("finlight_tenant_models_loaded", "gauge", "Business models in memory", [({}, tenants["loaded"])])
+    yield ("finlight_tenant_models_bytes", "gauge", "Memory held by loaded business models", [({}, tenants["bytes"])])
+    yield ("finlight_tenant_model_evictions_total", "counter", "Business models unloaded by the LRU",
+           [({}, tenants["evictions"])])
+    yield ("finlight_extraction_jobs_active", "gauge", "Extraction jobs queued or running in this process",
+           [({}, extraction["active"])])
+    yield ("finlight_extraction_jobs_total", "counter", "Extraction jobs by outcome",
+           [({"outcome": outcome}, extraction[outcome]) for outcome in ("completed", "failed", "rejected")])
+
+REGISTRY.add_collector(collect_metrics)
+
+warmup.mark("app_init", app_init_start)
+
+# Requests that arrive during warm-up wait this long for it before getting a 503
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT_SECONDS", "30"))
+
+# /categorize/bulk: rows accepted in one response, and rows scored per streamed chunk
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "200000"))
+BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", "5000"))
+
+# Uploads accepted by /extract-bank-statement and /jobs/extract
+STATEMENT_CONTENT_TYPES = [
+    "application/pdf", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.ms-excel", "text/csv"
+]
+
+def warm_up():
+    with warmup.stage("categorizer"):
+        categorizer.load_or_create_model()
+    categorizer.start_model_watcher(float(os.getenv("MODEL_WATCH_INTERVAL", "2")))
+    with warmup.stage("ocr"):
+        ocr_service.probe()
+    if ocr_service.is_available() and os.getenv("OCR_POOL_PRESTART", "true").lower() == "true":
+        with warmup.stage("ocr_pool"):
+            ocr_pool.start()
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start(warm_up)
+
+async def require_ready():
+    if not await warmup.wait(READY_TIMEOUT):
+        raise HTTPException(status_code=503, detail=warmup.error or "Service is warming up")
+
+async def prediction_model(business_id: Optional[str] = Header(None, alias="X-Business-Id")) -> TransactionCategorizer:
+    """Categorizer for the calling business, from the optional X-Business-Id header"""
+    if not business_id:
+        return categorizer
+    try:
+        # Loading a tenant model touches the disk, keep it off the event loop
+        return await run_in_threadpool(model_registry.for_prediction, business_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def feedback_model(business_id: Optional[str] = Header(None, alias="X-Business-Id")) -> TransactionCategorizer:
+    """Categorizer whose feedback store and training belong to the calling business"""
+    if not business_id:
+        return categorizer
+    try:
+        return await run_in_threadpool(model_registry.for_feedback, business_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.on_event("shutdown")
+async def shutdown_ocr_pool():
+    ocr_pool.shutdown()
+    ocr_service.close()
+
+@app.on_event("shutdown")
+async def flush_feedback():
+    # Closing commits buffered feedback, which an online model learns and checkpoints
+    await run_in_threadpool(categorizer.close)
+    await run_in_threadpool(model_registry.close)
+    training_jobs.shutdown()
+    extraction_jobs.shutdown()
 
 # Pydantic models
 class Transaction(BaseModel):
@@ -63,6 +284,7 @@ class FeedbackRequest(BaseModel):
 class ProcessDocumentRequest(BaseModel):
     image: str  # base64 encoded image
     document_type: str  # "receipt" or "invoice"
+    include_raw_text: bool = True  # False OCRs only the regions the fields come from
 
 @app.get("/")
 async def root():
@@ -74,40 +296,70 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """
+    Liveness: answers as soon as the process is up, during warm-up too
+    """
     return {
         "status": "healthy",
-        "categorizer_loaded": categorizer.model is not None,
-        "ocr_available": ocr_service.is_available()
+        "ready": warmup.ready,
+        "startup": warmup.report(),
+        "categorizer_loaded": categorizer.loaded,
+        "model_version": categorizer.model_version,
+        "ocr_available": ocr_service.is_available(),
+        "ocr_engine": ocr_service.engine.name if ocr_service.engine is not None else None,
+        "ocr_pool": ocr_pool.stats(),
+        "ocr_cache": ocr_service.cache.stats() if ocr_service.cache is not None else None,
+        "prediction_cache": categorizer.prediction_cache.stats(),
+        "feedback_store": categorizer.feedback_store.stats(),
+        "training": training_jobs.stats(),
+        "extraction_jobs": extraction_jobs.stats(),
+        "online_model": categorizer.online.stats() if categorizer.online is not None else None,
+        "tenant_models": model_registry.stats(),
+        "categorize_batching": categorize_batcher.stats()
     }
 
-@app.post("/categorize", response_model=CategoryPrediction)
-async def categorize_transaction(transaction: Transaction):
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition of request, stage, batching and cache metrics
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 200 once the model is loaded and OCR is probed, 503 before
+    """
+    report = warmup.report()
+    if not warmup.ready:
+        report["status"] = "failed" if warmup.error else "warming_up"
+        return JSONResponse(status_code=503, content=report)
+    report["status"] = "ready"
+    report["model_version"] = categorizer.model_version
+    return report
+
+@app.post("/categorize", response_model=CategoryPrediction, dependencies=[Depends(require_ready)])
+async def categorize_transaction(transaction: Transaction,
+                                 model: TransactionCategorizer = Depends(prediction_model)):
     """
     Categorize a single transaction based on its description and amount
     """
     try:
-        result = categorizer.predict(
-            description=transaction.description,
-            amount=transaction.amount,
-            direction=transaction.direction
-        )
+        result = await categorize_batcher.submit((model, transaction))
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Categorization error: {str(e)}")
 
-@app.post("/categorize/batch", response_model=List[TransactionWithPrediction])
-async def categorize_transactions_batch(transactions: List[Transaction]):
+@app.post("/categorize/batch", response_model=List[TransactionWithPrediction], dependencies=[Depends(require_ready)])
+async def categorize_transactions_batch(transactions: List[Transaction],
+                                        model: TransactionCategorizer = Depends(prediction_model)):
     """
     Categorize multiple transactions at once
     """
     try:
+        predictions = profiled(score_transactions, transactions, model)
         results = []
-        for txn in transactions:
-            prediction = categorizer.predict(
-                description=txn.description,
-                amount=txn.amount,
-                direction=txn.direction
-            )
+        for txn, prediction in zip(transactions, predictions):
             results.append(TransactionWithPrediction(
                 description=txn.description,
                 amount=txn.amount,
@@ -119,18 +371,106 @@ async def categorize_transactions_batch(transactions: List[Transaction]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch categorization error: {str(e)}")
 
-@app.post("/process-document")
+@app.post("/categorize/bulk", dependencies=[Depends(require_ready)])
+async def categorize_bulk(request: Request, stream: bool = False, top_k: int = 1,
+                          model: TransactionCategorizer = Depends(prediction_model)):
+    """
+    Categorize many transactions from an NDJSON body (Content-Type: application/x-ndjson)
+    or a columnar JSON body {"descriptions": [...], "amounts": [...], "directions": [...]}.
+    Returns columnar results, or NDJSON chunks of them as they are scored when stream=true.
+    """
+    top_k = max(1, min(top_k, 5))
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    body = await request.body()
+    tag_document(body)
+    
+    if stream:
+        return StreamingResponse(
+            profiled_iter(stream_bulk(body, ndjson, model, top_k), chunk=1),
+            media_type="application/x-ndjson"
+        )
+    
+    try:
+        if ndjson:
+            columns = await run_in_threadpool(lambda: parse_ndjson_lines(ndjson_lines(body)))
+        else:
+            columns = await run_in_threadpool(parse_columnar, body)
+    except BulkInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(columns) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"More than {BULK_MAX_ROWS} rows; use stream=true")
+    
+    try:
+        predictions = await run_in_threadpool(profiled, model.predict_bulk, columns.descriptions, top_k)
+        content = await run_in_threadpool(dumps, {
+            "count": len(predictions),
+            "model_version": model.model_version,
+            **result_columns(predictions, top_k)
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk categorization error: {str(e)}")
+    return Response(content=content, media_type="application/json")
+
+
+def stream_bulk(body: bytes, ndjson: bool, model: TransactionCategorizer, top_k: int) -> Iterator[bytes]:
+    """
+    Generator behind /categorize/bulk?stream=true. Rows are parsed, scored and
+    serialized BULK_CHUNK_ROWS at a time, so a 100k-row job never holds more
+    than one chunk of results; a final summary record carries the count.
+    """
+    summary = {"type": "summary", "success": True, "count": 0, "model_version": model.model_version}
+    try:
+        if ndjson:
+            lines = ndjson_lines(body)
+            chunks = (parse_ndjson_lines(lines[start:start + BULK_CHUNK_ROWS], offset=start)
+                      for start in range(0, len(lines), BULK_CHUNK_ROWS))
+        else:
+            columns = parse_columnar(body)
+            chunks = (columns.slice(start, start + BULK_CHUNK_ROWS)
+                      for start in range(0, len(columns), BULK_CHUNK_ROWS))
+        
+        for chunk in chunks:
+            predictions = model.predict_bulk(chunk.descriptions, top_k)
+            yield dumps({
+                "type": "chunk",
+                "offset": summary["count"],
+                "count": len(predictions),
+                **result_columns(predictions, top_k)
+            }) + b"\n"
+            summary["count"] += len(predictions)
+    except Exception as e:
+        # Headers are already sent, so errors are reported in the summary record
+        summary["success"] = False
+        summary["message"] = str(e) if isinstance(e, BulkInputError) else f"Bulk categorization error: {str(e)}"
+    
+    yield dumps(summary) + b"\n"
+
+
+@app.post("/process-document", dependencies=[Depends(require_ready)])
 async def process_document(request: ProcessDocumentRequest):
     """
     Process a document (receipt or invoice) from base64 image data
     """
     try:
         import base64
-        image_bytes = base64.b64decode(request.image)
+        with stage("request.base64_decode"):
+            image_bytes = profiled(base64.b64decode, request.image)
+        tag_document(image_bytes)
+
+        document_type = request.document_type.lower()
+        if document_type not in ("receipt", "invoice"):
+            raise HTTPException(status_code=400, detail="Invalid document type. Use 'receipt' or 'invoice'")
 
-        if request.document_type.lower() == "receipt":
-            result = ocr_service.extract_receipt_data(image_bytes)
-            raw_text = ocr_service.extract_text_from_image(image_bytes) if ocr_service.is_available() else ""
+        # One OCR pass gives both the parsed fields and the raw text
+        ocr = await run_ocr("process_receipt", image_bytes, document_type, request.include_raw_text)
+        raw_text = ocr.raw_text if request.include_raw_text else ""
+        result = ocr.fields
+        if ocr_service.is_available():
+            confidence = ocr.confidence if ocr.confidence is not None else 0.8
+        else:
+            confidence = 0.3  # Lower confidence if OCR not available
+
+        if document_type == "receipt":
             return {
                 "vendor": result.get("vendor", "Unknown"),
                 "amount": result.get("amount", 0.0),
@@ -138,12 +478,11 @@ async def process_document(request: ProcessDocumentRequest):
                 "vat_amount": result.get("vat_amount", 0.0),
                 "items": result.get("items", []),
                 "raw_text": raw_text,
-                "confidence": 0.8 if ocr_service.is_available() else 0.3  # Lower confidence if OCR not available
+                "confidence": confidence
             }
-        elif request.document_type.lower() == "invoice":
+        else:
             # For invoices, we can use the same receipt processing for now
             # In a more advanced implementation, we'd have separate invoice parsing
-            result = ocr_service.extract_receipt_data(image_bytes)
             return {
                 "invoice_number": "",  # Would need separate parsing
                 "vendor": result.get("vendor", "Unknown"),
@@ -153,16 +492,18 @@ async def process_document(request: ProcessDocumentRequest):
                 "due_date": "",  # Would calculate based on terms
                 "vat_amount": result.get("vat_amount", 0.0),
                 "items": result.get("items", []),
-                "raw_text": "",
-                "confidence": 0.8
+                "raw_text": raw_text,
+                "confidence": confidence
             }
-        else:
-            raise HTTPException(status_code=400, detail="Invalid document type. Use 'receipt' or 'invoice'")
 
+    except HTTPException:
+        raise
+    except OCRPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Document processing error: {str(e)}")
 
-@app.post("/ocr/receipt", response_model=ReceiptData)
+@app.post("/ocr/receipt", response_model=ReceiptData, dependencies=[Depends(require_ready)])
 async def extract_receipt_data(file: UploadFile = File(...)):
     """
     Extract data from a receipt image using OCR
@@ -172,18 +513,24 @@ async def extract_receipt_data(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="File must be an image")
 
         contents = await file.read()
-        result = ocr_service.extract_receipt_data(contents)
+        tag_document(contents)
+        result = await run_ocr("extract_receipt_data", contents)
         return result
+    except OCRPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR error: {str(e)}")
 
-@app.post("/feedback")
-async def submit_feedback(feedback: FeedbackRequest):
+@app.post("/feedback", dependencies=[Depends(require_ready)])
+async def submit_feedback(feedback: FeedbackRequest,
+                          model: TransactionCategorizer = Depends(feedback_model)):
     """
     Submit user feedback to improve model accuracy
     """
     try:
-        categorizer.add_feedback(
+        # A full buffer commits to SQLite inside add_feedback, so keep it off the event loop
+        await run_in_threadpool(
+            model.add_feedback,
             description=feedback.description,
             predicted_category=feedback.predicted_category,
             correct_category=feedback.correct_category,
@@ -196,253 +543,283 @@ async def submit_feedback(feedback: FeedbackRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Feedback error: {str(e)}")
 
-@app.post("/extract-bank-statement")
-async def extract_bank_statement(file: UploadFile = File(...)):
+@app.post("/feedback/batch", dependencies=[Depends(require_ready)])
+async def submit_feedback_batch(feedback: List[FeedbackRequest],
+                                model: TransactionCategorizer = Depends(feedback_model)):
+    """
+    Submit several feedback records, committed together in one transaction
+    """
+    try:
+        await run_in_threadpool(model.add_feedback_batch, [item.model_dump() for item in feedback])
+        return {
+            "status": "success",
+            "message": f"{len(feedback)} feedback records recorded successfully",
+            "count": len(feedback)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Feedback error: {str(e)}")
+
+@app.post("/extract-bank-statement", dependencies=[Depends(require_ready)])
+async def extract_bank_statement(file: UploadFile = File(...), stream: bool = False):
     """
     Extract bank statement transactions from PDF or Excel file
-    Returns structured transaction data
+    Returns structured transaction data, or NDJSON records as they are parsed when stream=true
     """
     try:
-        if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "application/vnd.ms-excel", "text/csv"]:
+        if file.content_type not in STATEMENT_CONTENT_TYPES:
             raise HTTPException(status_code=400, detail="File must be PDF, Excel, or CSV")
 
         contents = await file.read()
+        tag_document(contents)
         
-        # For PDF files, use OCR to extract text
-        if file.content_type == "application/pdf" or file.filename.endswith(".pdf"):
-            try:
-                import PyPDF2
-                from io import BytesIO
-                
-                pdf_file = BytesIO(contents)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                extracted_text = ""
-                for page in pdf_reader.pages:
-                    extracted_text += page.extract_text() + "\n"
-                
-                # Parse the extracted text for transactions
-                transactions = parse_bank_statement_text(extracted_text)
-                
-                return {
-                    "success": True,
-                    "transactions": transactions,
-                    "source": "PDF_OCR",
-                    "raw_text": extracted_text[:500]  # Return first 500 chars of raw text
-                }
-            except Exception as e:
-                print(f"PDF extraction error: {e}")
-                # Try with Tesseract as fallback
-                if ocr_service.is_available():
-                    extracted_text = extract_text_from_pdf_via_ocr(contents)
-                    transactions = parse_bank_statement_text(extracted_text)
-                    return {
-                        "success": True,
-                        "transactions": transactions,
-                        "source": "OCR_Tesseract",
-                        "raw_text": extracted_text[:500]
-                    }
+        if stream:
+            return StreamingResponse(
+                profiled_iter(stream_bank_statement(contents, file.filename or "", file.content_type)),
+                media_type="application/x-ndjson"
+            )
         
-        # For CSV files
-        if file.filename.endswith(".csv"):
-            csv_text = contents.decode('utf-8')
-            transactions = parse_csv_bank_statement(csv_text)
+        return await run_in_threadpool(
+            profiled, extract_statement, contents, file.filename or "", file.content_type
+        )
+        
+    except HTTPException:
+        raise
+    except OCRPoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Bank statement extraction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Extraction error: {str(e)}")
+
+def extract_statement(contents: bytes, filename: str, content_type: str,
+                      on_page: Optional[Callable[[int, int], None]] = None, wait_for_ocr: bool = False) -> dict:
+    """
+    Blocking extraction behind /extract-bank-statement and /jobs/extract.
+    on_page(page, page_count) is called as each PDF page is read; with
+    wait_for_ocr a full OCR pool delays scanned pages instead of failing them.
+    """
+    # For PDF files, read the text layer page by page and OCR only the pages without one
+    if content_type == "application/pdf" or filename.endswith(".pdf"):
+        pages = []
+        with stage("statement.pdf_pages"):
+            for page in extract_pdf_pages(contents, wait_for_ocr):
+                pages.append(page)
+                if on_page is not None:
+                    on_page(page["page"], page["page_count"])
+        if pages:
+            extracted_text = "\n".join(page["text"] for page in pages)
+            with stage("statement.parse_text"):
+                transactions = parse_bank_statement_text(extracted_text)
+            
             return {
                 "success": True,
                 "transactions": transactions,
-                "source": "CSV"
+                "source": pdf_source(pages),
+                "pages": [{"page": page["page"], "source": page["source"]} for page in pages],
+                "warnings": [page["warning"] for page in pages if page["warning"]],
+                "raw_text": extracted_text[:500]  # Return first 500 chars of raw text
             }
-        
+    
+    # For CSV files
+    if filename.endswith(".csv"):
+        csv_text = contents.decode('utf-8')
+        with stage("statement.parse_csv"):
+            transactions = parse_csv_bank_statement(csv_text)
         return {
-            "success": False,
-            "message": "Unable to extract transactions from this file",
-            "transactions": []
+            "success": True,
+            "transactions": transactions,
+            "source": "CSV"
         }
-        
-    except Exception as e:
-        print(f"Bank statement extraction error: {e}")
-        raise HTTPException(status_code=500, detail=f"Extraction error: {str(e)}")
+    
+    return {
+        "success": False,
+        "message": "Unable to extract transactions from this file",
+        "transactions": []
+    }
 
-@app.post("/train")
-async def train_model():
+@app.post("/jobs/extract", status_code=202, dependencies=[Depends(require_ready)])
+async def submit_extraction_job(file: UploadFile = File(...)):
     """
-    Retrain the categorization model with accumulated feedback
+    Queue a bank statement for extraction in the background. Returns a job id
+    immediately; poll /jobs/{job_id} for page progress and fetch
+    /jobs/{job_id}/result once it has completed.
     """
+    if file.content_type not in STATEMENT_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="File must be PDF, Excel, or CSV")
+    contents = await file.read()
     try:
-        result = categorizer.retrain()
-        return {
-            "status": "success",
-            "message": "Model retrained successfully",
-            "metrics": result
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Training error: {str(e)}")
+        job = await run_in_threadpool(
+            extraction_jobs.submit, contents, file.filename or "", file.content_type
+        )
+    except ExtractionQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "status": "accepted",
+        "job_id": job["id"],
+        "job": job
+    }
 
+@app.get("/jobs/{job_id}")
+async def extraction_job_status(job_id: str):
+    """
+    Report the status (queued, running, completed or failed) and page progress of an extraction job
+    """
+    job = await run_in_threadpool(extraction_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found or expired")
+    return job
 
-def parse_bank_statement_text(text: str) -> List[dict]:
+@app.get("/jobs/{job_id}/result")
+async def extraction_job_result(job_id: str):
     """
-    Parse bank statement text to extract transactions
-    Looks for common bank statement formats with date, description, and amount
+    The extraction result of a completed job, in the same shape as /extract-bank-statement
     """
-    import re
-    from datetime import datetime
-    
-    transactions = []
-    lines = text.split('\n')
-    
-    # Pattern to match transaction lines: Date | Description | Amount
-    # Patterns for common formats:
-    # 1. DD/MM/YYYY, description, amount
-    # 2. DD-MM-YYYY, description, amount
-    # 3. YYYY-MM-DD, description, amount
-    
-    patterns = [
-        # Date (various formats) | Description | Amount (with currency)
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s*[|\t]\s*(.+?)\s*[|\t]\s*([-]?\d+[\.,\d]*)\s*',
-        # Date | Description | Debit/Credit | Amount
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s*[|\t]\s*(.+?)\s*[|\t]\s*(Debit|Credit)\s*[|\t]\s*([\d\.,]+)',
-        # Amount at end with currency symbol
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})\s+(.+?)\s+([\d\.,]+)\s*(R|ZAR|USD)',
-    ]
-    
-    for line in lines:
-        line = line.strip()
-        if not line or len(line) < 10:
-            continue
-        
-        for pattern in patterns:
-            matches = re.search(pattern, line)
-            if matches:
-                try:
-                    # Extract components
-                    if len(matches.groups()) >= 3:
-                        date_str = matches.group(1)
-                        description = matches.group(2)
-                        
-                        # Handle different group counts for amount
-                        if len(matches.groups()) == 4:
-                            amount_str = matches.group(4)
-                        else:
-                            amount_str = matches.group(3)
-                        
-                        # Parse date
-                        for date_format in ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d', '%d %b %Y', '%d %B %Y']:
-                            try:
-                                parsed_date = datetime.strptime(date_str, date_format)
-                                break
-                            except ValueError:
-                                continue
-                        else:
-                            parsed_date = datetime.now()
-                        
-                        # Parse amount
-                        amount_str = amount_str.replace(',', '.').replace('-', '')
-                        amount = float(amount_str) if amount_str else 0.0
-                        
-                        # Determine direction
-                        direction = "Credit" if amount >= 0 else "Debit"
-                        
-                        # Clean description
-                        description = description.strip().replace('|', '').replace('\t', '').strip()
-                        
-                        if description and amount > 0:
-                            transactions.append({
-                                "date": parsed_date.isoformat(),
-                                "description": description,
-                                "amount": str(abs(amount)),
-                                "direction": direction,
-                                "reference": ""
-                            })
-                            break
-                except Exception as e:
-                    print(f"Error parsing line: {line} - {e}")
-                    continue
-    
-    return transactions
+    job = await run_in_threadpool(extraction_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found or expired")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Extraction error: {job.get('error')}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Extraction job is {job['status']}")
+    result = await run_in_threadpool(extraction_jobs.result, job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Extraction job not found or expired")
+    return result
 
+def pdf_source(pages: List[dict]) -> str:
+    """Label a PDF extraction by where its page text came from"""
+    sources = {page["source"] for page in pages}
+    if sources == {"ocr"}:
+        return "OCR_Tesseract"
+    if "ocr" in sources:
+        return "PDF_HYBRID"
+    return "PDF_OCR"
 
-def parse_csv_bank_statement(csv_content: str) -> List[dict]:
+
+def stream_bank_statement(contents: bytes, filename: str, content_type: str) -> Iterator[bytes]:
     """
-    Parse CSV bank statement format
-    Expected format: Date, Description, Amount, Reference (header row)
+    Generator pipeline behind /extract-bank-statement?stream=true.
+    Pages are read one at a time, lines are parsed as they arrive and every
+    transaction is emitted as an NDJSON line; a final summary record carries
+    the counts and warnings.
     """
-    import csv
-    from io import StringIO
-    from datetime import datetime
-    
-    transactions = []
+    def record(data: dict) -> bytes:
+        return (json.dumps(data) + "\n").encode("utf-8")
     
+    summary = {"type": "summary", "success": True, "transaction_count": 0, "warnings": []}
     try:
-        reader = csv.reader(StringIO(csv_content))
-        header = next(reader, None)  # Skip header
-        
-        for row in reader:
-            if len(row) < 3 or not row[0].strip():
-                continue
+        if content_type == "application/pdf" or filename.endswith(".pdf"):
+            pages = []
+            
+            def page_lines():
+                for page in extract_pdf_pages(contents):
+                    pages.append({"page": page["page"], "source": page["source"]})
+                    if page["warning"]:
+                        summary["warnings"].append(page["warning"])
+                    yield from page["text"].split("\n")
             
-            try:
-                date_str = row[0].strip()
-                description = row[1].strip() if len(row) > 1 else ""
-                amount_str = row[2].strip() if len(row) > 2 else "0"
-                reference = row[3].strip() if len(row) > 3 else ""
-                
-                # Parse date
-                parsed_date = None
-                for date_format in ['%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%Y-%m-%d']:
-                    try:
-                        parsed_date = datetime.strptime(date_str, date_format)
-                        break
-                    except ValueError:
-                        continue
-                
-                if not parsed_date:
-                    continue
-                
-                # Parse amount
-                amount_str = amount_str.replace(',', '.').replace('R', '').replace('ZAR', '').strip()
-                amount = float(amount_str) if amount_str else 0.0
-                
-                direction = "Credit" if amount >= 0 else "Debit"
-                
-                if description and amount != 0:
-                    transactions.append({
-                        "date": parsed_date.isoformat(),
-                        "description": description,
-                        "amount": str(abs(amount)),
-                        "direction": direction,
-                        "reference": reference
-                    })
-            except Exception as e:
-                print(f"Error parsing CSV row: {row} - {e}")
-                continue
+            # One parser over all pages, so the statement format is inferred once
+            for transaction in iter_bank_statement_lines(page_lines()):
+                summary["transaction_count"] += 1
+                yield record({"type": "transaction", **transaction})
+            summary["source"] = pdf_source(pages)
+            summary["pages"] = pages
+        elif filename.endswith(".csv"):
+            for transaction in iter_csv_bank_statement(contents.decode("utf-8")):
+                summary["transaction_count"] += 1
+                yield record({"type": "transaction", **transaction})
+            summary["source"] = "CSV"
+        else:
+            summary["success"] = False
+            summary["message"] = "Unable to extract transactions from this file"
     except Exception as e:
-        print(f"CSV parsing error: {e}")
+        # Headers are already sent, so errors are reported in the summary record
+        print(f"Bank statement streaming error: {e}")
+        summary["success"] = False
+        summary["message"] = f"Extraction error: {str(e)}"
     
-    return transactions
+    yield record(summary)
 
 
-def extract_text_from_pdf_via_ocr(pdf_bytes: bytes) -> str:
+@app.post("/train", status_code=202, dependencies=[Depends(require_ready)])
+async def train_model(model: TransactionCategorizer = Depends(feedback_model),
+                      business_id: Optional[str] = Header(None, alias="X-Business-Id")):
     """
-    Extract text from PDF using Tesseract OCR
-    Converts PDF pages to images and runs OCR on them
+    Start retraining the categorization model with accumulated feedback.
+    With X-Business-Id, trains that business's model from its own feedback.
+    Returns a job id immediately; poll /train/{job_id} for progress.
     """
     try:
-        import io
-        from pdf2image import convert_from_bytes
-        
-        # Convert PDF to images
-        images = convert_from_bytes(pdf_bytes)
-        
-        extracted_text = ""
-        for image in images:
-            # Run OCR on each image
-            text = ocr_service.extract_text_from_image(image)
-            extracted_text += text + "\n---PAGE BREAK---\n"
+        if model.online_mode:
+            # Online mode learns feedback as it arrives; /train only catches up and checkpoints
+            result = await run_in_threadpool(model.retrain)
+            return {
+                "status": "success",
+                "message": result["message"],
+                "metrics": result
+            }
         
-        return extracted_text
+        # Buffered feedback from this worker must be in the database before training reads it
+        await run_in_threadpool(model.feedback_store.flush)
+        if model is categorizer:
+            job = await run_in_threadpool(training_jobs.submit)
+        else:
+            tenant_id = model_registry.validate(business_id)
+            job = await run_in_threadpool(
+                training_jobs.submit, model.model_path, tenant_id,
+                lambda model_file: model_registry.activate(tenant_id, model_file)
+            )
+        return {
+            "status": "accepted",
+            "job_id": job["id"],
+            "job": job
+        }
     except Exception as e:
-        print(f"PDF OCR extraction error: {e}")
-        return ""
+        raise HTTPException(status_code=500, detail=f"Training error: {str(e)}")
+
+
+@app.get("/train/{job_id}")
+async def training_status(job_id: str):
+    """
+    Report the status and progress of a retraining job
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    live = categorizer
+    if job.get("business_id"):
+        live = await run_in_threadpool(model_registry.for_prediction, job["business_id"])
+    job["live_model_version"] = live.model_version
+    return job
+
+
+def extract_pdf_pages(pdf_bytes: bytes, wait_for_ocr: bool = False):
+    """
+    Iterate over PDF pages, using the text layer where present and OCR in
+    the process pool for scanned pages. Blocking - run it off the event loop.
+    """
+    if not ocr_service.is_available():
+        ocr_image = None
+    elif wait_for_ocr:
+        ocr_image = lambda image_bytes: ocr_page_image(image_bytes, wait=True)
+    else:
+        ocr_image = ocr_page_image
+    return iter_pdf_pages(pdf_bytes, ocr_image=ocr_image)
+
+
+def ocr_page_image(image_bytes: bytes, wait: bool = False) -> str:
+    cached = ocr_service.lookup_cache("extract_text_from_image", image_bytes)
+    if cached is not None:
+        return cached
+    if current_profile() is not None:
+        return profiled(ocr_service.extract_text_from_image, image_bytes)
+    while True:
+        try:
+            return ocr_pool.submit("extract_text_from_image", image_bytes).result()
+        except OCRPoolSaturated:
+            if not wait:
+                raise
+            # Background jobs queue behind interactive requests instead of failing the page
+            time.sleep(0.25)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,295 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+CSV_STATEMENT = (
+    "Date,Description,Amount,Reference\n"
+    "01/02/2024,WOOLWORTHS FOOD,-150.00,REF1\n"
+    "03/02/2024,SALARY PAYMENT,25000.00,REF2\n"
+).encode()
+
+
+@pytest.fixture(scope="module")
+def main_module(tmp_path_factory):
+    # main.py keeps its models, caches and job files relative to the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("service"))
+    try:
+        import main
+        yield main
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="module")
+def client(main_module):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main_module.app) as client:
+        deadline = time.monotonic() + 60
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, "service did not become ready"
+            time.sleep(0.05)
+        yield client
+
+
+def png_base64():
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("L", (200, 300), 255).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_ready_reports_the_warmup_stages(client):
+    body = client.get("/ready").json()
+    assert body["status"] == "ready" and body["model_version"]
+    assert {"categorizer", "ocr"} <= set(body["stages_ms"])
+    assert client.get("/health").json()["ready"] is True
+
+
+def test_metrics_count_requests_per_route_template(client):
+    client.get("/train/0123abcd")
+    text = client.get("/metrics").text
+    assert 'finlight_http_requests_total{route="/train/{job_id}",method="GET",status="404"}' in text
+    assert "# TYPE finlight_stage_seconds histogram" in text
+    assert "finlight_feedback_buffered" in text
+
+
+def test_process_document_receipt_and_invoice(client):
+    for document_type in ("receipt", "invoice"):
+        response = client.post("/process-document", json={"image": png_base64(), "document_type": document_type})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert {"vendor", "amount", "date", "vat_amount", "items", "raw_text", "confidence"} <= set(body)
+    assert "invoice_number" in body
+
+
+def test_process_document_rejects_unknown_types(client):
+    response = client.post("/process-document", json={"image": png_base64(), "document_type": "passport"})
+    assert response.status_code == 400
+
+
+def test_ocr_cache_lookup_runs_off_the_event_loop(main_module, monkeypatch):
+    threads = []
+
+    def lookup_cache(method, data, *args):
+        threads.append(threading.current_thread())
+        return "cached text"
+
+    monkeypatch.setattr(main_module.ocr_service, "vision_available", True)
+    monkeypatch.setattr(main_module.ocr_service, "lookup_cache", lookup_cache)
+    assert asyncio.run(main_module.run_ocr("extract_text_from_image", b"image")) == "cached text"
+    assert threads and threads[0] is not threading.main_thread()
+
+
+
+def test_feedback_is_stored_off_the_event_loop(main_module):
+    class Model:
+        threads = []
+
+        def add_feedback(self, **feedback):
+            self.threads.append(threading.current_thread())
+
+    feedback = main_module.FeedbackRequest(description="UBER TRIP", predicted_category="Other",
+                                           correct_category="Transport", amount=55.0)
+    assert asyncio.run(main_module.submit_feedback(feedback, model=Model()))["status"] == "success"
+    assert Model.threads and Model.threads[0] is not threading.main_thread()
+
+
+def test_online_learning_from_feedback_runs_off_the_event_loop(main_module, monkeypatch, tmp_path):
+    from app.categorizer import TransactionCategorizer
+    from app.online_model import OnlineCategorizer
+
+    threads = []
+    for name in ("partial_fit", "save"):
+        def record(self, *args, _original=getattr(OnlineCategorizer, name)):
+            threads.append(threading.current_thread())
+            return _original(self, *args)
+        monkeypatch.setattr(OnlineCategorizer, name, record)
+    monkeypatch.setenv("CATEGORIZER_MODE", "online")
+    monkeypatch.setenv("FEEDBACK_FLUSH_ROWS", "1")
+    monkeypatch.setenv("ONLINE_CHECKPOINT_EVERY", "1")
+    model = TransactionCategorizer(model_path=str(tmp_path))
+    updates = model.online.updates
+    threads.clear()
+
+    feedback = main_module.FeedbackRequest(description="UBER TRIP", predicted_category="Other",
+                                           correct_category="Transport", amount=55.0)
+    asyncio.run(main_module.submit_feedback(feedback, model=model))
+    assert model.online.updates == updates + 1
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    model.close()
+
+def test_score_queued_isolates_a_failing_tenant(main_module):
+    class Model:
+        def __init__(self, category=None):
+            self.category = category
+
+        def predict_many(self, descriptions, amounts, directions):
+            if self.category is None:
+                raise RuntimeError("tenant model not loaded")
+            return [{"category": self.category, "description": d} for d in descriptions]
+
+    good, bad = Model("Fuel"), Model()
+    txn = SimpleNamespace(description="ENGEN", amount=10.0, direction="Debit")
+    results = main_module.score_queued([(good, txn), (bad, txn), (good, txn)])
+
+    assert results[0] == results[2] == {"category": "Fuel", "description": "ENGEN"}
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_pdf_statement_text_layer_is_parsed(client, make_pdf):
+    pdf = make_pdf(["01/02/2024 | WOOLWORTHS FOOD | -150.00", "03/02/2024 | SALARY PAYMENT | 25000.00"])
+    response = client.post("/extract-bank-statement", files={"file": ("statement.pdf", pdf, "application/pdf")})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["source"] == "PDF_OCR"
+    assert [(t["description"], t["direction"]) for t in body["transactions"]] == [
+        ("WOOLWORTHS FOOD", "Debit"), ("SALARY PAYMENT", "Credit"),
+    ]
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_streamed_statement_matches_the_buffered_response(client, make_pdf):
+    csv_statement = (
+        "Date,Description,Amount,Reference\n"
+        "01/02/2024,WOOLWORTHS FOOD,-150.00,REF1\n"
+        "03/02/2024,SALARY PAYMENT,25000.00,REF2\n"
+    ).encode()
+    pdf = make_pdf(["01/02/2024 | WOOLWORTHS FOOD | -150.00", "03/02/2024 | SALARY PAYMENT | 25000.00"])
+    for filename, contents, content_type in (("statement.csv", csv_statement, "text/csv"),
+                                             ("statement.pdf", pdf, "application/pdf")):
+        files = {"file": (filename, contents, content_type)}
+        buffered = client.post("/extract-bank-statement", files=files).json()
+        streamed = client.post("/extract-bank-statement?stream=true", files=files)
+        assert streamed.headers["content-type"].startswith("application/x-ndjson")
+
+        records = ndjson(streamed)
+        summary = records.pop()
+        assert summary["type"] == "summary" and summary["success"]
+        assert summary["transaction_count"] == len(records) == 2
+        assert summary["source"] == buffered["source"]
+        assert [{k: v for k, v in r.items() if k != "type"} for r in records] == buffered["transactions"]
+    assert summary["pages"] == [{"page": 1, "source": "text"}, {"page": 2, "source": "text"}]
+
+
+def test_stream_errors_arrive_in_the_summary(client):
+    response = client.post("/extract-bank-statement?stream=true",
+                           files={"file": ("statement.csv", b"\xff\xfe not utf-8", "text/csv")})
+    assert response.status_code == 200
+    summary = ndjson(response)[-1]
+    assert summary["type"] == "summary" and not summary["success"]
+    assert summary["message"].startswith("Extraction error")
+
+
+def test_bulk_matches_single_predictions_in_every_format(client):
+    descriptions = ["ENGEN GARAGE SANDTON", "SALARY PAYMENT", "TELKOM INTERNET"]
+    single = [client.post("/categorize", json={"description": d, "amount": 100.0, "direction": "Debit"}).json()
+              for d in descriptions]
+    expected = [prediction["category"] for prediction in single]
+
+    columnar = client.post("/categorize/bulk", json={"descriptions": descriptions})
+    assert columnar.status_code == 200, columnar.text
+    assert columnar.json()["categories"] == expected and columnar.json()["count"] == 3
+
+    body = "\n".join(json.dumps({"description": d}) for d in descriptions)
+    ndjson_response = client.post("/categorize/bulk?top_k=2", content=body,
+                                  headers={"Content-Type": "application/x-ndjson"})
+    assert ndjson_response.json()["categories"] == expected
+    assert all(len(alternatives) >= 1 for alternatives in ndjson_response.json()["alternatives"])
+
+    records = ndjson(client.post("/categorize/bulk?stream=true", json={"descriptions": descriptions}))
+    assert [c for record in records[:-1] for c in record["categories"]] == expected
+    assert records[-1] == {"type": "summary", "success": True, "count": 3,
+                           "model_version": columnar.json()["model_version"]}
+
+
+def test_bulk_rejects_invalid_rows(client):
+    response = client.post("/categorize/bulk", json={"descriptions": ["A"], "amounts": ["5"]})
+    assert response.status_code == 400 and "Row 0" in response.json()["detail"]
+
+    records = ndjson(client.post("/categorize/bulk?stream=true", json={"descriptions": [1]}))
+    assert records[-1]["success"] is False and "Row 0" in records[-1]["message"]
+
+
+def submit(client, contents=CSV_STATEMENT, filename="statement.csv", content_type="text/csv"):
+    response = client.post("/jobs/extract", files={"file": (filename, contents, content_type)})
+    assert response.status_code == 202, response.text
+    return response.json()["job_id"]
+
+
+def wait_for(client, job_id, *statuses):
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        assert time.monotonic() < deadline, job
+        time.sleep(0.02)
+
+
+def test_job_result_matches_synchronous_extraction(client):
+    job_id = submit(client)
+    job = wait_for(client, job_id, "completed", "failed")
+    assert job["status"] == "completed"
+
+    result = client.get(f"/jobs/{job_id}/result")
+    sync = client.post("/extract-bank-statement", files={"file": ("statement.csv", CSV_STATEMENT, "text/csv")})
+    assert result.status_code == 200
+    assert result.json() == sync.json()
+    assert [t["direction"] for t in result.json()["transactions"]] == ["Debit", "Credit"]
+
+
+def test_job_reports_progress_and_result_waits_for_completion(client, main_module, monkeypatch):
+    release = threading.Event()
+
+    def extract(contents, filename, content_type, on_page):
+        on_page(1, 3)
+        release.wait(10)
+        return {"success": True, "transactions": [], "source": "PDF_OCR"}
+
+    monkeypatch.setattr(main_module.extraction_jobs, "extract", extract)
+    job_id = submit(client, b"%PDF-1.4", "statement.pdf", "application/pdf")
+
+    job = wait_for(client, job_id, "running")
+    deadline = time.monotonic() + 10
+    while job["pages_done"] != 1:
+        assert time.monotonic() < deadline, job
+        job = client.get(f"/jobs/{job_id}").json()
+    assert job["pages_total"] == 3
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+
+    release.set()
+    wait_for(client, job_id, "completed")
+    assert client.get(f"/jobs/{job_id}/result").json()["source"] == "PDF_OCR"
+
+
+def test_failed_job_reports_its_error(client, main_module, monkeypatch):
+    def extract(contents, filename, content_type, on_page):
+        raise ValueError("unreadable statement")
+
+    monkeypatch.setattr(main_module.extraction_jobs, "extract", extract)
+    job_id = submit(client)
+    job = wait_for(client, job_id, "completed", "failed")
+    assert job["status"] == "failed" and job["error"] == "unreadable statement"
+
+    response = client.get(f"/jobs/{job_id}/result")
+    assert response.status_code == 500
+    assert "unreadable statement" in response.json()["detail"]
+
+
+def test_unknown_jobs_and_unsupported_files(client):
+    assert client.get("/jobs/0123456789abcdef").status_code == 404
+    assert client.get("/jobs/..%2Fmodels/result").status_code == 404
+    response = client.post("/jobs/extract", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+import asyncio
+
+from app.batcher import MicroBatcher
+
+
+def run_concurrently(batcher, items):
+    async def main():
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+    return asyncio.run(main())
+
+
+def test_concurrent_submits_share_one_call():
+    calls = []
+
+    def score(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(score, max_batch_size=64, max_wait_ms=5)
+    assert run_concurrently(batcher, range(10)) == [item * 2 for item in range(10)]
+    assert calls == [list(range(10))]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["items"], stats["largest_batch"]) == (1, 10, 10)
+
+
+def test_batches_are_capped_at_max_batch_size():
+    calls = []
+
+    def score(items):
+        calls.append(len(items))
+        return list(items)
+
+    batcher = MicroBatcher(score, max_batch_size=4, max_wait_ms=5)
+    assert run_concurrently(batcher, range(10)) == list(range(10))
+    assert calls == [4, 4, 2]
+
+
+def test_failed_call_fails_every_caller():
+    def score(items):
+        raise RuntimeError("model not loaded")
+
+    results = run_concurrently(MicroBatcher(score, max_wait_ms=5), range(3))
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_exception_in_a_slot_fails_only_that_caller():
+    # One tenant's model failing must not fail the other tenants batched with it
+    def score(items):
+        return [ValueError(f"tenant {tenant} failed") if tenant == "b" else (tenant, value)
+                for tenant, value in items]
+
+    results = run_concurrently(MicroBatcher(score, max_wait_ms=5), [("a", 1), ("b", 2), ("a", 3)])
+    assert results[0] == ("a", 1) and results[2] == ("a", 3)
+    assert isinstance(results[1], ValueError)
+
+
+def test_batcher_restarts_on_a_new_event_loop():
+    batcher = MicroBatcher(lambda items: list(items), max_wait_ms=0)
+    assert run_concurrently(batcher, [1]) == [1]
+    assert run_concurrently(batcher, [2, 3]) == [2, 3]
@@ -0,0 +1,48 @@
+import pytest
+
+from app.bulk import BulkInputError, ndjson_lines, parse_columnar, parse_ndjson_lines, result_columns
+
+
+def test_ndjson_rows_become_columns_with_defaults():
+    body = (b'{"description": "ENGEN GARAGE", "amount": 650.5, "direction": "Debit"}\n'
+            b'\n'
+            b'{"description": "SALARY PAYMENT"}\n')
+    columns = parse_ndjson_lines(ndjson_lines(body))
+    assert (columns.descriptions, columns.amounts, columns.directions) == (
+        ["ENGEN GARAGE", "SALARY PAYMENT"], [650.5, 0.0], ["Debit", ""],
+    )
+
+
+def test_columnar_body_and_slicing():
+    columns = parse_columnar(b'{"descriptions": ["A", "B", "C"], "amounts": [1, 2.5, -3]}')
+    assert len(columns) == 3 and columns.directions is None
+    part = columns.slice(1, 3)
+    assert (part.descriptions, part.amounts, part.directions) == (["B", "C"], [2.5, -3], None)
+
+
+@pytest.mark.parametrize("body,message", [
+    (b"not json", "Invalid JSON"),
+    (b'["A"]', "Expected an object"),
+    (b'{"descriptions": "A"}', "must be a list"),
+    (b'{"descriptions": ["A", 5]}', "Row 1: description"),
+    (b'{"descriptions": ["A", "B"], "amounts": [1]}', "as long as"),
+    (b'{"descriptions": ["A"], "amounts": [true]}', "Row 0: amount"),
+    (b'{"descriptions": ["A"], "directions": [null]}', "Row 0: direction"),
+])
+def test_invalid_columnar_bodies_are_rejected(body, message):
+    with pytest.raises(BulkInputError, match=message):
+        parse_columnar(body)
+
+
+def test_ndjson_errors_name_the_row_across_chunks():
+    lines = [b'{"description": "A"}', b'{"amount": 5}']
+    with pytest.raises(BulkInputError, match="Row 11: expected a JSON object"):
+        parse_ndjson_lines(lines, offset=10)
+    with pytest.raises(BulkInputError, match="Row 1: amount"):
+        parse_ndjson_lines([b'{"description": "A"}', b'{"description": "B", "amount": "5"}'])
+
+
+def test_alternatives_only_when_asked_for():
+    predictions = [{"category": "Fuel", "confidence": 0.9, "alternatives": [{"category": "Transport"}]}]
+    assert result_columns(predictions, 1) == {"categories": ["Fuel"], "confidences": [0.9]}
+    assert result_columns(predictions, 2)["alternatives"] == [[{"category": "Transport"}]]
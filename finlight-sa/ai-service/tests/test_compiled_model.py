@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+from app.categorizer import SEED_TRAINING_DATA
+from app.compiled_model import CompiledCategorizer
+
+DESCRIPTIONS = [
+    "MONTHLY OFFICE RENT PAYMENT", "Engen garage fuel 45L", "uber trip to client",
+    "ESKOM electricity prepaid", "Google Ads campaign", "SALARY RUN JUNE", "unknown merchant xyz",
+    "", "fnb service fee 12.50", "Woolworths food & snacks",
+]
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    # Same pipeline as TransactionCategorizer.create_initial_model
+    model = Pipeline([
+        ("tfidf", TfidfVectorizer(max_features=1000, ngram_range=(1, 2))),
+        ("clf", MultinomialNB()),
+    ])
+    model.fit([d for d, _ in SEED_TRAINING_DATA], [c for _, c in SEED_TRAINING_DATA])
+    return model
+
+
+def test_scores_match_predict_proba(pipeline):
+    compiled = CompiledCategorizer.from_pipeline(pipeline)
+    assert compiled.classes_.tolist() == pipeline.classes_.tolist()
+    np.testing.assert_allclose(compiled.predict_proba(DESCRIPTIONS), pipeline.predict_proba(DESCRIPTIONS),
+                               atol=1e-5)
+    assert compiled.predict(DESCRIPTIONS).tolist() == pipeline.predict(DESCRIPTIONS).tolist()
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_saved_directory_scores_the_same(pipeline, tmp_path, mmap):
+    compiled = CompiledCategorizer.from_pipeline(pipeline)
+    compiled.save_directory(str(tmp_path))
+    loaded = CompiledCategorizer.load_directory(str(tmp_path), mmap=mmap)
+    np.testing.assert_array_equal(loaded.predict_proba(DESCRIPTIONS), compiled.predict_proba(DESCRIPTIONS))
+
+
+def test_npz_round_trip(pipeline, tmp_path):
+    compiled = CompiledCategorizer.from_pipeline(pipeline)
+    compiled.save(str(tmp_path / "model.npz"))
+    loaded = CompiledCategorizer.load(str(tmp_path / "model.npz"))
+    np.testing.assert_array_equal(loaded.predict_proba(DESCRIPTIONS), compiled.predict_proba(DESCRIPTIONS))
+
+
+def test_memory_budget_prunes_features(pipeline):
+    full = CompiledCategorizer.from_pipeline(pipeline)
+    # The budget is an estimate per feature, so only check that it prunes
+    pruned = CompiledCategorizer.from_pipeline(pipeline, memory_budget=full.nbytes // 2)
+    assert len(pruned.terms) < len(full.terms)
+    assert pruned.nbytes < full.nbytes
+    np.testing.assert_allclose(pruned.predict_proba(DESCRIPTIONS).sum(axis=1), 1.0, rtol=1e-5)
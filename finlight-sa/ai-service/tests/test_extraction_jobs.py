@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+
+from app.extraction_jobs import ExtractionJobs
+from app.training import write_json_atomic
+
+
+def wait_for(jobs, job_id, status):
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)["status"] != status:
+        assert time.monotonic() < deadline, jobs.get(job_id)
+        time.sleep(0.01)
+
+
+def test_running_job_outlives_the_ttl(tmp_path):
+    release = threading.Event()
+
+    def extract(contents, filename, content_type, on_page):
+        on_page(1, 2)
+        release.wait(5)
+        return {"transactions": []}
+
+    jobs = ExtractionJobs(extract, jobs_dir=str(tmp_path), ttl=0.05)
+    job_id = jobs.submit(b"%PDF", "statement.pdf", "application/pdf")["id"]
+    wait_for(jobs, job_id, "running")
+    time.sleep(0.1)
+
+    jobs._last_prune = 0
+    jobs.prune()
+    assert jobs.get(job_id)["pages_done"] == 1
+    assert os.path.exists(jobs._job_file(job_id))
+
+    release.set()
+    wait_for(jobs, job_id, "completed")
+    assert jobs.result(job_id) == {"transactions": []}
+
+    # Finished jobs do expire on the ttl, result and all
+    time.sleep(0.1)
+    assert jobs.get(job_id) is None
+    jobs._last_prune = 0
+    jobs.prune()
+    assert os.listdir(tmp_path) == []
+    jobs.shutdown()
+
+
+def test_abandoned_job_is_pruned_after_stale_cutoff(tmp_path):
+    jobs = ExtractionJobs(lambda *args: {}, jobs_dir=str(tmp_path), ttl=0.05, stale_after=3600)
+    now = time.time()
+    # Both left "running" by a worker that died; only one has been silent past the cutoff
+    write_json_atomic(jobs._job_file("recent"), {"id": "recent", "status": "running", "created_at": now - 60})
+    write_json_atomic(jobs._job_file("abandoned"), {"id": "abandoned", "status": "running",
+                                                   "created_at": now - 7200, "updated_at": now - 7200})
+
+    jobs.prune()
+    assert jobs.get("recent") is not None
+    assert jobs.get("abandoned") is None
+    assert os.listdir(tmp_path) == ["recent.json"]
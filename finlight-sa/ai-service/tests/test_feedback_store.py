@@ -0,0 +1,66 @@
+import time
+
+from app.feedback_store import FeedbackStore
+
+
+def record(i, category="Fuel"):
+    return {"description": f"ENGEN GARAGE {i}", "predicted_category": "Other",
+            "correct_category": category, "amount": 100 + i}
+
+
+def test_rows_are_buffered_until_flush_rows(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), flush_rows=3, flush_seconds=60)
+
+    store.add_many([record(1), record(2)])
+    assert store.count() == 0 and store.stats()["buffered"] == 2
+
+    store.add_many([record(3)])
+    assert store.count() == 3
+    assert (store.flushes, store.committed, store.stats()["buffered"]) == (1, 3, 0)
+    store.close()
+
+
+def test_timer_commits_a_partial_group(tmp_path):
+    commits = []
+    store = FeedbackStore(str(tmp_path / "feedback.db"), flush_rows=100, flush_seconds=0.05,
+                          on_commit=lambda: commits.append(store.count()))
+    store.add("UBER TRIP", "Other", "Transport", 55.0)
+    store.add("UBER TRIP 2", "Other", "Transport", 60.0)
+
+    deadline = time.monotonic() + 5
+    while not commits:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert commits == [2]
+    assert store.flushes == 1
+    store.close()
+
+
+def test_training_rows_include_buffered_feedback_in_order(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), flush_rows=100, flush_seconds=60)
+    store.add_many([record(i, category) for i, category in enumerate(["Fuel", "Rent", "Fuel"])])
+
+    batches = list(store.iter_training_rows(batch_size=2))
+    assert batches == [[("ENGEN GARAGE 0", "Fuel"), ("ENGEN GARAGE 1", "Rent")], [("ENGEN GARAGE 2", "Fuel")]]
+    assert [row[0] for batch in store.iter_rows_since(1) for row in batch] == [2, 3]
+    store.close()
+
+
+def test_close_commits_what_is_left(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    store = FeedbackStore(path, flush_rows=100, flush_seconds=60)
+    store.add_many([record(1)])
+    store.close()
+    assert FeedbackStore(path).count() == 1
+
+
+def test_legacy_csv_is_imported_once(tmp_path):
+    (tmp_path / "feedback.csv").write_text(
+        "description,predicted_category,correct_category,amount,timestamp\n"
+        "TELKOM INTERNET,Other,Utilities,799.0,2024-01-01T00:00:00\n",
+        encoding="utf-8",
+    )
+    store = FeedbackStore(str(tmp_path / "feedback.db"))
+    assert store.count() == 1
+    assert (tmp_path / "feedback.csv.imported").exists() and not (tmp_path / "feedback.csv").exists()
+    assert FeedbackStore(str(tmp_path / "feedback.db")).count() == 1
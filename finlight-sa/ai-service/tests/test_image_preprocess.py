@@ -0,0 +1,77 @@
+import random
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from app.image_preprocess import ImagePreprocessor, otsu_threshold
+from benchmarks.bench_ocr_preprocess import generate_corpus
+from benchmarks.suite import generate_receipt_text, render_receipt_image
+
+
+@pytest.fixture(scope="module")
+def photo():
+    # A 12 MP colour JPEG of a receipt on a dark surface, stored sideways with an EXIF tag
+    [(_, image_bytes)] = generate_corpus(1)
+    return image_bytes
+
+
+def test_otsu_threshold_splits_ink_from_paper():
+    histogram = [0] * 256
+    histogram[30] = 100
+    histogram[220] = 900
+    assert 30 <= otsu_threshold(histogram) < 220
+    assert otsu_threshold([0] * 256) == 127
+
+
+def test_phone_photo_is_upright_cropped_scaled_and_binarized(photo):
+    preprocessor = ImagePreprocessor()
+    image, report = preprocessor.process(photo)
+
+    assert report["input_size"] == [4000, 3000]
+    # The EXIF tag turned it upright
+    assert report["decoded_size"] == [3000, 4000]
+    assert image.width * image.height < 0.25 * report["decoded_size"][0] * report["decoded_size"][1]
+    assert image.height > image.width
+    assert set(np.unique(np.asarray(image))) <= {0, 255}
+    assert preprocessor._text_height(image) == pytest.approx(preprocessor.target_text_height, rel=0.35)
+
+
+def test_jpeg_is_decoded_at_a_reduced_scale(photo):
+    # max_edge 1000 asks for a quarter of 4000, which libjpeg decodes directly
+    image, report = ImagePreprocessor(max_edge=1000, binarize=False, crop=False).process(photo)
+    assert report["decoded_size"] == [750, 1000]
+
+
+def test_clean_scan_keeps_its_page():
+    from PIL import Image
+
+    scan = Image.open(BytesIO(render_receipt_image(generate_receipt_text(random.Random(1)))))
+    preprocessor = ImagePreprocessor(binarize=False)
+    assert preprocessor._crop_to_paper(scan.convert("L")).size == scan.size
+
+
+def test_disabled_preprocessing_passes_the_image_through(photo):
+    preprocessor = ImagePreprocessor(enabled=False)
+    image, report = preprocessor.process(photo)
+    assert image.size == (4000, 3000) and report == {"input_size": [4000, 3000]}
+    assert preprocessor.signature() == "pre=off"
+
+
+def test_settings_that_change_ocr_output_change_the_signature():
+    assert ImagePreprocessor().signature() != ImagePreprocessor(target_text_height=30).signature()
+    assert ImagePreprocessor().signature() != ImagePreprocessor(binarize=False).signature()
+
+
+def test_tesseract_config_per_document_type(monkeypatch):
+    preprocessor = ImagePreprocessor()
+    assert preprocessor.tesseract_config("receipt") == "--psm 4"
+    assert preprocessor.tesseract_config("invoice") == "--psm 3"
+    assert preprocessor.tesseract_config("passport") == ""
+
+    monkeypatch.setenv("OCR_TESSERACT_CONFIG_RECEIPT", "--psm 6 --oem 1")
+    monkeypatch.setenv("OCR_PREPROCESS", "false")
+    configured = ImagePreprocessor.from_env()
+    assert configured.tesseract_config("receipt") == "--psm 6 --oem 1"
+    assert configured.tesseract_config("page") == "--psm 3"
+    assert configured.enabled is False
@@ -0,0 +1,55 @@
+from app.metrics import STAGE_SECONDS, MetricsRegistry, capture_stages, record_stages, stage
+
+
+def samples(text, name):
+    return [line for line in text.splitlines() if line.startswith(name) and not line.startswith("#")]
+
+
+def test_counter_and_histogram_exposition():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc("/categorize")
+    requests.inc("/categorize", amount=2)
+    requests.inc('/a"b')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert samples(text, "requests_total") == [
+        'requests_total{route="/categorize"} 3', 'requests_total{route="/a\\"b"} 1',
+    ]
+    # Buckets are cumulative and end with +Inf
+    assert samples(text, "latency_seconds") == [
+        'latency_seconds_bucket{le="0.1"} 1', 'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3', "latency_seconds_sum 5.55", "latency_seconds_count 3",
+    ]
+
+
+def test_collectors_are_read_at_scrape_time_and_errors_skipped():
+    registry = MetricsRegistry()
+    size = [1]
+    registry.add_collector(lambda: [("cache_size", "gauge", "Entries", [({}, size[0]), ({"shard": "b"}, None)])])
+
+    def broken():
+        raise RuntimeError("pool is gone")
+    registry.add_collector(broken)
+
+    size[0] = 7
+    assert samples(registry.render(), "cache_size") == ["cache_size 7"]
+
+
+def test_captured_stages_are_recorded_by_the_caller():
+    def count(name):
+        series = STAGE_SECONDS._series.get((name,))
+        return sum(series[0]) if series else 0
+
+    before = count("test.worker")
+    with capture_stages() as stages:
+        with stage("test.worker"):
+            pass
+    # Inside a worker the timing is only collected, not recorded
+    assert [name for name, _ in stages] == ["test.worker"] and count("test.worker") == before
+    record_stages(stages)
+    assert count("test.worker") == before + 1
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import app.model_registry as model_registry
+from app.model_registry import ModelRegistry
+from app.training import CURRENT_POINTER
+
+
+class FakeCategorizer:
+    """Stands in for TransactionCategorizer; loading blocks until the test releases it"""
+
+    release = {}
+    load_calls = []
+
+    def __init__(self, model_path, load=False, prediction_cache_size=0):
+        self.model_path = model_path
+        self.online = None
+        self.online_mode = False
+        self.state = SimpleNamespace(model=None, scorer=None, model_file=None)
+
+    @property
+    def loaded(self):
+        return self.state.model is not None
+
+    def load_or_create_model(self):
+        business_id = os.path.basename(self.model_path)
+        self.load_calls.append(business_id)
+        event = self.release.get(business_id)
+        if event is not None:
+            assert event.wait(5)
+        self.state.model = object()
+
+    def check_for_new_model(self):
+        return False
+
+    def close(self):
+        pass
+
+
+def make_registry(tmp_path, monkeypatch, *business_ids):
+    monkeypatch.setattr(model_registry, "TransactionCategorizer", FakeCategorizer)
+    monkeypatch.setattr(FakeCategorizer, "release", {})
+    monkeypatch.setattr(FakeCategorizer, "load_calls", [])
+    for business_id in business_ids:
+        (tmp_path / business_id).mkdir()
+        (tmp_path / business_id / CURRENT_POINTER).write_text("model.joblib")
+    return ModelRegistry(SimpleNamespace(model_path=str(tmp_path)))
+
+
+def test_slow_tenant_load_does_not_block_other_tenants(tmp_path, monkeypatch):
+    registry = make_registry(tmp_path, monkeypatch, "slow", "fast")
+    FakeCategorizer.release["slow"] = release = threading.Event()
+
+    slow = threading.Thread(target=registry.for_prediction, args=("slow",))
+    slow.start()
+    while "slow" not in FakeCategorizer.load_calls:
+        time.sleep(0.001)
+
+    start = time.perf_counter()
+    fast = registry.for_prediction("fast")
+    assert time.perf_counter() - start < 1
+    assert fast.loaded and slow.is_alive()
+
+    release.set()
+    slow.join(5)
+    assert registry.stats()["loaded"] == 2
+
+
+def test_concurrent_first_requests_load_a_tenant_once(tmp_path, monkeypatch):
+    registry = make_registry(tmp_path, monkeypatch, "acme")
+    FakeCategorizer.release["acme"] = release = threading.Event()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.for_prediction("acme")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert FakeCategorizer.load_calls == ["acme"]
+    assert len(results) == 4 and all(result is results[0] for result in results)
+    assert registry.stats()["loads"] == 1
@@ -0,0 +1,140 @@
+from io import BytesIO
+
+import pytest
+
+from app.image_preprocess import ImagePreprocessor
+from app.ocr import OCRResult, OCRService
+
+RECEIPT_LINES = [
+    "CORNER CAFE",
+    "12 Long Street",
+    "Cape Town",
+    "Tel 021 555 0101",
+    "Date 14/03/2024",
+    "Cappuccino 32.50",
+    "Croissant 28.00",
+    "VAT 7.88",
+    "TOTAL R 60.50",
+]
+
+
+def image_to_data(lines, confidence=90.0, line_height=20):
+    """pytesseract image_to_data(output_type=DICT) output for one word per token, one block per line"""
+    data = {key: [] for key in ("level", "page_num", "block_num", "par_num", "line_num", "word_num",
+                                "left", "top", "width", "height", "conf", "text")}
+    for number, line in enumerate(lines):
+        for word_number, word in enumerate(line.split(), start=1):
+            for key, value in (("level", 5), ("page_num", 1), ("block_num", 1), ("par_num", 1),
+                               ("line_num", number + 1), ("word_num", word_number),
+                               ("left", 10 + 60 * word_number), ("top", 10 + number * line_height),
+                               ("width", 50), ("height", line_height - 4), ("conf", confidence),
+                               ("text", word)):
+                data[key].append(value)
+    return data
+
+
+class StubEngine:
+    """Returns canned image_to_data output and records every call"""
+
+    name = "stub"
+    version = "1"
+
+    def __init__(self, lines=RECEIPT_LINES, fail=False):
+        self.lines = lines
+        self.fail = fail
+        self.calls = []
+
+    def image_to_data(self, image, config=""):
+        self.calls.append((image.size, config))
+        if self.fail:
+            raise RuntimeError("engine crashed")
+        return image_to_data(self.lines)
+
+    def close(self):
+        pass
+
+
+def png(size=(200, 300)):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("L", size, 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def service():
+    service = OCRService(probe=False)
+    service.vision_available = True
+    service.preprocessor = ImagePreprocessor(enabled=False)
+    service.engine = StubEngine()
+    service.receipt_roi = False
+    return service
+
+
+def test_one_pass_gives_fields_text_and_confidence(service):
+    result = service.process_receipt(png(), "receipt")
+
+    assert len(service.engine.calls) == 1
+    assert service.engine.calls[0][1] == service.preprocessor.tesseract_config("receipt")
+    assert result.raw_text.splitlines()[0] == "CORNER CAFE"
+    assert result.fields["vendor"] == "CORNER CAFE"
+    assert result.fields["amount"] == 60.5
+    assert result.fields["vat_amount"] == 7.88
+    assert [item["description"] for item in result.fields["items"]] == ["Cappuccino", "Croissant"]
+    assert result.confidence == pytest.approx(0.9)
+    assert len(result.words) == sum(len(line.split()) for line in RECEIPT_LINES)
+
+
+def test_text_and_field_views_share_the_pass(service):
+    assert service.extract_text_from_image(png()).startswith("CORNER CAFE\n")
+    assert service.extract_receipt_data(png())["amount"] == 60.5
+
+
+
+def test_receipt_fields_from_regions(service):
+    service.receipt_roi = True
+    fields = service.extract_receipt_data(png((400, 600)))
+
+    # A reduced layout pass, then one pass over the selected lines
+    assert len(service.engine.calls) == 2 and service.engine.calls[0][0] == (160, 240)
+    assert fields["vendor"] == "CORNER CAFE" and fields["amount"] == 60.5
+
+
+def test_region_failure_falls_back_to_the_full_pass(service, monkeypatch):
+    def crash(image_bytes, document_type):
+        raise ValueError("could not build the mosaic")
+
+    service.receipt_roi = True
+    monkeypatch.setattr(service, "run_ocr_regions", crash)
+    fields = service.extract_receipt_data(png())
+
+    assert service.engine.calls == [((200, 300), service.preprocessor.tesseract_config("receipt"))]
+    assert fields["vendor"] == "CORNER CAFE" and fields["amount"] == 60.5
+
+def test_unavailable_ocr_returns_sample_data(service):
+    service.vision_available = False
+    assert service.process_receipt(png()).fields["vendor"] == "Sample Vendor"
+    assert service.extract_text_from_image(png()) == "OCR not available"
+    assert service.engine.calls == []
+
+
+def test_confidence_ignores_non_word_boxes():
+    result = OCRResult(words=[{"conf": -1.0}, {"conf": 80.0}, {"conf": 60.0}])
+    assert result.confidence == pytest.approx(0.7)
+    assert OCRResult().confidence is None
+
+
+def test_repeated_documents_are_served_from_the_disk_cache(service, tmp_path):
+    from app.ocr_cache import OCRDiskCache
+    service.cache = OCRDiskCache(str(tmp_path), 1024 * 1024)
+    image = png()
+
+    first = service.process_receipt(image)
+    assert service.lookup_cache("process_receipt", image).fields == first.fields
+    assert service.lookup_cache("extract_text_from_image", image, "receipt") == first.raw_text
+    assert service.process_receipt(image).fields == first.fields
+    assert len(service.engine.calls) == 1
+
+    # A different Tesseract setting is a different entry
+    service.preprocessor.tesseract_configs["receipt"] = "--psm 6"
+    assert service.lookup_cache("process_receipt", image) is None
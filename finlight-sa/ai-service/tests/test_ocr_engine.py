@@ -0,0 +1,147 @@
+import enum
+import sys
+import types
+
+import pytest
+
+from app.ocr_engine import PytesseractEngine, TesserocrEngine, create_engine, parse_config
+
+# (block, paragraph, line) starts and (text, box, confidence) per word
+WORDS = [
+    ((True, True, True), ("SPAR", (10, 5, 60, 20), 96.0)),
+    ((False, False, False), ("SANDTON", (70, 5, 150, 20), 91.0)),
+    ((False, False, True), ("TOTAL", (10, 30, 60, 45), 88.0)),
+    ((False, False, False), ("R150.00", (70, 30, 150, 45), 90.0)),
+]
+
+
+class RIL(enum.IntEnum):
+    BLOCK = 1
+    PARA = 2
+    TEXTLINE = 3
+    WORD = 4
+
+
+class Word:
+    def __init__(self, starts, text, box, confidence):
+        self.starts = dict(zip((RIL.BLOCK, RIL.PARA, RIL.TEXTLINE), starts))
+        self.text, self.box, self.confidence = text, box, confidence
+
+    def IsAtBeginningOf(self, level):
+        return self.starts[level]
+
+    def GetUTF8Text(self, level):
+        return self.text
+
+    def BoundingBox(self, level):
+        return self.box
+
+    def Confidence(self, level):
+        return self.confidence
+
+
+def stub_tesserocr(fail=None):
+    """A tesserocr module whose API records how it is driven"""
+    module = types.ModuleType("tesserocr")
+    module.RIL = RIL
+    module.OEM = enum.IntEnum("OEM", {"TESSERACT_ONLY": 0, "LSTM_ONLY": 1, "DEFAULT": 3})
+    module.PSM = enum.IntEnum("PSM", {"AUTO": 3, "SINGLE_COLUMN": 4})
+    module.tesseract_version = lambda: "tesseract 5.3.0\n leptonica-1.82.0"
+    module.apis = []
+
+    class PyTessBaseAPI:
+        def __init__(self, lang, oem):
+            if fail is not None:
+                raise fail
+            self.lang, self.oem = lang, oem
+            self.variables = {"tessedit_char_whitelist": ""}
+            self.calls = []
+            self.ended = False
+            module.apis.append(self)
+
+        def SetPageSegMode(self, psm):
+            self.calls.append(("psm", psm))
+
+        def GetVariableAsString(self, key):
+            return self.variables.get(key)
+
+        def SetVariable(self, key, value):
+            self.variables[key] = value
+            self.calls.append(("variable", key, value))
+
+        def SetImage(self, image):
+            pass
+
+        def Recognize(self):
+            pass
+
+        def GetIterator(self):
+            return [Word(starts, *word) for starts, word in WORDS]
+
+        def Clear(self):
+            pass
+
+        def End(self):
+            self.ended = True
+
+    module.PyTessBaseAPI = PyTessBaseAPI
+    module.iterate_level = lambda iterator, level: iter(iterator)
+    return module
+
+
+def test_parse_config():
+    assert parse_config("--psm 4 --oem 1 -c tessedit_char_whitelist=0123456789.") == (
+        4, 1, {"tessedit_char_whitelist": "0123456789."},
+    )
+    assert parse_config("") == (None, None, {})
+    # A flag without its value is ignored rather than misread
+    assert parse_config("--psm") == (None, None, {})
+
+
+def test_auto_uses_tesserocr_when_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", stub_tesserocr())
+    engine = create_engine("auto")
+    assert isinstance(engine, TesserocrEngine) and engine.version == "5.3.0"
+    # warm() loaded the default API up front
+    assert len(sys.modules["tesserocr"].apis) == 1
+
+
+@pytest.mark.parametrize("tesserocr", [None, stub_tesserocr(fail=RuntimeError("Failed to init API"))])
+def test_auto_falls_back_to_pytesseract(monkeypatch, tesserocr):
+    # None makes the import fail, like a machine without tesserocr
+    monkeypatch.setitem(sys.modules, "tesserocr", tesserocr)
+    assert isinstance(create_engine("auto"), PytesseractEngine)
+    assert isinstance(create_engine("pytesseract"), PytesseractEngine)
+
+
+def test_explicit_tesserocr_does_not_fall_back(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    with pytest.raises(ImportError):
+        create_engine("tesserocr")
+    monkeypatch.setitem(sys.modules, "tesserocr", stub_tesserocr(fail=RuntimeError("Failed to init API")))
+    with pytest.raises(RuntimeError):
+        create_engine("tesserocr")
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError, match="Unknown OCR engine"):
+        create_engine("easyocr")
+
+
+def test_tesserocr_words_use_the_pytesseract_layout(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", stub_tesserocr())
+    engine = create_engine("tesserocr")
+    data = engine.image_to_data(object(), "--psm 4 --oem 1 -c tessedit_char_whitelist=0123456789")
+
+    assert data["text"] == ["SPAR", "SANDTON", "TOTAL", "R150.00"]
+    assert data["line_num"] == [1, 1, 2, 2] and data["word_num"] == [1, 2, 1, 2]
+    assert (data["left"][3], data["top"][3], data["width"][3], data["height"][3]) == (70, 30, 80, 15)
+    assert data["conf"] == [96.0, 91.0, 88.0, 90.0]
+
+    # --oem 1 gets its own API; the whitelist is restored for the next document
+    default_api, lstm_api = sys.modules["tesserocr"].apis
+    assert lstm_api.oem == 1 and lstm_api.calls[0] == ("psm", 4)
+    assert lstm_api.variables["tessedit_char_whitelist"] == ""
+
+    engine.close()
+    assert default_api.ended and lstm_api.ended
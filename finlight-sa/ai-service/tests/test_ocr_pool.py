@@ -0,0 +1,165 @@
+import os
+import signal
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import pytest
+
+import app.ocr_pool as ocr_pool
+from app.ocr_pool import OCRPoolSaturated, OCRProcessPool, _attach
+
+
+class EchoService:
+    """Worker-side OCRService stand-in: returns what it was sent"""
+
+    def extract_text_from_image(self, data, *args):
+        return {"text": data.decode(), "args": list(args)}
+
+
+class InlineExecutor:
+    """Runs tasks in this process, through the same shared-memory hand-off as a worker"""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+class BrokenOnSubmit(InlineExecutor):
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("pool is broken")
+
+
+class BrokenFuture(InlineExecutor):
+    """A worker that dies while running the task"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+class DiesDuringTask(InlineExecutor):
+    """Loses its first task with the worker, then refuses new work like a broken ProcessPoolExecutor"""
+
+    def __init__(self):
+        super().__init__()
+        self.broken = False
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("pool is broken")
+        self.broken = True
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    monkeypatch.setattr(ocr_pool, "_worker_service", EchoService())
+
+    def make(*executors):
+        executors = list(executors)
+        pool = OCRProcessPool(max_workers=1, max_pending=2)
+
+        def get_executor():
+            if pool._executor is None:
+                pool._executor = executors.pop(0)
+            return pool._executor
+
+        pool._get_executor = get_executor
+        return pool
+    return make
+
+
+def test_attach_reads_a_segment_the_parent_owns():
+    shm = shared_memory.SharedMemory(create=True, size=5)
+    try:
+        shm.buf[:5] = b"hello"
+        attached = _attach(shm.name)
+        assert bytes(attached.buf[:5]) == b"hello"
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
+    with pytest.raises(FileNotFoundError):
+        _attach(shm.name)
+
+
+def test_task_result_and_release(make_pool):
+    pool = make_pool(InlineExecutor())
+    assert pool.submit("extract_text_from_image", b"receipt", "page").result() == \
+        {"text": "receipt", "args": ["page"]}
+    stats = pool.stats()
+    assert (stats["pending"], stats["completed"]) == (0, 1)
+
+
+def test_broken_pool_on_submit_is_replaced(make_pool):
+    broken, fresh = BrokenOnSubmit(), InlineExecutor()
+    pool = make_pool(broken, fresh)
+    assert pool.submit("extract_text_from_image", b"receipt").result()["text"] == "receipt"
+    assert broken.shut_down and pool._executor is fresh
+
+
+def test_task_lost_with_its_worker_is_retried_once(make_pool):
+    dying, fresh = DiesDuringTask(), InlineExecutor()
+    pool = make_pool(dying, fresh)
+    assert pool.submit("extract_text_from_image", b"receipt").result()["text"] == "receipt"
+    assert dying.shut_down and pool._executor is fresh
+    assert pool.stats()["pending"] == 0
+
+
+def test_second_failure_is_reported(make_pool):
+    pool = make_pool(BrokenFuture(), BrokenFuture(), InlineExecutor())
+    with pytest.raises(BrokenProcessPool):
+        pool.submit("extract_text_from_image", b"receipt").result()
+    assert pool.stats()["pending"] == 0
+
+
+def test_full_queue_and_unknown_methods_are_rejected(make_pool):
+    pool = make_pool(InlineExecutor())
+    pool.pending = pool.max_pending
+    with pytest.raises(OCRPoolSaturated):
+        pool.submit("extract_text_from_image", b"receipt")
+    assert pool.stats()["rejected"] == 1
+    with pytest.raises(ValueError):
+        pool.submit("run_ocr_regions", b"receipt")
+
+
+def shm_segments():
+    try:
+        return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+    except OSError:
+        return set()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="kills worker processes with POSIX signals")
+def test_pool_recovers_after_its_workers_are_killed():
+    pytest.importorskip("pytesseract")
+    before = shm_segments()
+    pool = OCRProcessPool(max_workers=1)
+    try:
+        pool.start()
+        for pid in list(pool._executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+        # Not an image: the worker answers with its error record rather than raising
+        future = pool.submit("extract_text_from_image", b"not an image")
+        assert future.exception(timeout=120) is None
+        assert pool.stats()["pending"] == 0
+    finally:
+        pool.shutdown()
+    # Every segment handed to a worker was unlinked by the parent
+    assert shm_segments() <= before
@@ -0,0 +1,90 @@
+import copy
+
+import pytest
+
+from app.categorizer import TransactionCategorizer
+from app.prediction_cache import PredictionCache, normalize_description
+
+
+def test_normalize_masks_reference_numbers():
+    assert normalize_description("  UBER   Trip 8841 ref:A12 ") == "uber trip # #"
+    assert normalize_description("Uber trip 1002 REF:B77") == normalize_description("UBER TRIP 8841 ref:A12")
+
+
+def test_lru_eviction_and_stats():
+    cache = PredictionCache(max_size=2)
+    cache.ensure_version(1)
+    cache.put("a", {"category": "Rent"})
+    cache.put("b", {"category": "Fuel"})
+    assert cache.get("a") == {"category": "Rent"}
+    cache.put("c", {"category": "Transport"})  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == {"category": "Transport"}
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1, 1)
+
+
+def test_entries_expire(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.prediction_cache.time.monotonic", lambda: clock[0])
+    cache = PredictionCache(max_size=10, ttl_seconds=60)
+    cache.put("a", {"category": "Rent"})
+    clock[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_model_version_change_drops_entries():
+    cache = PredictionCache(max_size=10)
+    cache.ensure_version("v1")
+    cache.put("a", {"category": "Rent"}, model_version="v1")
+    cache.ensure_version("v2")
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
+
+    # A prediction scored by the model that was just replaced is not stored
+    cache.put("a", {"category": "Rent"}, model_version="v1")
+    assert cache.get("a") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_size=0)
+    cache.put("a", {"category": "Rent"})
+    assert not cache.enabled and cache.get("a") is None
+
+
+@pytest.fixture(scope="module")
+def categorizer(tmp_path_factory):
+    categorizer = TransactionCategorizer(str(tmp_path_factory.mktemp("models")), prediction_cache_size=100)
+    yield categorizer
+    categorizer.close()
+
+
+def test_categorizer_serves_repeated_descriptions_from_cache(categorizer):
+    cache = categorizer.prediction_cache
+    cache.clear()
+    first = categorizer.predict_many(["UBER TRIP 8841", "ENGEN GARAGE 12"])
+    hits = cache.hits
+    second = categorizer.predict_many(["Uber trip 1002", "ENGEN GARAGE 12", "ENGEN GARAGE 99"])
+
+    assert cache.hits - hits == 3
+    assert second == [first[0], first[1], first[1]]
+
+
+def test_callers_cannot_corrupt_cached_predictions(categorizer):
+    categorizer.prediction_cache.clear()
+    expected = copy.deepcopy(categorizer.predict("UBER TRIP 8841", 10.0, "Debit"))
+    assert expected["alternatives"]
+
+    mutated = categorizer.predict("UBER TRIP 1002", 10.0, "Debit")
+    mutated["category"] = "changed"
+    mutated["alternatives"][0]["confidence"] = -1.0
+    mutated["alternatives"].append({"category": "extra", "confidence": 0.0})
+
+    assert categorizer.predict("UBER TRIP 5", 10.0, "Debit") == expected
+
+
+def test_cached_predictions_match_uncached_scores(categorizer):
+    descriptions = ["OFFICE RENT JUNE", "Google Ads 44", "salary run", "office rent july"]
+    assert categorizer.predict_many(descriptions) == categorizer.predict_bulk(descriptions, top_k=3)
@@ -0,0 +1,74 @@
+import hashlib
+import os
+
+import pytest
+
+from app.profiling import ProfilingMiddleware, profiled, tag_document
+
+
+def busy_work():
+    return sum(i * i for i in range(20000))
+
+
+def make_client(directory, **options):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from starlette.concurrency import run_in_threadpool
+
+    app = FastAPI()
+
+    @app.post("/work")
+    async def work():
+        tag_document(b"statement")
+        return {"total": await run_in_threadpool(profiled, busy_work)}
+
+    app.add_middleware(ProfilingMiddleware, directory=str(directory), **options)
+    return TestClient(app)
+
+
+def stems(directory):
+    return sorted(name[:-len(".pstats")] for name in os.listdir(directory) if name.endswith(".pstats"))
+
+
+def test_token_header_profiles_the_request(tmp_path):
+    client = make_client(tmp_path, token="secret")
+    response = client.post("/work", headers={"X-Profile": "secret", "X-Request-Id": "req-1"})
+
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "req-1"
+    assert float(response.headers["x-profile-cpu-ms"]) >= 0
+    [stem] = stems(tmp_path)
+    # <timestamp>-<request id>-<document hash>
+    assert stem.endswith("-req-1-" + hashlib.sha256(b"statement").hexdigest()[:16])
+    with open(tmp_path / f"{stem}.collapsed", encoding="utf-8") as f:
+        assert "busy_work" in f.read()
+
+
+@pytest.mark.parametrize("options,headers", [
+    ({"token": "secret"}, {}),
+    ({"token": "secret"}, {"X-Profile": "wrong"}),
+    # Without a token the header is ignored
+    ({}, {"X-Profile": ""}),
+])
+def test_requests_without_the_token_are_not_profiled(tmp_path, options, headers):
+    response = make_client(tmp_path, **options).post("/work", headers=headers)
+    assert response.status_code == 200 and "x-profile-cpu-ms" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+def test_sampled_requests_get_a_fresh_id_when_theirs_is_unsafe(tmp_path):
+    response = make_client(tmp_path, sample_rate=1.0).post("/work", headers={"X-Request-Id": "../../etc"})
+    request_id = response.headers["x-request-id"]
+    assert request_id != "../../etc" and request_id.isalnum()
+    assert request_id in stems(tmp_path)[0]
+
+
+def test_oldest_profiles_are_pruned(tmp_path):
+    client = make_client(tmp_path, token="secret", max_files=2)
+    for request_id in ("a", "b", "c"):
+        client.post("/work", headers={"X-Profile": "secret", "X-Request-Id": request_id})
+
+    kept = stems(tmp_path)
+    assert len(kept) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{stem}{suffix}" for stem in kept
+                                                  for suffix in (".pstats", ".collapsed"))
@@ -0,0 +1,58 @@
+import asyncio
+import sys
+import threading
+
+from app.categorizer import TransactionCategorizer
+from app.startup import Warmup
+
+
+def test_warmup_reports_ready_with_stage_timings():
+    release = threading.Event()
+
+    def warm_up():
+        with warmup.stage("categorizer"):
+            release.wait(5)
+
+    async def run():
+        warmup.start(warm_up)
+        # Still warming up: wait gives up after its timeout
+        assert await warmup.wait(0.05) is False
+        release.set()
+        return await warmup.wait(5)
+
+    warmup = Warmup()
+    assert asyncio.run(run()) is True
+    report = warmup.report()
+    assert report["ready"] and report["error"] is None
+    assert set(report["stages_ms"]) == {"categorizer"} and report["ready_after_ms"] > 0
+
+
+def test_failed_warmup_is_reported_and_never_ready():
+    def warm_up():
+        raise RuntimeError("model file is corrupt")
+
+    async def run():
+        warmup.start(warm_up)
+        return await warmup.wait(5)
+
+    warmup = Warmup()
+    assert asyncio.run(run()) is False
+    assert warmup.report()["error"] == "model file is corrupt"
+
+
+def test_warmup_that_never_started_is_not_ready():
+    assert asyncio.run(Warmup().wait(0.01)) is False
+
+
+def test_restart_loads_the_compiled_artifact_without_unpickling(tmp_path, monkeypatch):
+    first = TransactionCategorizer(model_path=str(tmp_path))
+    expected = first.predict("ENGEN GARAGE SANDTON", 650.0, "Debit")
+    first.close()
+
+    # A second start must not need joblib (or sklearn) to serve predictions
+    monkeypatch.setitem(sys.modules, "joblib", None)
+    restarted = TransactionCategorizer(model_path=str(tmp_path))
+    assert restarted.model is None and restarted.loaded
+    assert restarted.model_version == first.model_version
+    assert restarted.predict("ENGEN GARAGE SANDTON", 650.0, "Debit") == expected
+    restarted.close()
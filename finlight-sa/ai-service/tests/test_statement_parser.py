@@ -0,0 +1,125 @@
+import pytest
+
+from app.statement_parser import parse_bank_statement_text, parse_csv_bank_statement
+from benchmarks.bench_statement_parser import (
+    generate_csv_statement,
+    generate_text_statement,
+    legacy_parse_bank_statement_text,
+    legacy_parse_csv_bank_statement,
+)
+
+
+def without_direction(transactions):
+    # The old text parser stripped "-" before deciding the direction, so it called everything Credit
+    return [{key: value for key, value in t.items() if key != "direction"} for t in transactions]
+
+
+def test_text_parser_matches_previous_parser():
+    text = generate_text_statement(500)
+    transactions = parse_bank_statement_text(text)
+    assert without_direction(transactions) == without_direction(legacy_parse_bank_statement_text(text))
+    assert {t["direction"] for t in transactions} == {"Debit", "Credit"}
+
+
+def test_text_parser_skips_blank_short_and_unrecognised_lines():
+    text = "\n".join([
+        "", "   ", "short", "Statement for account 1234567890", "Date | Description | Amount",
+        "01/02/2024 | WOOLWORTHS FOOD | 150.00", "", "02/02/2024 |  | 12.00",
+        "03/02/2024 | SALARY PAYMENT | 25000.00", "Closing balance 24850.00",
+    ])
+    transactions = parse_bank_statement_text(text)
+    assert transactions == legacy_parse_bank_statement_text(text)
+    assert [t["description"] for t in transactions] == ["WOOLWORTHS FOOD", "SALARY PAYMENT"]
+
+
+def test_mixed_layouts_keep_lines_outside_the_inferred_layout():
+    # Mostly pipe-delimited, so "pipe" wins the sample vote; the currency-style rows must survive it
+    text = "\n".join([
+        "Statement for account 1234567890",
+        "01/02/2024 | WOOLWORTHS FOOD | -150.00",
+        "03/02/2024 | SALARY PAYMENT | 25000.00",
+        "04/02/2024 | ENGEN GARAGE | -640.10",
+        "05/02/2024 CHECKERS GROCERIES 320.50 ZAR",
+        "06/02/2024 UBER TRIP -89.90 R",
+    ])
+
+    transactions = parse_bank_statement_text(text)
+
+    assert [t["description"] for t in transactions] == [
+        "WOOLWORTHS FOOD", "SALARY PAYMENT", "ENGEN GARAGE", "CHECKERS GROCERIES", "UBER TRIP",
+    ]
+    assert transactions[3] == {
+        "date": "2024-02-05T00:00:00", "description": "CHECKERS GROCERIES",
+        "amount": "320.5", "direction": "Credit", "reference": "",
+    }
+    assert transactions[4]["amount"] == "89.9"
+    assert transactions[4]["direction"] == "Debit"
+
+
+def csv_statement(*rows):
+    return "\n".join(("Date,Description,Amount,Reference",) + rows) + "\n"
+
+
+def test_csv_blank_or_short_first_row_does_not_drop_the_file():
+    for first_row in (",,,", "01/02/2024", "01/02/2024,COFFEE"):
+        transactions = parse_csv_bank_statement(csv_statement(
+            first_row,
+            "03/02/2024,SALARY PAYMENT,25000.00,REF0",
+            "04/02/2024,OFFICE RENT,-8000,REF1",
+        ))
+        assert [(t["description"], t["reference"]) for t in transactions] == [
+            ("SALARY PAYMENT", "REF0"), ("OFFICE RENT", "REF1"),
+        ]
+
+
+def test_csv_three_field_first_row_keeps_later_references():
+    transactions = parse_csv_bank_statement(csv_statement(
+        "01/02/2024,COFFEE,-35.50",
+        "03/02/2024,SALARY PAYMENT,25000.00,REF0",
+        "04/02/2024,OFFICE RENT,-8000,REF1,extra",
+    ))
+    assert [(t["description"], t["amount"], t["direction"], t["reference"]) for t in transactions] == [
+        ("COFFEE", "35.5", "Debit", ""),
+        ("SALARY PAYMENT", "25000.0", "Credit", "REF0"),
+        ("OFFICE RENT", "8000.0", "Debit", "REF1"),
+    ]
+
+
+def test_csv_three_column_export():
+    transactions = parse_csv_bank_statement("Date,Description,Amount\n01/02/2024,A,100\n02/02/2024,B,-5")
+    assert [(t["description"], t["amount"], t["direction"], t["reference"]) for t in transactions] == [
+        ("A", "100.0", "Credit", ""), ("B", "5.0", "Debit", ""),
+    ]
+
+
+def test_csv_export_with_extra_columns():
+    transactions = parse_csv_bank_statement(
+        "Date,Description,Amount,Reference,Balance\n"
+        "01/02/2024,SALARY PAYMENT,25000.00,REF0,26000.00\n"
+        "02/02/2024,OFFICE RENT,-8000,REF1,18000.00\n"
+    )
+    assert [(t["date"], t["description"], t["amount"], t["reference"]) for t in transactions] == [
+        ("2024-02-01T00:00:00", "SALARY PAYMENT", "25000.0", "REF0"),
+        ("2024-02-02T00:00:00", "OFFICE RENT", "8000.0", "REF1"),
+    ]
+
+
+def test_csv_parser_matches_previous_parser():
+    csv_text = generate_csv_statement(500)
+    assert parse_csv_bank_statement(csv_text) == legacy_parse_csv_bank_statement(csv_text)
+
+
+@pytest.mark.parametrize("rows", [
+    # blank, short, undated and zero-amount rows among valid ones
+    ["", ",,,", "01/02/2024", "01/02/2024,COFFEE", ",NO DATE,10.00,REF9", "02/02/2024,ZERO,0,REF8",
+     "03/02/2024,SALARY PAYMENT,25000.00,REF0"],
+    # mixed widths, date formats and amount styles
+    ["01/02/2024,COFFEE,-35.50", "2024-02-03,SALARY PAYMENT,25000.00,REF0,extra",
+     "04/02/2024,OFFICE RENT,R 8000,REF1", "05/02/2024,NOT A DATE?,abc,REF2"],
+    # a later row wider than every earlier one, and quoted commas and newlines
+    ["01/02/2024,COFFEE,-35.50,REF1", '02/02/2024,"RENT, JUNE",-8000,REF2,18000,x,y',
+     '03/02/2024,"SALARY\nJUNE",25000,REF3'],
+])
+def test_csv_parser_matches_previous_parser_on_messy_rows(rows):
+    csv_text = "\n".join(["Date,Description,Amount,Reference"] + rows) + "\n"
+    assert parse_csv_bank_statement(csv_text) == legacy_parse_csv_bank_statement(csv_text)
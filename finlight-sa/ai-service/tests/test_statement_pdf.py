@@ -0,0 +1,56 @@
+import pytest
+
+from app import statement_pdf
+from app.ocr_pool import OCRPoolSaturated
+from app.statement_pdf import iter_pdf_pages
+
+STATEMENT_LINE = "01/02/2024 | WOOLWORTHS FOOD | -150.00"
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Stands in for pdftoppm: records which pages were rasterized"""
+    pages = []
+
+    def render(self, page_number):
+        pages.append(page_number)
+        return f"image of page {page_number}".encode()
+
+    monkeypatch.setattr(statement_pdf.PageRasterizer, "render", render)
+    return pages
+
+
+def test_only_pages_without_a_text_layer_are_ocrd(make_pdf, rendered):
+    pdf = make_pdf([STATEMENT_LINE, None, STATEMENT_LINE])
+    pages = list(iter_pdf_pages(pdf, ocr_image=lambda image: f"OCR({image.decode()})"))
+
+    assert [(page["page"], page["page_count"], page["source"]) for page in pages] == [
+        (1, 3, "text"), (2, 3, "ocr"), (3, 3, "text"),
+    ]
+    assert STATEMENT_LINE in pages[0]["text"]
+    assert pages[1]["text"] == "OCR(image of page 2)"
+    assert rendered == [2]
+
+
+def test_scanned_page_without_ocr_is_reported(make_pdf, rendered):
+    pages = list(iter_pdf_pages(make_pdf([None]), ocr_image=None))
+    assert pages[0]["source"] == "empty"
+    assert "OCR is not available" in pages[0]["warning"]
+    assert rendered == []
+
+
+def test_ocr_failure_only_affects_its_page(make_pdf, rendered):
+    def ocr_image(image):
+        raise RuntimeError("tesseract crashed")
+
+    pages = list(iter_pdf_pages(make_pdf([None, STATEMENT_LINE]), ocr_image=ocr_image))
+    assert [page["source"] for page in pages] == ["empty", "text"]
+    assert "tesseract crashed" in pages[0]["warning"]
+
+
+def test_saturated_ocr_pool_is_raised(make_pdf, rendered):
+    def ocr_image(image):
+        raise OCRPoolSaturated("OCR queue is full")
+
+    with pytest.raises(OCRPoolSaturated):
+        list(iter_pdf_pages(make_pdf([None]), ocr_image=ocr_image))
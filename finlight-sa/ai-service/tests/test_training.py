@@ -0,0 +1,81 @@
+import os
+import time
+
+from app.categorizer import TransactionCategorizer
+from app.training import TrainingJobs, compiled_artifact_dir, current_model_file, publish_model
+
+
+def wait_for(jobs, job_id, *statuses):
+    deadline = time.monotonic() + 120
+    while jobs.get(job_id)["status"] not in statuses:
+        assert time.monotonic() < deadline, jobs.get(job_id)
+        time.sleep(0.05)
+    return jobs.get(job_id)
+
+
+def categorizer_with_feedback(model_path, rows):
+    categorizer = TransactionCategorizer(model_path=model_path)
+    categorizer.add_feedback_batch([
+        {"description": f"ENGEN GARAGE {i}", "predicted_category": "Other",
+         "correct_category": "Fuel", "amount": 100 + i}
+        for i in range(rows)
+    ])
+    return categorizer
+
+
+def test_retrain_publishes_a_new_version_in_the_background(tmp_path):
+    model_path = str(tmp_path)
+    categorizer = categorizer_with_feedback(model_path, 12)
+    seed_file = current_model_file(model_path)
+    ready = []
+    jobs = TrainingJobs(model_path, on_model_ready=ready.append)
+    try:
+        job = jobs.submit()
+        # A second request while the first is queued or running gets the same job
+        assert jobs.submit()["id"] == job["id"]
+
+        job = wait_for(jobs, job["id"], "completed", "failed")
+        assert job["status"] == "completed", job
+        assert job["result"]["training_samples"] == 12
+        model_file = current_model_file(model_path)
+        assert model_file != seed_file and ready == [model_file]
+        version = os.path.basename(model_file)[len("categorizer_model-"):-len(".pkl")]
+        assert os.path.isdir(compiled_artifact_dir(model_path, version))
+        assert jobs.stats()["active_jobs"] == 0
+    finally:
+        jobs.shutdown()
+        categorizer.close()
+
+
+def test_retrain_without_enough_feedback_is_skipped(tmp_path):
+    model_path = str(tmp_path)
+    categorizer = categorizer_with_feedback(model_path, 3)
+    jobs = TrainingJobs(model_path, on_model_ready=lambda model_file: None)
+    try:
+        job = wait_for(jobs, jobs.submit()["id"], "skipped", "completed", "failed")
+        assert job["status"] == "skipped"
+        assert job["result"] == {"message": "Insufficient feedback data for retraining"}
+    finally:
+        jobs.shutdown()
+        categorizer.close()
+
+
+def test_unknown_job_ids_are_not_read(tmp_path):
+    jobs = TrainingJobs(str(tmp_path))
+    assert jobs.get("missing") is None
+    assert jobs.get("../CURRENT") is None
+
+
+def test_publish_keeps_a_bounded_number_of_versions(tmp_path):
+    from sklearn.dummy import DummyClassifier
+
+    model_path = str(tmp_path)
+    for i in range(5):
+        model = DummyClassifier(strategy="constant", constant=f"category {i}").fit([[0]], [f"category {i}"])
+        model_file = publish_model(model_path, model)
+        # Distinct mtimes so pruning keeps the newest
+        os.utime(model_file, (time.time() + i, time.time() + i))
+
+    versions = [name for name in os.listdir(model_path) if name.startswith("categorizer_model-")]
+    assert len(versions) == 3
+    assert current_model_file(model_path) == model_file